@@ -0,0 +1,325 @@
+"""
+Benchmarks du scheduler de messages (hors ligne, sans connexion à Discord).
+
+Usage:
+    python benchmark_scheduler.py restore [--jobs 100000]
+    python benchmark_scheduler.py simulate [--jobs 100000] [--hours 24] [--latency 0.05]
+    python benchmark_scheduler.py memory [--jobs 100000]
+"""
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import random
+import resource
+import selectors
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from job_store import JobStore
+from scheduler import MessageScheduler
+from quotas import DEFAULT_QUOTAS
+
+
+def benchmark_restore(job_count):
+    """
+    Mesure le temps de redémarrage à froid avec job_count jobs en base.
+
+    Args:
+        job_count: Nombre de jobs à insérer dans la base
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench_jobs.db")
+        store = JobStore(db_path)
+        now = time.time()
+        # Un dixième des jobs est déjà échu pour exercer le rattrapage au démarrage
+        rows = [
+            (f"{i:08x}", random.randint(1, 500), random.randint(1, 5000), f"user{i % 5000}",
+             f"Message programmé numéro {i}", now + random.uniform(-3600, 30 * 86400) if i % 10 else now - 60)
+            for i in range(job_count)
+        ]
+        started = time.perf_counter()
+        with store.conn:
+            store.conn.executemany(
+                "INSERT INTO jobs (job_id, channel_id, author_id, author_name, message, fire_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        print(f"Insertion de {job_count} jobs: {time.perf_counter() - started:.3f}s")
+        store.close()
+
+        started = time.perf_counter()
+        scheduler = MessageScheduler(None, job_store=JobStore(db_path))
+        elapsed = time.perf_counter() - started
+        print(f"Restauration à froid: {len(scheduler.jobs)} jobs en {elapsed:.3f}s "
+              f"({elapsed / max(len(scheduler.jobs), 1) * 1e6:.1f} µs/job)")
+        scheduler.store.close()
+
+
+def benchmark_memory(job_count):
+    """
+    Mesure la mémoire occupée par job_count jobs en attente (enregistrements,
+    file d'échéances et index), en octets par job.
+
+    Args:
+        job_count: Nombre de jobs à charger
+    """
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench_jobs.db")
+        store = JobStore(db_path)
+        now = time.time()
+        rng = random.Random(42)
+        # Peu d'auteurs et de textes distincts, comme sur un vrai serveur
+        with store.conn:
+            store.conn.executemany(
+                "INSERT INTO jobs (job_id, channel_id, author_id, author_name, message, fire_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (f"{i:08x}", 1_100_000_000_000_000_000 + rng.randint(1, 500),
+                     1_200_000_000_000_000_000 + i % 500, f"user{i % 500}",
+                     f"Rappel numéro {i % 1000}: pensez à vous inscrire à l'événement de ce soir !",
+                     now + rng.uniform(60, 90 * 86400))
+                    for i in range(job_count)
+                )
+            )
+        store.close()
+
+        gc.collect()
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        scheduler = MessageScheduler(None, job_store=JobStore(db_path))
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        scheduler.store.close()
+
+    count = len(scheduler.jobs)
+    print(f"{count} jobs en mémoire: {(current - baseline) / 1e6:.1f} Mo, "
+          f"{(current - baseline) / count:.0f} octets/job (pic pendant la restauration: "
+          f"{(peak - baseline) / count:.0f} octets/job)")
+
+
+class _FastForwardSelector(selectors.DefaultSelector):
+    """
+    Sélecteur qui ne bloque jamais: au lieu d'attendre la prochaine échéance,
+    il avance l'horloge virtuelle de la boucle jusqu'à elle.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.loop = None
+
+    def select(self, timeout=None):
+        events = super().select(0)
+        if not events and timeout:
+            self.loop.virtual_now += timeout
+        return events
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """
+    Boucle asyncio en temps simulé: asyncio.sleep et les timeouts s'exécutent
+    instantanément, dans l'ordre, sans attendre en temps réel.
+    """
+
+    def __init__(self):
+        selector = _FastForwardSelector()
+        super().__init__(selector)
+        selector.loop = self
+        self.virtual_now = 0.0
+
+    def time(self):
+        return self.virtual_now
+
+
+class FakeGuild:
+    """Serveur simulé."""
+
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.name = f"serveur {guild_id}"
+        self.member_count = 1000
+
+
+class FakeMessage:
+    """Message renvoyé par un envoi simulé."""
+
+    def __init__(self, message_id):
+        self.id = message_id
+
+
+class FakeChannel:
+    """Canal simulé: chaque envoi dure `latency` secondes de temps virtuel."""
+
+    def __init__(self, channel_id, guild, latency, stats):
+        self.id = channel_id
+        self.name = f"canal-{channel_id}"
+        self.guild = guild
+        self.latency = latency
+        self.stats = stats
+
+    async def send(self, content=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.stats['sent'] += 1
+        return FakeMessage(self.stats['sent'])
+
+
+class FakeBot:
+    """Bot simulé, toujours connecté, qui ne connaît que ses canaux simulés."""
+
+    def __init__(self, channels):
+        self.channels = channels
+
+    async def wait_until_ready(self):
+        return None
+
+    def is_closed(self):
+        return False
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def get_user(self, user_id):
+        return None
+
+
+def _simulated_fire_times(job_count, start, horizon):
+    """
+    Génère des heures d'envoi réalistes: la plupart des messages sont
+    programmés à l'heure pile ou à la demi-heure, une partie est répartie
+    uniformément, et quelques pics concentrent beaucoup d'envois sur la même minute.
+
+    Args:
+        job_count: Nombre d'heures à générer
+        start: Timestamp de début de la fenêtre
+        horizon: Durée de la fenêtre en secondes
+
+    Returns:
+        list: Les timestamps
+    """
+    rng = random.Random(42)
+    slots = max(1, int(horizon // 1800))
+    bursts = [start + rng.randrange(slots) * 1800 for _ in range(max(1, slots // 10))]
+    times = []
+    for _ in range(job_count):
+        roll = rng.random()
+        if roll < 0.6:
+            times.append(start + 1800 * (rng.randrange(slots) + 1))
+        elif roll < 0.9:
+            times.append(start + rng.uniform(1, horizon))
+        else:
+            times.append(rng.choice(bursts) + 1800 + rng.uniform(0, 60))
+    return times
+
+
+def benchmark_simulate(job_count, hours, latency, channel_count=200):
+    """
+    Programme job_count messages sur une fenêtre de `hours` heures puis fait
+    défiler le temps virtuel jusqu'au dernier envoi, avec des canaux simulés.
+    Affiche le temps CPU, la mémoire maximale, le retard d'envoi et le débit.
+
+    Args:
+        job_count: Nombre de messages à programmer
+        hours: Durée de la fenêtre de programmation
+        latency: Durée simulée de chaque envoi, en secondes
+        channel_count: Nombre de canaux simulés
+    """
+    # Les logs par message coûteraient plus cher que le scheduler lui-même
+    logging.disable(logging.WARNING)
+    loop = VirtualTimeLoop()
+    asyncio.set_event_loop(loop)
+    epoch = time.time()
+
+    def clock():
+        return epoch + loop.time()
+
+    stats = {'sent': 0}
+    guilds = [FakeGuild(guild_id) for guild_id in range(1, 11)]
+    channels = {
+        channel_id: FakeChannel(channel_id, guilds[channel_id % len(guilds)], latency, stats)
+        for channel_id in range(1, channel_count + 1)
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        scheduler = MessageScheduler(
+            FakeBot(channels), job_store=JobStore(os.path.join(tmp_dir, "bench_jobs.db")), clock=clock
+        )
+        # Quotas levés: le benchmark mesure le scheduler, pas les limites par serveur
+        for guild in guilds:
+            for name in DEFAULT_QUOTAS:
+                scheduler.set_guild_setting(guild.id, f'quota_{name}', str(10 ** 12))
+        fire_times = _simulated_fire_times(job_count, clock(), hours * 3600)
+        rng = random.Random(7)
+        cpu_started = time.process_time()
+        wall_started = time.perf_counter()
+        scheduler.schedule_messages(
+            {
+                'channel_id': rng.randint(1, channel_count),
+                'message': f"Message programmé numéro {i}",
+                'time': datetime.fromtimestamp(fire_at, timezone.utc),
+                'author_id': rng.randint(1, 5000),
+                'author_name': f"user{i % 5000}",
+            }
+            for i, fire_at in enumerate(fire_times)
+        )
+        schedule_cpu = time.process_time() - cpu_started
+
+        async def run():
+            scheduler.start()
+            while stats['sent'] < job_count:
+                await asyncio.sleep(60)
+            scheduler.stop()
+
+        dispatch_started = time.process_time()
+        loop.run_until_complete(run())
+        dispatch_cpu = time.process_time() - dispatch_started
+        wall = time.perf_counter() - wall_started
+        scheduler.store.close()
+    loop.close()
+
+    snapshot = scheduler.metrics.snapshot()
+    lag = snapshot['lag_seconds']
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{stats['sent']} envois simulés sur {loop.virtual_now / 3600:.1f} h de temps virtuel "
+          f"en {wall:.1f}s réelles")
+    print(f"Temps CPU: programmation {schedule_cpu:.2f}s, dispatch {dispatch_cpu:.2f}s "
+          f"({dispatch_cpu / max(stats['sent'], 1) * 1e6:.0f} µs/envoi)")
+    print(f"Débit: {stats['sent'] / max(dispatch_cpu, 1e-9):.0f} envois par seconde CPU")
+    print(f"Mémoire maximale (RSS): {peak_rss:.0f} Mo")
+    print("Retard d'envoi: " + ", ".join(
+        f"{name} {lag[name]:.3f}s" for name in ('p50', 'p90', 'p99', 'max') if lag[name] is not None
+    ))
+
+
+def main():
+    """Point d'entrée principal."""
+    parser = argparse.ArgumentParser(description="Benchmarks du scheduler de messages")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    restore_parser = subparsers.add_parser("restore", help="Temps de restauration au démarrage")
+    restore_parser.add_argument("--jobs", type=int, default=100_000)
+
+    simulate_parser = subparsers.add_parser("simulate", help="Dispatch simulé en temps virtuel")
+    simulate_parser.add_argument("--jobs", type=int, default=100_000)
+    simulate_parser.add_argument("--hours", type=float, default=24, help="Fenêtre de programmation")
+    simulate_parser.add_argument("--latency", type=float, default=0.05, help="Durée simulée d'un envoi (s)")
+    simulate_parser.add_argument("--channels", type=int, default=200)
+
+    memory_parser = subparsers.add_parser("memory", help="Mémoire occupée par job en attente")
+    memory_parser.add_argument("--jobs", type=int, default=100_000)
+
+    args = parser.parse_args()
+    if args.benchmark == "restore":
+        benchmark_restore(args.jobs)
+    elif args.benchmark == "simulate":
+        benchmark_simulate(args.jobs, args.hours, args.latency, args.channels)
+    elif args.benchmark == "memory":
+        benchmark_memory(args.jobs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Content-addressed storage on disk for the attachments of scheduled messages.
+"""
+import hashlib
+import logging
+import os
+import uuid
+
+import aiohttp
+import discord
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Dossier par défaut des pièces jointes (à côté de scheduled_jobs.db)
+DEFAULT_BLOB_DIR = "scheduled_attachments"
+
+# Limites de Discord pour un message envoyé par un bot
+MAX_ATTACHMENTS = 10
+MAX_ATTACHMENT_BYTES = 25 * 1024 * 1024
+
+# Taille des blocs lus et écrits pendant les téléchargements
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class BlobStore:
+    """
+    Keeps the attachments of scheduled messages as files named after the
+    SHA-256 of their content, so an image scheduled by many jobs is stored
+    once. Attachments are streamed to disk when the message is scheduled and
+    streamed from disk when it is sent. The reference counts live in the job
+    store: a blob is deleted when the last job using it is sent or cancelled,
+    unless a dead letter still keeps it for a replay.
+    """
+
+    def __init__(self, store, root=DEFAULT_BLOB_DIR):
+        """
+        Initialize the blob directory.
+
+        Args:
+            store: The JobStore holding the reference counts
+            root: Directory of the blob files
+        """
+        self.store = store
+        self.root = root
+        self._tmp = os.path.join(root, "tmp")
+        os.makedirs(self._tmp, exist_ok=True)
+
+    def path(self, digest):
+        """
+        Get the file of a blob.
+
+        Args:
+            digest: The SHA-256 hex digest of the content
+
+        Returns:
+            str: The path of the file
+        """
+        # Un sous-dossier par préfixe pour ne pas accumuler des milliers de fichiers dans un seul dossier
+        return os.path.join(self.root, digest[:2], digest)
+
+    async def _download(self, session, attachment):
+        """
+        Stream an attachment to a blob file, hashing it on the way.
+
+        Args:
+            session: The aiohttp.ClientSession used for the download
+            attachment: The discord.Attachment
+
+        Returns:
+            str: The digest of the content
+        """
+        hasher = hashlib.sha256()
+        tmp_path = os.path.join(self._tmp, uuid.uuid4().hex)
+        try:
+            async with session.get(attachment.url) as response:
+                response.raise_for_status()
+                with open(tmp_path, 'wb') as tmp:
+                    async for block in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                        hasher.update(block)
+                        tmp.write(block)
+            digest = hasher.hexdigest()
+            os.makedirs(os.path.dirname(self.path(digest)), exist_ok=True)
+            # Remplacer même si le blob existe: un ramasse-miettes concurrent a pu le supprimer entre-temps.
+            # La référence est prise juste après, sans point d'attente entre les deux
+            os.replace(tmp_path, self.path(digest))
+            self.store.acquire_blob(digest, attachment.size)
+            return digest
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    async def fetch(self, attachments):
+        """
+        Download the attachments of a command, each taking one reference on its blob.
+        The references are handed over to the job scheduled with them.
+
+        Args:
+            attachments: The discord.Attachment objects, in order
+
+        Returns:
+            tuple: (digest, filename, size) triples, in order
+
+        Raises:
+            ValueError: If there are too many attachments, one is too large or cannot be downloaded
+        """
+        if len(attachments) > MAX_ATTACHMENTS:
+            raise ValueError(f"Trop de pièces jointes ({MAX_ATTACHMENTS} au maximum)")
+        for attachment in attachments:
+            if attachment.size > MAX_ATTACHMENT_BYTES:
+                raise ValueError(f"Pièce jointe trop volumineuse: {attachment.filename} "
+                                 f"({MAX_ATTACHMENT_BYTES // (1024 * 1024)} Mo au maximum)")
+        stored = []
+        try:
+            async with aiohttp.ClientSession() as session:
+                for attachment in attachments:
+                    stored.append((await self._download(session, attachment), attachment.filename, attachment.size))
+        except (aiohttp.ClientError, OSError) as e:
+            self.release(digest for digest, _, _ in stored)
+            logger.error(f"Téléchargement de pièce jointe impossible: {e}")
+            raise ValueError(f"Impossible de télécharger la pièce jointe {attachment.filename}")
+        logger.info(f"{len(stored)} pièce(s) jointe(s) enregistrée(s)")
+        return tuple(stored)
+
+    def files(self, attachments):
+        """
+        Open the attachments of a job for sending. Each file is read from disk
+        as it is uploaded, and closed by discord.py once the request is done.
+
+        Args:
+            attachments: The (digest, filename, size) triples of the job
+
+        Returns:
+            list: New discord.File objects (a send needs fresh ones at every attempt)
+        """
+        return [discord.File(self.path(digest), filename=filename) for digest, filename, _ in attachments]
+
+    def retain(self, attachments):
+        """
+        Take one more reference on the blobs of some attachments, for a new job
+        scheduled with the files of another job or of a dead letter.
+
+        Args:
+            attachments: The (digest, filename, size) triples
+        """
+        for digest, _, size in attachments:
+            self.store.acquire_blob(digest, size)
+
+    def release(self, digests):
+        """
+        Drop one reference on each blob, deleting those no job uses any more.
+
+        Args:
+            digests: Iterable of digests
+        """
+        self.discard(self.store.release_blobs(list(digests)))
+
+    def discard(self, digests):
+        """
+        Delete blob files whose reference count fell to zero.
+
+        Args:
+            digests: The digests returned by the job store
+        """
+        for digest in digests:
+            try:
+                os.remove(self.path(digest))
+            except FileNotFoundError:
+                pass
+        if digests:
+            logger.info(f"{len(digests)} pièce(s) jointe(s) supprimée(s) du disque")
+
+    def collect(self):
+        """
+        Recount the references from the stored jobs and dead letters and delete every
+        file none of them uses (downloads interrupted or never scheduled before a restart).
+
+        Returns:
+            int: Number of files deleted
+        """
+        live = self.store.recount_blobs()
+        deleted = 0
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if directory == self._tmp or filename not in live:
+                    os.remove(os.path.join(directory, filename))
+                    deleted += 1
+        if deleted:
+            logger.info(f"{deleted} fichier(s) de pièces jointes inutilisé(s) supprimé(s)")
+        return deleted
@@ -2,19 +2,21 @@
 Discord bot implementation for scheduling messages.
 """
 import logging
-import asyncio
+import os
 import discord
 from discord.ext import commands
-from datetime import datetime, timedelta  # Importer timedelta explicitement
+from datetime import datetime, timedelta, timezone  # Importer timedelta explicitement
 import re
-import pytz  # Pour gérer les fuseaux horaires
+import io
+import csv
+import json
 
-from scheduler import MessageScheduler
+from scheduler import MessageScheduler, ATTRIBUTION_MODES, DELIVERY_MODES, CATCHUP_POLICIES, MAX_FANOUT_TARGETS
+from job_store import JobStore, DEFAULT_DB_PATH
+from timezones import get_zone
+from quotas import QuotaExceeded, DEFAULT_QUOTAS, QUOTA_DESCRIPTIONS
 from ticket_manager import TicketManager
 
-# Définir le fuseau horaire à utiliser (Europe/Paris pour la France)
-TIMEZONE = pytz.timezone('Europe/Paris')
-
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -24,6 +26,9 @@ intents = discord.Intents.default()
 # Message Content Intent est nécessaire pour lire les commandes avec préfixe
 # Cet intent doit être explicitement activé dans le portail développeur Discord
 intents.message_content = True
+# Intent privilégié "Server Members", nécessaire aux campagnes de MP (!dmcampaign).
+# À activer aussi dans le portail développeur, sinon la connexion du bot échoue
+intents.members = os.environ.get("DISCORD_MEMBERS_INTENT") == "1"
 logger.warning("IMPORTANT: L'intent 'message_content' est activé dans le code.")
 logger.warning("IMPORTANT: Vous devez également l'activer dans le portail développeur Discord:")
 logger.warning("IMPORTANT: 1. Allez sur https://discord.com/developers/applications")
@@ -32,16 +37,37 @@ logger.warning("IMPORTANT: 3. Dans 'Bot', activez 'Message Content Intent'")
 logger.warning("IMPORTANT: 4. Sauvegardez les changements")
 logger.warning("IMPORTANT: Si cette étape n'est pas effectuée, le bot ne pourra pas lire les commandes.")
 
+# Plusieurs instances partageant la même base (SCHEDULER_DB_PATH) doivent se répartir les serveurs
+# en shards Discord (DISCORD_SHARD_ID / DISCORD_SHARD_COUNT): sinon chaque instance reçoit chaque
+# commande, et un seul !schedule crée un job par instance que les baux ne peuvent pas dédoublonner
+shard_id = os.environ.get("DISCORD_SHARD_ID")
+shard_count = os.environ.get("DISCORD_SHARD_COUNT")
+sync_interval = os.environ.get("SCHEDULER_SYNC_INTERVAL")
+if (shard_id is None) != (shard_count is None):
+    raise RuntimeError("DISCORD_SHARD_ID et DISCORD_SHARD_COUNT doivent être définies ensemble")
+if sync_interval and shard_count is None:
+    raise RuntimeError("SCHEDULER_SYNC_INTERVAL (plusieurs instances) nécessite DISCORD_SHARD_ID et "
+                       "DISCORD_SHARD_COUNT: chaque instance doit gérer ses propres serveurs")
+shard_options = {'shard_id': int(shard_id), 'shard_count': int(shard_count)} if shard_count else {}
+
 # Configuration pour Discord.py v2.5.2
 bot = commands.Bot(
     command_prefix='!', 
     intents=intents,
     description="Bot de programmation de messages automatisés",
     help_command=commands.DefaultHelpCommand(),  # Utilisation de la commande d'aide par défaut
+    **shard_options
 )
 
 # Initialize the message scheduler
-scheduler = MessageScheduler(bot)
+# Avec plusieurs instances (une par shard), chaque job n'est envoyé qu'une fois grâce aux baux, et
+# SCHEDULER_SYNC_INTERVAL (secondes) règle la prise en charge des jobs programmés depuis les autres
+scheduler = MessageScheduler(
+    bot,
+    job_store=JobStore(os.environ.get("SCHEDULER_DB_PATH", DEFAULT_DB_PATH)),
+    instance_id=os.environ.get("SCHEDULER_INSTANCE_ID"),
+    sync_interval=float(sync_interval) if sync_interval else None
+)
 
 # Initialize the ticket manager
 ticket_manager = TicketManager(bot)
@@ -49,116 +75,14 @@ ticket_manager = TicketManager(bot)
 # Rendre les commandes insensibles à la casse
 bot.case_insensitive = True
 
-# Ajouter un checker de messages en attente avec debug supplémentaire
-async def check_pending_messages():
-    """
-    Fonction qui vérifie périodiquement s'il y a des messages à envoyer
-    """
-    await bot.wait_until_ready()
-    logger.info("Démarrage du vérificateur de messages en attente")
-    while not bot.is_closed():
-        try:
-            now = datetime.now(TIMEZONE)
-            jobs_to_execute = []
-            
-            # Afficher tous les jobs actuellement programmés
-            logger.info(f"VERIFICATION - {len(scheduler.jobs)} messages programmés au total")
-            for job_id, details in list(scheduler.jobs.items()):
-                scheduled_time = details['time']
-                channel_id = details['channel_id']
-                msg_preview = details['message'][:30] + "..." if len(details['message']) > 30 else details['message']
-                logger.info(f"DEBUG - Job {job_id}: prévu pour {scheduled_time}, canal {channel_id}, message: {msg_preview}")
-                
-                # Ajouter +01:00 à l'heure programmée si elle n'a pas de timezone
-                if scheduled_time.tzinfo is None:
-                    scheduled_time = TIMEZONE.localize(scheduled_time)
-                    logger.info(f"DEBUG - Conversion timezone: {scheduled_time}")
-                
-                # Calculer si le message doit être envoyé maintenant
-                send_now = False
-                time_diff = (scheduled_time - now).total_seconds()
-                logger.info(f"DEBUG - Différence de temps: {time_diff} secondes")
-                
-                # Considérer comme "à envoyer" si la différence est de moins de 10 secondes
-                # ou si le message est en retard (différence négative)
-                if time_diff <= 10:
-                    send_now = True
-                    logger.info(f"🔍 MESSAGE À ENVOYER DÉTECTÉ: Job {job_id} prévu pour {scheduled_time} (maintenant: {now})")
-                    jobs_to_execute.append((job_id, details))
-            
-            # Exécuter les jobs trouvés
-            for job_id, details in jobs_to_execute:
-                channel_id = details['channel_id']
-                message = details['message']
-                author_id = details['author_id']
-                
-                logger.info(f"⚡ EXÉCUTION DIRECTE du job {job_id}")
-                try:
-                    # Essayer d'obtenir le canal directement
-                    channel = bot.get_channel(channel_id)
-                    if not channel:
-                        logger.error(f"❌ Canal {channel_id} introuvable")
-                        continue
-                    
-                    # Envoyer le message directement
-                    logger.info(f"📨 Envoi du message dans le canal {channel.name} ({channel_id})")
-                    sent_message = await channel.send(message)
-                    logger.info(f"✅ Message envoyé avec succès: {sent_message.id}")
-                    
-                    # Ajouter les informations de programmation avec le nom d'utilisateur stocké
-                    # Récupérer le nom d'auteur depuis les détails du job
-                    if 'author_name' in details and details['author_name']:
-                        username = details['author_name']
-                        logger.info(f"Utilisation du nom d'auteur stocké: {username}")
-                    else:
-                        # Fallback au cas où le nom n'a pas été stocké
-                        user = bot.get_user(author_id)
-                        username = user.name if user else "Utilisateur inconnu"
-                        logger.info(f"Fallback vers le nom d'auteur récupéré via API: {username}")
-                    
-                    # Envoyer un embed comme réponse avec le nom en gras pour plus de visibilité
-                    await channel.send(
-                        embed=discord.Embed(
-                            description=f"📅 Ce message a été programmé par **{username}**",
-                            color=discord.Color.green()
-                        ),
-                        reference=sent_message
-                    )
-                    logger.info(f"✅ Informations de programmation ajoutées")
-                    
-                    # Supprimer le job après exécution réussie
-                    if job_id in scheduler.jobs:
-                        del scheduler.jobs[job_id]
-                        logger.info(f"✓ Job {job_id} supprimé de la liste des jobs")
-                    
-                    # Supprimer également du scheduler APScheduler
-                    try:
-                        scheduler.scheduler.remove_job(job_id)
-                        logger.info(f"✓ Job {job_id} supprimé du scheduler APScheduler")
-                    except Exception as e:
-                        logger.warning(f"⚠️ Erreur lors de la suppression du job {job_id} du scheduler: {e}")
-                except Exception as e:
-                    logger.error(f"❌ Erreur lors de l'exécution directe du job {job_id}: {e}")
-                    import traceback
-                    logger.error(traceback.format_exc())
-            
-            # Attendre 5 secondes avant la prochaine vérification
-            await asyncio.sleep(5)
-        except Exception as e:
-            logger.error(f"Erreur dans la boucle de vérification: {e}")
-            import traceback
-            logger.error(f"Stack trace: {traceback.format_exc()}")
-            await asyncio.sleep(10)  # Attendre plus longtemps en cas d'erreur
-
 # Dans Discord.py v2.5+, nous définissons setup_hook comme une fonction asynchrone
 async def setup_hook():
     """Fonction appelée au démarrage du bot, avant on_ready"""
     logger.info("Bot setup_hook called")
     
-    # Démarrer la tâche de vérification des messages en arrière-plan après un court délai
-    # pour s'assurer que tout est initialisé
-    await asyncio.sleep(2)
-    bot.loop.create_task(check_pending_messages())
+    # Démarrer le dispatcher des messages programmés sur la boucle d'événements du bot
+    # (il attend lui-même que le bot soit prêt avant d'envoyer quoi que ce soit)
+    scheduler.start()
     
 # Assignation de la méthode setup_hook
 bot.setup_hook = setup_hook
@@ -168,6 +92,8 @@ async def on_ready():
     """Called when the bot is ready and connected to Discord."""
     logger.info(f'Bot connected as {bot.user.name} (ID: {bot.user.id})')
     logger.info(f'Connected to {len(bot.guilds)} servers')
+    # Après une reconnexion, l'état du gateway est reconstruit: les permissions en cache peuvent être périmées
+    scheduler.channels.clear()
     
     # Définir l'activité du bot
     await bot.change_presence(activity=discord.Activity(
@@ -175,10 +101,6 @@ async def on_ready():
         name="for scheduled messages | !help"
     ))
     
-    # Start the scheduler once the bot is ready
-    scheduler.start()
-    logger.info("Scheduler started after bot is ready")
-    
     # Log pour indiquer que les commandes sont disponibles
     logger.info(f"Bot ready with {len(bot.commands)} commands loaded: {[cmd.name for cmd in bot.commands]}")
 
@@ -197,7 +119,7 @@ async def test_message(ctx, *, message: str):
         await ctx.send(f"⏱️ Test d'envoi immédiat en cours...")
         
         # Ajouter le message dans le scheduler pour exécution immédiate (dans 5 secondes)
-        now = datetime.now()
+        now = datetime.now(timezone.utc)
         target_time = now + timedelta(seconds=5)
         
         # Récupérer le nom d'utilisateur pour le stocker avec le message
@@ -220,6 +142,138 @@ async def test_message(ctx, *, message: str):
         logger.error(f"Erreur lors du test d'envoi: {e}")
         await ctx.send(f"❌ Erreur lors du test: {str(e)}")
 
+def parse_target_time(time_str, guild_id=None):
+    """
+    Convertit l'heure d'une commande en datetime, dans le fuseau horaire du serveur.
+    
+    Args:
+        time_str: L'heure au format "YYYY-MM-DD HH:MM" ou "HH:MM" (aujourd'hui, ou demain si déjà passée)
+        guild_id: Le serveur dont le fuseau horaire s'applique (None: fuseau par défaut)
+        
+    Returns:
+        datetime: L'heure cible (avec fuseau horaire)
+        
+    Raises:
+        ValueError: Si le format est invalide ou si l'heure est dans le passé
+    """
+    zone = scheduler.timezone_for_guild(guild_id)
+    now = scheduler.clock()
+    local_now = zone.to_local(now)
+    
+    # Check if the time string includes a date
+    if re.match(r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}$', time_str):
+        # Format: YYYY-MM-DD HH:MM
+        try:
+            target_time = datetime.strptime(time_str, '%Y-%m-%d %H:%M')
+        except ValueError as e:
+            raise ValueError(f"Format de date invalide: {e}")
+    elif re.match(r'^\d{2}:\d{2}$', time_str):
+        # Format: HH:MM (today)
+        try:
+            hour, minute = map(int, time_str.split(':'))
+            target_time = local_now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        except ValueError as e:
+            raise ValueError(f"Format d'heure invalide: {e}")
+        
+        # Si l'heure est déjà passée aujourd'hui, programmer pour demain (timedelta gère les fins de mois)
+        if target_time <= local_now:
+            target_time += timedelta(days=1)
+    else:
+        raise ValueError("Format d'heure invalide. Utilisez 'YYYY-MM-DD HH:MM' ou 'HH:MM'.")
+    
+    # Check if the target time is in the past
+    fire_at = zone.to_timestamp(target_time)
+    if fire_at < now:
+        raise ValueError("Impossible de programmer des messages dans le passé.")
+    
+    return datetime.fromtimestamp(fire_at, zone.zone)
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'j': 86400, 'd': 86400}
+
+def parse_duration(duration_str):
+    """
+    Convertit une durée de commande en secondes.
+    
+    Args:
+        duration_str: La durée, un nombre suivi de s, m, h ou j (ex: "30m", "2h", "1j")
+        
+    Returns:
+        int: La durée en secondes
+        
+    Raises:
+        ValueError: Si le format est invalide ou la durée nulle
+    """
+    match = re.match(r'^(\d+)([smhjd])$', duration_str.strip().lower())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError("Durée invalide. Utilisez un nombre suivi de s, m, h ou j (ex: `30m`, `2h`, `1j`).")
+    return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+async def resolve_target_channel(ctx, rest):
+    """
+    Extrait le canal cible (mention <#id> optionnelle) et le message d'une commande.
+    
+    Args:
+        ctx: Le contexte de la commande
+        rest: Le reste de la commande (mention de canal + message ou juste message)
+        
+    Returns:
+        tuple: (canal, ID du canal, message), ou (None, None, None) si une erreur a été signalée
+    """
+    # On cherche d'abord s'il y a une mention de canal au format <#ID>
+    logger.info(f"Contenu brut de la commande: '{rest.strip()}'")
+    
+    # Nouvelles options de commande supportées:
+    # 1. !schedule HH:MM <#canal_id> message
+    # 2. !schedule HH:MM message (utilise le canal actuel)
+    
+    # On commence par analyser si un canal est spécifié
+    # Format attendu: <#NUMBERS> suivie du message (peut contenir des sauts de ligne)
+    
+    # Rechercher le motif <#NUMBERS> au début du message avec re.DOTALL pour capturer les sauts de ligne
+    channel_match = re.match(r'^<#(\d+)>\s+(.+)', rest.strip(), re.DOTALL)
+    if channel_match:
+        # Si trouvé: prendre le canal spécifié et le message après
+        channel_id_str = channel_match.group(1)
+        channel_id = int(channel_id_str)
+        # Préserver les sauts de ligne dans le message
+        message = channel_match.group(2)
+        
+        # Log détaillé des sauts de ligne dans le message
+        newline_count = message.count('\n')
+        logger.info(f"Message avec canal contient {newline_count} sauts de ligne")
+        
+        logger.info(f"Canal trouvé dans la commande (format: <#id>): ID={channel_id}")
+        logger.info(f"Message extrait: '{message}'")
+        
+        # Récupérer le canal
+        channel = await scheduler.channels.resolve(channel_id)
+        if not channel:
+            await ctx.send(f"❌ Canal introuvable: <#{channel_id}>")
+            return None, None, None
+            
+        # Vérifier les permissions
+        if not scheduler.channels.can_send(channel):
+            await ctx.send(f"❌ Je n'ai pas la permission d'envoyer des messages dans <#{channel_id}>")
+            return None, None, None
+            
+        logger.info(f"Canal spécifié trouvé: {channel.name} (ID: {channel_id})")
+    else:
+        # Si pas trouvé: utiliser le canal actuel
+        channel = ctx.channel
+        channel_id = ctx.channel.id
+        # Préserver les sauts de ligne dans le message sans strip() excessif
+        message = rest
+        
+        # Log détaillé des sauts de ligne dans le message
+        newline_count = message.count('\n')
+        logger.info(f"Message sans canal contient {newline_count} sauts de ligne")
+        
+        logger.info(f"Pas de canal spécifié dans la commande, utilisation du canal actuel: {channel.name} (ID: {channel_id})")
+        # Attention: on utilise repr() pour voir les caractères spéciaux dans les logs
+        logger.info(f"Message complet (repr): {repr(message)}")
+    
+    return channel, channel_id, message
+
 # Définition de la commande schedule avec préfixe et gestion améliorée des messages
 @bot.command(name='schedule', help='Programme un message à envoyer ultérieurement. Format: !schedule <heure> [#canal] <message> ou !schedule <heure> <#canal> <message>')
 async def schedule_message(ctx, time_str: str, *, rest: str = None):
@@ -232,127 +286,25 @@ async def schedule_message(ctx, time_str: str, *, rest: str = None):
         rest: The rest of the command (channel mention + message or just message)
     """
     try:
-        # Vérifier que le reste de la commande est fourni
-        if rest is None:
+        # Vérifier que le reste de la commande est fourni (un message peut se limiter à ses pièces jointes)
+        if rest is None and not ctx.message.attachments:
             await ctx.send("❌ Message manquant. Format: `!schedule <heure> [#canal] <message>`")
             return
         
         logger.info(f"Commande schedule reçue: heure={time_str}, reste={rest}")
         
-        # Parse the time string
-        # Utiliser le fuseau horaire Europe/Paris
-        now = datetime.now(TIMEZONE)
-        logger.info(f"Heure actuelle avec timezone: {now}")
-        
-        # Check if the time string includes a date
-        if re.match(r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}$', time_str):
-            # Format: YYYY-MM-DD HH:MM
-            try:
-                # Créer un datetime naïf (sans timezone)
-                naive_time = datetime.strptime(time_str, '%Y-%m-%d %H:%M')
-                logger.info(f"Date parsée (naïve): {naive_time}")
-                
-                # Garder le datetime naïf pour APScheduler
-                target_time = naive_time
-                logger.info(f"Date cible finale (naïve): {target_time}")
-            except ValueError as e:
-                logger.error(f"Erreur lors du parsing de la date: {e}")
-                await ctx.send(f"❌ Format de date invalide: {e}")
-                return
-                
-        elif re.match(r'^\d{2}:\d{2}$', time_str):
-            # Format: HH:MM (today)
-            try:
-                hour, minute = map(int, time_str.split(':'))
-                
-                # Créer un datetime naïf basé sur aujourd'hui
-                naive_now = datetime.now()  # Sans timezone
-                naive_time = naive_now.replace(hour=hour, minute=minute, second=0, microsecond=0)
-                logger.info(f"Heure aujourd'hui (naïve): {naive_time}")
-                
-                # Si l'heure est dans le passé par rapport à l'heure actuelle, programmer pour demain
-                if naive_time.hour < naive_now.hour or (naive_time.hour == naive_now.hour and naive_time.minute <= naive_now.minute):
-                    naive_time = naive_time.replace(day=naive_now.day+1)
-                    logger.info(f"Heure ajustée pour demain (naïve): {naive_time}")
-                
-                # Garder le datetime naïf pour APScheduler
-                target_time = naive_time
-                logger.info(f"Date cible finale (naïve): {target_time}")
-            except ValueError as e:
-                logger.error(f"Erreur lors du parsing de l'heure: {e}")
-                await ctx.send(f"❌ Format d'heure invalide: {e}")
-                return
-        else:
-            await ctx.send("❌ Format d'heure invalide. Utilisez 'YYYY-MM-DD HH:MM' ou 'HH:MM'.")
-            return
-        
-        # Check if the target time is in the past
-        # Convertir target_time en datetime avec timezone pour comparaison avec now
-        target_time_tz = TIMEZONE.localize(target_time)
-        if target_time_tz < now:
-            await ctx.send("❌ Impossible de programmer des messages dans le passé.")
-            logger.info(f"Message rejeté: date dans le passé. Cible: {target_time_tz}, Maintenant: {now}")
-            return
+        # Parse the time string (fuseau horaire Europe/Paris)
+        target_time = parse_target_time(time_str, ctx.guild.id if ctx.guild else None)
         
-        logger.info(f"Date cible valide (future): {target_time_tz} > {now}")
+        logger.info(f"Date cible valide (future): {target_time}")
         
         # Traiter le reste de la commande (message et éventuellement canal)
-        # On cherche d'abord s'il y a une mention de canal au format <#ID>
-        logger.info(f"Contenu brut de la commande: '{rest.strip()}'")
-        
-        # Nouvelles options de commande supportées:
-        # 1. !schedule HH:MM <#canal_id> message
-        # 2. !schedule HH:MM message (utilise le canal actuel)
-        
-        # On commence par analyser si un canal est spécifié
-        # Format attendu: <#NUMBERS> suivie du message (peut contenir des sauts de ligne)
-        
-        # Rechercher le motif <#NUMBERS> au début du message avec re.DOTALL pour capturer les sauts de ligne
-        channel_match = re.match(r'^<#(\d+)>\s+(.+)', rest.strip(), re.DOTALL)
-        if channel_match:
-            # Si trouvé: prendre le canal spécifié et le message après
-            channel_id_str = channel_match.group(1)
-            channel_id = int(channel_id_str)
-            # Préserver les sauts de ligne dans le message
-            message = channel_match.group(2)
-            
-            # Log détaillé des sauts de ligne dans le message
-            newline_count = message.count('\n')
-            logger.info(f"Message avec canal contient {newline_count} sauts de ligne")
-            
-            logger.info(f"Canal trouvé dans la commande (format: <#id>): ID={channel_id}")
-            logger.info(f"Message extrait: '{message}'")
-            
-            # Récupérer le canal
-            channel = bot.get_channel(channel_id)
-            if not channel:
-                await ctx.send(f"❌ Canal introuvable: <#{channel_id}>")
-                return
-                
-            # Vérifier les permissions
-            permissions = channel.permissions_for(ctx.guild.me)
-            if not permissions.send_messages:
-                await ctx.send(f"❌ Je n'ai pas la permission d'envoyer des messages dans <#{channel_id}>")
-                return
-                
-            logger.info(f"Canal spécifié trouvé: {channel.name} (ID: {channel_id})")
-        else:
-            # Si pas trouvé: utiliser le canal actuel
-            channel = ctx.channel
-            channel_id = ctx.channel.id
-            # Préserver les sauts de ligne dans le message sans strip() excessif
-            message = rest
-            
-            # Log détaillé des sauts de ligne dans le message
-            newline_count = message.count('\n')
-            logger.info(f"Message sans canal contient {newline_count} sauts de ligne")
-            
-            logger.info(f"Pas de canal spécifié dans la commande, utilisation du canal actuel: {channel.name} (ID: {channel_id})")
-            # Attention: on utilise repr() pour voir les caractères spéciaux dans les logs
-            logger.info(f"Message complet (repr): {repr(message)}")
+        channel, channel_id, message = await resolve_target_channel(ctx, rest or "")
+        if channel is None:
+            return
         
         # Vérifier que le message n'est pas vide
-        if not message:
+        if not message and not ctx.message.attachments:
             await ctx.send("❌ Message vide. Veuillez spécifier un message à envoyer.")
             return
             
@@ -365,21 +317,29 @@ async def schedule_message(ctx, time_str: str, *, rest: str = None):
         # Log des informations de l'auteur
         logger.info(f"Auteur de la commande: {author_name} (affichage: {author_display_name}, ID: {ctx.author.id})")
         
+        # Les pièces jointes sont copiées maintenant: le message Discord d'origine peut être supprimé d'ici l'envoi
+        attachments = await scheduler.blobs.fetch(ctx.message.attachments) if ctx.message.attachments else None
+        
         # Schedule the message avec le nom de l'auteur
         job_id = scheduler.schedule_message(
             channel_id=channel_id,
             message=message,
             time=target_time,
             author_id=ctx.author.id,
-            author_name=author_display_name  # Utiliser le nom d'affichage plutôt que le nom d'utilisateur
+            author_name=author_display_name,  # Utiliser le nom d'affichage plutôt que le nom d'utilisateur
+            attachments=attachments
         )
         
         # Send confirmation
+        chunks = scheduler.jobs[job_id].chunks
+        split_text = f" Il sera envoyé en {len(chunks)} messages." if chunks else ""
+        if attachments:
+            split_text += f" {len(attachments)} pièce(s) jointe(s) l'accompagneront."
         if channel.id != ctx.channel.id:
             channel_mention = f"<#{channel.id}>"
-            await ctx.send(f"✅ Message programmé pour le {target_time.strftime('%Y-%m-%d %H:%M')} dans {channel_mention}. ID de tâche: `{job_id}`")
+            await ctx.send(f"✅ Message programmé pour le {target_time.strftime('%Y-%m-%d %H:%M')} dans {channel_mention}. ID de tâche: `{job_id}`{split_text}")
         else:
-            await ctx.send(f"✅ Message programmé pour le {target_time.strftime('%Y-%m-%d %H:%M')}. ID de tâche: `{job_id}`")
+            await ctx.send(f"✅ Message programmé pour le {target_time.strftime('%Y-%m-%d %H:%M')}. ID de tâche: `{job_id}`{split_text}")
     
     except ValueError as e:
         await ctx.send(f"❌ Erreur: {str(e)}")
@@ -387,6 +347,416 @@ async def schedule_message(ctx, time_str: str, *, rest: str = None):
         logger.error(f"Erreur lors de la programmation du message: {e}")
         await ctx.send("❌ Une erreur s'est produite lors de la programmation de votre message.")
 
+@bot.command(name='tempschedule', help='Programme un message qui se supprime après une durée. Format: !tempschedule <heure> <durée> [#canal] <message>')
+async def schedule_temporary(ctx, time_str: str, duration_str: str, *, rest: str = None):
+    """
+    Programme une annonce temporaire, supprimée automatiquement après la durée indiquée.
+    
+    Args:
+        ctx: Le contexte de la commande
+        time_str: L'heure d'envoi ("YYYY-MM-DD HH:MM" ou "HH:MM")
+        duration_str: La durée d'affichage (ex: "30m", "2h", "1j")
+        rest: Le canal optionnel suivi du message
+    """
+    try:
+        if rest is None:
+            await ctx.send("❌ Message manquant. Format: `!tempschedule <heure> <durée> [#canal] <message>`")
+            return
+        target_time = parse_target_time(time_str, ctx.guild.id if ctx.guild else None)
+        ttl = parse_duration(duration_str)
+        
+        channel, channel_id, message = await resolve_target_channel(ctx, rest)
+        if channel is None:
+            return
+        if not message:
+            await ctx.send("❌ Message vide. Veuillez spécifier un message à envoyer.")
+            return
+        
+        author_display_name = getattr(ctx.author, 'display_name', None) or ctx.author.name
+        job_id = scheduler.schedule_message(
+            channel_id=channel_id,
+            message=message,
+            time=target_time,
+            author_id=ctx.author.id,
+            author_name=author_display_name,
+            ttl=ttl
+        )
+        
+        channel_text = f" dans <#{channel_id}>" if channel_id != ctx.channel.id else ""
+        await ctx.send(
+            f"✅ Message temporaire programmé pour le {target_time.strftime('%Y-%m-%d %H:%M')}{channel_text}, "
+            f"supprimé {duration_str} après son envoi. ID de tâche: `{job_id}`"
+        )
+    
+    except ValueError as e:
+        await ctx.send(f"❌ Erreur: {str(e)}")
+    except Exception as e:
+        logger.error(f"Erreur lors de la programmation du message temporaire: {e}")
+        await ctx.send("❌ Une erreur s'est produite lors de la programmation de votre message.")
+
+async def author_can_send(ctx, channel):
+    """
+    Vérifie que l'auteur d'une commande peut écrire dans un canal de serveur, éventuellement
+    sur un autre serveur. Fonctionne sans l'intent "Server Members": le membre n'est alors
+    pas en cache et il est demandé à l'API pour les autres serveurs.
+    
+    Args:
+        ctx: Le contexte de la commande
+        channel: Le canal cible (doit appartenir à un serveur)
+        
+    Returns:
+        bool: True si l'auteur est membre du serveur du canal et peut y envoyer des messages
+    """
+    guild = channel.guild
+    if ctx.guild is not None and guild.id == ctx.guild.id:
+        member = ctx.author
+    else:
+        try:
+            member = await guild.fetch_member(ctx.author.id)
+        except (discord.NotFound, discord.Forbidden):
+            # Pas membre de ce serveur (ou le bot ne peut pas le vérifier)
+            return False
+    return channel.permissions_for(member).send_messages
+
+@bot.command(name='announce', help='Programme un même message dans plusieurs canaux, éventuellement sur plusieurs serveurs. Format: !announce <heure> <#canal1> <#canal2> ... <message>')
+async def schedule_announcement(ctx, time_str: str, *, rest: str = None):
+    """
+    Programme une annonce envoyée simultanément dans plusieurs canaux.
+    Le message n'est stocké qu'une fois et les envois sont faits en parallèle à l'heure prévue.
+    
+    Args:
+        ctx: Le contexte de la commande
+        time_str: L'heure d'envoi ("YYYY-MM-DD HH:MM" ou "HH:MM")
+        rest: Les mentions de canaux suivies du message
+    """
+    try:
+        match = re.match(r'^((?:<#\d+>\s*)+)(.+)', (rest or "").strip(), re.DOTALL)
+        if not match:
+            await ctx.send("❌ Format: `!announce <heure> <#canal1> <#canal2> ... <message>`")
+            return
+        target_time = parse_target_time(time_str, ctx.guild.id if ctx.guild else None)
+        channel_ids = list(dict.fromkeys(int(channel_id) for channel_id in re.findall(r'<#(\d+)>', match.group(1))))
+        if len(channel_ids) > MAX_FANOUT_TARGETS:
+            await ctx.send(f"❌ Trop de canaux: {MAX_FANOUT_TARGETS} au maximum.")
+            return
+        
+        skipped = []
+        for channel_id in list(channel_ids):
+            channel = await scheduler.channels.resolve(channel_id)
+            if not channel:
+                await ctx.send(f"❌ Canal introuvable: <#{channel_id}>")
+                return
+            if getattr(channel, 'guild', None) is None:
+                # Conversation privée: pas de permissions de serveur à vérifier, canal ignoré
+                channel_ids.remove(channel_id)
+                skipped.append(channel_id)
+                continue
+            if not scheduler.channels.can_send(channel):
+                await ctx.send(f"❌ Je n'ai pas la permission d'envoyer des messages dans <#{channel_id}>")
+                return
+            # L'auteur doit pouvoir écrire lui-même dans chaque canal, y compris sur les autres serveurs
+            if not await author_can_send(ctx, channel):
+                await ctx.send(f"❌ Vous ne pouvez pas envoyer de messages dans <#{channel_id}>")
+                return
+        if not channel_ids:
+            await ctx.send("❌ Aucun canal de serveur parmi les canaux indiqués.")
+            return
+        
+        author_display_name = getattr(ctx.author, 'display_name', None) or ctx.author.name
+        job_id = scheduler.schedule_fanout(
+            channel_ids=channel_ids,
+            message=match.group(2),
+            time=target_time,
+            author_id=ctx.author.id,
+            author_name=author_display_name
+        )
+        skipped_text = f" Canaux hors serveur ignorés: {len(skipped)}." if skipped else ""
+        await ctx.send(f"✅ Annonce programmée pour le {target_time.strftime('%Y-%m-%d %H:%M')} dans "
+                       f"{len(channel_ids)} canaux. ID de tâche: `{job_id}`{skipped_text}")
+    
+    except ValueError as e:
+        await ctx.send(f"❌ Erreur: {str(e)}")
+    except Exception as e:
+        logger.error(f"Erreur lors de la programmation de l'annonce: {e}")
+        await ctx.send("❌ Une erreur s'est produite lors de la programmation de votre annonce.")
+
+@bot.command(name='dmcampaign', help='Programme un MP à tous les membres d\'un rôle. Usage: !dmcampaign <heure> @rôle <message>')
+@commands.has_permissions(administrator=True)
+async def schedule_dm_campaign(ctx, time_str: str, role: discord.Role, *, message: str):
+    """
+    Programme une campagne de MP vers tous les membres d'un rôle.
+    Les MP sont envoyés à un rythme adapté aux limites de Discord et la campagne
+    reprend où elle s'était arrêtée après un redémarrage du bot.
+    Réservé aux administrateurs.
+    
+    Args:
+        ctx: Le contexte de la commande
+        time_str: L'heure de début ("YYYY-MM-DD HH:MM" ou "HH:MM")
+        role: Le rôle dont les membres reçoivent le MP
+        message: Le contenu du MP
+    """
+    if not bot.intents.members:
+        await ctx.send("❌ Les campagnes de MP nécessitent l'intent \"Server Members\" "
+                       "(variable DISCORD_MEMBERS_INTENT=1 et activation dans le portail développeur).")
+        return
+    try:
+        target_time = parse_target_time(time_str, ctx.guild.id if ctx.guild else None)
+    except ValueError as e:
+        await ctx.send(f"❌ Erreur: {str(e)}")
+        return
+    
+    campaign_id = scheduler.campaigns.create(
+        guild_id=ctx.guild.id,
+        role_id=role.id,
+        message=message,
+        fire_at=scheduler.deadline_for_guild(target_time, ctx.guild.id),
+        author_id=ctx.author.id,
+        report_channel_id=ctx.channel.id
+    )
+    await ctx.send(f"✅ Campagne de MP `{campaign_id}` programmée pour le {target_time.strftime('%Y-%m-%d %H:%M')} "
+                   f"vers les membres de {role.mention}. Le rapport sera publié ici.")
+
+@bot.command(name='dmcampaigns', help='Affiche l\'avancement des campagnes de MP du serveur. Usage: !dmcampaigns')
+@commands.has_permissions(administrator=True)
+async def list_dm_campaigns(ctx):
+    """
+    Affiche les campagnes de MP du serveur et leur avancement.
+    Réservé aux administrateurs.
+    
+    Args:
+        ctx: Le contexte de la commande
+    """
+    campaigns = scheduler.store.get_campaigns(ctx.guild.id)[:10]
+    if not campaigns:
+        await ctx.send("Aucune campagne de MP sur ce serveur.")
+        return
+    
+    embed = discord.Embed(title="📨 Campagnes de MP", color=discord.Color.blue())
+    for campaign in campaigns:
+        start = scheduler.timezone_for_guild(ctx.guild.id).to_local(campaign['fire_at']).strftime('%Y-%m-%d %H:%M')
+        status = "terminée" if campaign['finished_at'] else ("en cours" if campaign['cursor'] else "programmée")
+        embed.add_field(
+            name=f"ID: {campaign['campaign_id']} | {start} | {status}",
+            value=f"**Rôle:** <@&{campaign['role_id']}>\n**Envoyés:** {campaign['sent']} | **Échecs:** {campaign['failed']}",
+            inline=False
+        )
+    await ctx.send(embed=embed)
+
+@bot.command(name='dmcancel', help='Annule une campagne de MP. Usage: !dmcancel <ID>')
+@commands.has_permissions(administrator=True)
+async def cancel_dm_campaign(ctx, campaign_id: str):
+    """
+    Annule une campagne de MP, programmée ou en cours.
+    Réservé aux administrateurs.
+    
+    Args:
+        ctx: Le contexte de la commande
+        campaign_id: L'ID de la campagne
+    """
+    if scheduler.campaigns.cancel(campaign_id, ctx.guild.id):
+        await ctx.send(f"✅ Campagne de MP `{campaign_id}` annulée.")
+    else:
+        await ctx.send(f"❌ Aucune campagne de MP avec l'ID `{campaign_id}` sur ce serveur.")
+
+# Limites de l'import en masse de messages programmés
+MAX_IMPORT_BYTES = 2 * 1024 * 1024
+MAX_IMPORT_ROWS = 5000
+
+def iter_import_rows(filename, data):
+    """
+    Lit les lignes d'un fichier d'import une par une.
+    Formats acceptés: CSV avec en-tête (time, channel, message), JSON Lines,
+    ou tableau JSON d'objets avec les mêmes clés.
+    
+    Args:
+        filename: Le nom du fichier joint (détermine le format)
+        data: Le contenu du fichier en octets
+        
+    Yields:
+        tuple: (numéro de ligne, dict de la ligne)
+    """
+    text = io.StringIO(data.decode('utf-8-sig'))
+    if filename.lower().endswith('.csv'):
+        for line_number, row in enumerate(csv.DictReader(text), start=2):
+            yield line_number, row
+        return
+    
+    first_char = text.read(1)
+    text.seek(0)
+    if first_char == '[':
+        # Tableau JSON classique
+        for index, row in enumerate(json.load(text), start=1):
+            yield index, row
+        return
+    
+    # JSON Lines: un objet par ligne
+    for line_number, line in enumerate(text, start=1):
+        if line.strip():
+            yield line_number, json.loads(line)
+
+@bot.command(name='schedule_import', help='Importe des messages programmés depuis un fichier CSV ou JSON joint (colonnes: time, channel, message). Usage: !schedule_import + fichier joint')
+async def schedule_import(ctx):
+    """
+    Programme en une seule fois tous les messages d'un fichier joint.
+    Toutes les lignes sont validées avant l'insertion; au moindre problème rien n'est importé.
+    
+    Args:
+        ctx: Le contexte de la commande
+    """
+    try:
+        if not ctx.message.attachments:
+            await ctx.send("❌ Joignez un fichier `.csv` ou `.json` à la commande.")
+            return
+        
+        attachment = ctx.message.attachments[0]
+        if attachment.size > MAX_IMPORT_BYTES:
+            await ctx.send(f"❌ Fichier trop volumineux (maximum {MAX_IMPORT_BYTES // 1024} Ko).")
+            return
+        data = await attachment.read()
+        
+        author_display_name = getattr(ctx.author, 'display_name', None) or ctx.author.name
+        # L'import ne peut pas dépasser la place laissée par le quota de messages en attente de l'auteur
+        guild_id = ctx.guild.id if ctx.guild else None
+        room = scheduler.quotas.limit(guild_id, 'user_jobs') - scheduler.quotas.usage(guild_id, ctx.author.id)['user_jobs']
+        max_rows = max(0, min(MAX_IMPORT_ROWS, room))
+        limit_hint = "" if max_rows == MAX_IMPORT_ROWS else " (quota `user_jobs`, modifiable par un administrateur avec `!quota`)"
+        # Cache des vérifications de canal: {channel_id: message d'erreur ou None}
+        channel_checks = {}
+        entries = []
+        errors = []
+        
+        try:
+            for line_number, row in iter_import_rows(attachment.filename, data):
+                if len(entries) + len(errors) >= max_rows:
+                    errors.append(f"Ligne {line_number}: limite de {max_rows} lignes atteinte{limit_hint}")
+                    break
+                if not isinstance(row, dict):
+                    errors.append(f"Ligne {line_number}: objet attendu")
+                    continue
+                
+                message = str(row.get('message') or '').strip()
+                if not message:
+                    errors.append(f"Ligne {line_number}: message vide")
+                    continue
+                
+                try:
+                    target_time = parse_target_time(str(row.get('time') or '').strip(), ctx.guild.id if ctx.guild else None)
+                except ValueError as e:
+                    errors.append(f"Ligne {line_number}: {e}")
+                    continue
+                
+                channel_text = str(row.get('channel') or '').strip().lstrip('<#').rstrip('>')
+                if channel_text and not channel_text.isdigit():
+                    errors.append(f"Ligne {line_number}: canal invalide `{row.get('channel')}`")
+                    continue
+                channel_id = int(channel_text) if channel_text else ctx.channel.id
+                
+                if channel_id not in channel_checks:
+                    channel = await scheduler.channels.resolve(channel_id)
+                    if not channel:
+                        channel_checks[channel_id] = f"canal introuvable <#{channel_id}>"
+                    elif not scheduler.channels.can_send(channel):
+                        channel_checks[channel_id] = f"pas la permission d'envoyer des messages dans <#{channel_id}>"
+                    else:
+                        channel_checks[channel_id] = None
+                if channel_checks[channel_id]:
+                    errors.append(f"Ligne {line_number}: {channel_checks[channel_id]}")
+                    continue
+                
+                entries.append({
+                    'channel_id': channel_id,
+                    'message': message,
+                    'time': target_time,
+                    'author_id': ctx.author.id,
+                    'author_name': author_display_name
+                })
+        except (UnicodeDecodeError, json.JSONDecodeError, csv.Error) as e:
+            errors.append(f"Fichier illisible: {e}")
+        
+        embed = discord.Embed(title="📥 Import de messages programmés")
+        if errors or not entries:
+            embed.color = discord.Color.red()
+            embed.description = f"Aucun message importé: {len(errors)} erreur(s) sur {len(entries) + len(errors)} ligne(s)."
+            if errors:
+                details = "\n".join(errors[:10])
+                if len(errors) > 10:
+                    details += f"\n... et {len(errors) - 10} autres"
+                embed.add_field(name="Erreurs", value=details[:1024], inline=False)
+            await ctx.send(embed=embed)
+            return
+        
+        try:
+            job_ids = scheduler.schedule_messages(entries)
+        except QuotaExceeded as e:
+            embed.color = discord.Color.red()
+            embed.description = f"Aucun message importé. {e} Un administrateur peut relever les quotas avec `!quota`."
+            await ctx.send(embed=embed)
+            return
+        
+        first = min(entry['time'] for entry in entries)
+        last = max(entry['time'] for entry in entries)
+        embed.color = discord.Color.green()
+        embed.description = f"✅ {len(job_ids)} message(s) programmé(s) dans {len(channel_checks)} canal(aux)."
+        embed.add_field(name="Premier envoi", value=first.strftime('%Y-%m-%d %H:%M'), inline=True)
+        embed.add_field(name="Dernier envoi", value=last.strftime('%Y-%m-%d %H:%M'), inline=True)
+        await ctx.send(embed=embed)
+        logger.info(f"{len(job_ids)} messages importés par {ctx.author.name} depuis {attachment.filename}")
+    
+    except Exception as e:
+        logger.error(f"Erreur lors de l'import de messages programmés: {e}")
+        await ctx.send("❌ Une erreur s'est produite lors de l'import des messages programmés.")
+
+# Nombre de mots qui composent la règle pour chaque type de récurrence
+RECURRENCE_WORDS = {'daily': 1, 'weekly': 2, 'cron': 5}
+
+@bot.command(name='every', help='Programme un message récurrent. Format: !every daily HH:MM [#canal] <message>, !every weekly <jour> HH:MM [#canal] <message> ou !every cron <m> <h> <jour> <mois> <jour_semaine> [#canal] <message>')
+async def schedule_recurring(ctx, kind: str, *, rest: str = None):
+    """
+    Programme un message récurrent (quotidien, hebdomadaire ou expression cron).
+    
+    Args:
+        ctx: Le contexte de la commande
+        kind: Le type de récurrence ("daily", "weekly" ou "cron")
+        rest: La règle suivie du canal optionnel et du message
+    """
+    try:
+        kind = kind.lower()
+        if kind not in RECURRENCE_WORDS:
+            await ctx.send("❌ Type de récurrence invalide. Utilisez `daily`, `weekly` ou `cron`.")
+            return
+        
+        # Séparer les mots de la règle du reste (canal + message, sauts de ligne préservés)
+        parts = (rest or "").lstrip().split(None, RECURRENCE_WORDS[kind])
+        if len(parts) <= RECURRENCE_WORDS[kind]:
+            await ctx.send("❌ Message manquant. Format: `!every <règle> [#canal] <message>`")
+            return
+        spec = " ".join([kind] + parts[:-1])
+        
+        channel, channel_id, message = await resolve_target_channel(ctx, parts[-1])
+        if channel is None:
+            return
+        
+        author_display_name = getattr(ctx.author, 'display_name', None) or ctx.author.name
+        job_id, first_time = scheduler.schedule_recurring(
+            channel_id=channel_id,
+            message=message,
+            spec=spec,
+            author_id=ctx.author.id,
+            author_name=author_display_name
+        )
+        
+        channel_text = f" dans <#{channel_id}>" if channel_id != ctx.channel.id else ""
+        await ctx.send(
+            f"✅ Message récurrent (`{spec}`) programmé{channel_text}. "
+            f"Prochain envoi le {first_time.strftime('%Y-%m-%d %H:%M')}. ID de tâche: `{job_id}`"
+        )
+    
+    except ValueError as e:
+        await ctx.send(f"❌ Erreur: {str(e)}")
+    except Exception as e:
+        logger.error(f"Erreur lors de la programmation du message récurrent: {e}")
+        await ctx.send("❌ Une erreur s'est produite lors de la programmation de votre message récurrent.")
+
 # Définition de la commande list avec préfixe
 @bot.command(name='list', help='Liste tous vos messages programmés')
 async def list_scheduled(ctx):
@@ -403,18 +773,22 @@ async def list_scheduled(ctx):
     )
     
     for job_id, job_info in jobs.items():
-        channel = bot.get_channel(job_info['channel_id'])
+        channel = scheduler.channels.get(job_info.channel_id)
         channel_name = channel.name if channel else "Canal inconnu"
-        channel_mention = f"<#{job_info['channel_id']}>" if channel else "Canal inconnu"
+        channel_mention = f"<#{job_info.channel_id}>" if channel else "Canal inconnu"
+        if job_info.targets:
+            channel_mention = " ".join(f"<#{channel_id}>" for channel_id in job_info.targets)
         
         # Truncate message if too long
-        message = job_info['message']
+        message = job_info.message
         if len(message) > 100:
             message = message[:97] + "..."
             
+        recurrence_text = f" | 🔁 {job_info.recurrence}" if job_info.recurrence else ""
+        attachments_text = f"\n**Pièces jointes:** {len(job_info.attachments)}" if job_info.attachments else ""
         embed.add_field(
-            name=f"ID: {job_id} | {job_info['time'].strftime('%Y-%m-%d %H:%M')}",
-            value=f"**Canal:** {channel_mention}\n**Message:** {message}",
+            name=f"ID: {job_id} | {scheduler.local_time(job_info).strftime('%Y-%m-%d %H:%M')}{recurrence_text}",
+            value=f"**Canal:** {channel_mention}\n**Message:** {message}{attachments_text}",
             inline=False
         )
     
@@ -461,6 +835,354 @@ async def cancel_scheduled(ctx, job_id: str):
         logger.error(f"Erreur lors de l'annulation de la tâche: {e}")
         await ctx.send("❌ Une erreur s'est produite lors de l'annulation du message programmé.")
 
+@bot.command(name='reschedule', help='Change l\'heure d\'un message programmé. Usage: !reschedule <job_id> <heure>')
+async def reschedule_scheduled(ctx, job_id: str, *, time_str: str):
+    """
+    Change l'heure d'envoi d'un message programmé sans changer son ID.
+    
+    Args:
+        ctx: Le contexte de la commande
+        job_id: L'ID de la tâche à déplacer
+        time_str: La nouvelle heure ("YYYY-MM-DD HH:MM" ou "HH:MM")
+    """
+    try:
+        target_time = parse_target_time(time_str.strip(), ctx.guild.id if ctx.guild else None)
+        if scheduler.reschedule_job(job_id, ctx.author.id, target_time):
+            await ctx.send(f"✅ Message `{job_id}` reprogrammé pour le {target_time.strftime('%Y-%m-%d %H:%M')}.")
+        else:
+            await ctx.send(f"❌ Impossible de trouver un message programmé avec l'ID `{job_id}` qui vous appartient.")
+    except ValueError as e:
+        await ctx.send(f"❌ Erreur: {str(e)}")
+    except Exception as e:
+        logger.error(f"Erreur lors de la reprogrammation de la tâche: {e}")
+        await ctx.send("❌ Une erreur s'est produite lors de la reprogrammation du message.")
+
+@bot.command(name='editjob', help='Modifie le texte d\'un message programmé. Usage: !editjob <job_id> <message>')
+async def edit_scheduled(ctx, job_id: str, *, message: str):
+    """
+    Remplace le texte d'un message programmé sans changer son ID ni son heure.
+    
+    Args:
+        ctx: Le contexte de la commande
+        job_id: L'ID de la tâche à modifier
+        message: Le nouveau texte
+    """
+    try:
+        if scheduler.edit_job(job_id, ctx.author.id, message):
+            await ctx.send(f"✅ Texte du message `{job_id}` modifié.")
+        else:
+            await ctx.send(f"❌ Impossible de trouver un message programmé avec l'ID `{job_id}` qui vous appartient.")
+    except ValueError as e:
+        await ctx.send(f"❌ Erreur: {str(e)}")
+    except Exception as e:
+        logger.error(f"Erreur lors de la modification de la tâche: {e}")
+        await ctx.send("❌ Une erreur s'est produite lors de la modification du message.")
+
+@bot.command(name='attribution', help='Choisit comment la mention "programmé par" accompagne les messages programmés. Usage: !attribution inline|reply')
+@commands.has_permissions(administrator=True)
+async def set_attribution(ctx, mode: str):
+    """
+    Définit le mode d'attribution des messages programmés pour ce serveur.
+    Réservé aux administrateurs.
+    
+    Args:
+        ctx: Le contexte de la commande
+        mode: "inline" (embed joint au message, une seule requête) ou "reply" (réponse séparée)
+    """
+    mode = mode.lower()
+    if mode not in ATTRIBUTION_MODES:
+        await ctx.send(f"❌ Mode invalide. Modes disponibles: {', '.join(ATTRIBUTION_MODES)}")
+        return
+    if not ctx.guild:
+        await ctx.send("❌ Cette commande doit être utilisée sur un serveur.")
+        return
+    
+    scheduler.set_guild_setting(ctx.guild.id, 'attribution', mode)
+    await ctx.send(f"✅ Mode d'attribution des messages programmés: `{mode}`")
+    logger.info(f"Mode d'attribution défini sur {mode} pour le serveur {ctx.guild.id} par {ctx.author.name}")
+
+@bot.command(name='delivery', help='Choisit comment les messages programmés sont envoyés. Usage: !delivery bot|webhook')
+@commands.has_permissions(administrator=True)
+async def set_delivery(ctx, mode: str):
+    """
+    Définit le mode de livraison des messages programmés pour ce serveur.
+    En mode webhook, le bot a besoin de la permission "Gérer les webhooks" dans les canaux cibles.
+    Réservé aux administrateurs.
+    
+    Args:
+        ctx: Le contexte de la commande
+        mode: "bot" (compte du bot) ou "webhook" (au nom de l'auteur, sans embed d'attribution)
+    """
+    mode = mode.lower()
+    if mode not in DELIVERY_MODES:
+        await ctx.send(f"❌ Mode invalide. Modes disponibles: {', '.join(DELIVERY_MODES)}")
+        return
+    if not ctx.guild:
+        await ctx.send("❌ Cette commande doit être utilisée sur un serveur.")
+        return
+    
+    scheduler.set_guild_setting(ctx.guild.id, 'delivery', mode)
+    await ctx.send(f"✅ Mode de livraison des messages programmés: `{mode}`")
+    logger.info(f"Mode de livraison défini sur {mode} pour le serveur {ctx.guild.id} par {ctx.author.name}")
+
+@bot.command(name='catchup', help='Choisit le sort des messages programmés échus pendant un arrêt du bot. Usage: !catchup late|skip|digest [minutes]')
+@commands.has_permissions(administrator=True)
+async def set_catchup(ctx, policy: str, window: int = None):
+    """
+    Définit la politique de rattrapage des messages échus pendant un arrêt du bot pour ce serveur.
+    Les messages en retard de moins de [minutes] sont toujours envoyés.
+    Réservé aux administrateurs.
+    
+    Args:
+        ctx: Le contexte de la commande
+        policy: "late" (tout envoyer en retard), "skip" (ignorer au-delà de la fenêtre) ou "digest" (un récapitulatif par canal)
+        window: La fenêtre de retard en minutes
+    """
+    policy = policy.lower()
+    if policy not in CATCHUP_POLICIES:
+        await ctx.send(f"❌ Politique invalide. Politiques disponibles: {', '.join(CATCHUP_POLICIES)}")
+        return
+    if window is not None and window < 0:
+        await ctx.send("❌ La fenêtre de retard doit être positive.")
+        return
+    if not ctx.guild:
+        await ctx.send("❌ Cette commande doit être utilisée sur un serveur.")
+        return
+    
+    scheduler.set_guild_setting(ctx.guild.id, 'catchup', policy)
+    if window is not None:
+        scheduler.set_guild_setting(ctx.guild.id, 'catchup_window', str(window))
+    _, window = scheduler.catchup_policy_for_guild(ctx.guild.id)
+    await ctx.send(f"✅ Rattrapage des messages échus pendant un arrêt: `{policy}` (fenêtre de {window} min)")
+    logger.info(f"Politique de rattrapage définie sur {policy} ({window} min) pour le serveur {ctx.guild.id} par {ctx.author.name}")
+
+@bot.command(name='timezone', help='Choisit le fuseau horaire des messages programmés du serveur. Usage: !timezone [Europe/Paris]')
+@commands.has_permissions(administrator=True)
+async def set_timezone(ctx, name: str = None):
+    """
+    Définit le fuseau horaire dans lequel les heures des commandes sont lues pour ce serveur.
+    Sans argument, affiche le fuseau actuel.
+    Réservé aux administrateurs.
+    
+    Args:
+        ctx: Le contexte de la commande
+        name: Le nom IANA du fuseau horaire (ex: Europe/Paris, America/Montreal)
+    """
+    if not ctx.guild:
+        await ctx.send("❌ Cette commande doit être utilisée sur un serveur.")
+        return
+    if name is None:
+        current = scheduler.timezone_for_guild(ctx.guild.id)
+        await ctx.send(f"🕒 Fuseau horaire du serveur: `{current.name}` "
+                       f"(il est {current.to_local(scheduler.clock()).strftime('%H:%M')})")
+        return
+    try:
+        zone = get_zone(name)
+    except ValueError as e:
+        await ctx.send(f"❌ {e}")
+        return
+    
+    scheduler.set_guild_setting(ctx.guild.id, 'timezone', zone.key)
+    local_now = scheduler.timezone_for_guild(ctx.guild.id).to_local(scheduler.clock())
+    await ctx.send(f"✅ Fuseau horaire des messages programmés: `{zone.key}` (il est {local_now.strftime('%H:%M')}). "
+                   f"Les messages déjà programmés gardent leur heure d'envoi.")
+    logger.info(f"Fuseau horaire défini sur {zone.key} pour le serveur {ctx.guild.id} par {ctx.author.name}")
+
+@bot.command(name='quota', help='Affiche ou modifie les quotas de messages programmés du serveur. Usage: !quota [nom valeur]')
+@commands.has_permissions(administrator=True)
+async def set_quota(ctx, name: str = None, value: int = None):
+    """
+    Affiche les quotas du serveur et leur utilisation, ou modifie l'un d'eux.
+    Réservé aux administrateurs.
+    
+    Args:
+        ctx: Le contexte de la commande
+        name: Le quota à modifier (user_jobs, guild_jobs, minute_jobs, user_bytes, guild_bytes, user_file_bytes
+              ou guild_file_bytes)
+        value: La nouvelle limite
+    """
+    if not ctx.guild:
+        await ctx.send("❌ Cette commande doit être utilisée sur un serveur.")
+        return
+    if name is None:
+        usage = scheduler.quotas.usage(ctx.guild.id, ctx.author.id)
+        embed = discord.Embed(title="📏 Quotas des messages programmés", color=discord.Color.blue())
+        for quota, description in QUOTA_DESCRIPTIONS.items():
+            used = f"{usage[quota]} / " if quota in usage else ""
+            embed.add_field(
+                name=f"{quota}: {used}{scheduler.quotas.limit(ctx.guild.id, quota)}",
+                value=description,
+                inline=False
+            )
+        rejected = scheduler.metrics.counters.get('quota_rejected', 0)
+        embed.set_footer(text=f"Programmations refusées depuis le démarrage: {rejected}")
+        await ctx.send(embed=embed)
+        return
+    
+    name = name.lower()
+    if name not in DEFAULT_QUOTAS:
+        await ctx.send(f"❌ Quota inconnu. Quotas disponibles: {', '.join(DEFAULT_QUOTAS)}")
+        return
+    if value is None or value < 1:
+        await ctx.send("❌ Indiquez une limite positive. Exemple: `!quota user_jobs 50`")
+        return
+    
+    scheduler.set_guild_setting(ctx.guild.id, f'quota_{name}', str(value))
+    await ctx.send(f"✅ Quota `{name}` fixé à {value} {QUOTA_DESCRIPTIONS[name]}.")
+    logger.info(f"Quota {name} fixé à {value} pour le serveur {ctx.guild.id} par {ctx.author.name}")
+
+def format_seconds(value):
+    """Formate une durée en secondes pour l'affichage (ou "-" si aucune mesure)."""
+    if value is None:
+        return "-"
+    return f"{value * 1000:.0f} ms" if value < 1 else f"{value:.1f} s"
+
+@bot.command(name='schedstats', help='Affiche les statistiques d\'envoi des messages programmés. Usage: !schedstats [json]')
+@commands.has_permissions(administrator=True)
+async def scheduler_stats(ctx, output_format: str = None):
+    """
+    Affiche le retard d'envoi (p50/p90/p99), la durée des envois et la profondeur de file du scheduler.
+    Avec l'option "json", joint l'export complet des histogrammes.
+    Réservé aux administrateurs.
+    
+    Args:
+        ctx: Le contexte de la commande
+        output_format: "json" pour recevoir l'export brut
+    """
+    snapshot = scheduler.metrics.snapshot()
+    
+    if output_format and output_format.lower() == 'json':
+        data = json.dumps(snapshot, indent=2).encode('utf-8')
+        await ctx.send(file=discord.File(io.BytesIO(data), filename="scheduler_metrics.json"))
+        return
+    
+    lag = snapshot['lag_seconds']
+    duration = snapshot['send_duration_seconds']
+    depth = snapshot['queue_depth']
+    embed = discord.Embed(
+        title="📊 Statistiques des messages programmés",
+        description=f"{len(scheduler.jobs)} message(s) en attente",
+        color=discord.Color.blue()
+    )
+    embed.add_field(
+        name=f"Retard à l'envoi ({lag['count']} envois)",
+        value=f"p50: {format_seconds(lag['p50'])} | p90: {format_seconds(lag['p90'])} | "
+              f"p99: {format_seconds(lag['p99'])} | max: {format_seconds(lag['max'] if lag['count'] else None)}",
+        inline=False
+    )
+    embed.add_field(
+        name="Durée des envois",
+        value=f"p50: {format_seconds(duration['p50'])} | p99: {format_seconds(duration['p99'])}",
+        inline=False
+    )
+    embed.add_field(
+        name="Profondeur de file",
+        value=f"p50: {depth['p50'] if depth['p50'] is not None else '-'} | max: {depth['max'] if depth['count'] else '-'}",
+        inline=False
+    )
+    counters = snapshot['counters']
+    if counters:
+        embed.add_field(
+            name="Compteurs",
+            value="\n".join(f"{name}: {value}" for name, value in sorted(counters.items())),
+            inline=False
+        )
+    await ctx.send(embed=embed)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    """Supprime les messages programmés d'un canal qui vient d'être supprimé."""
+    scheduler.webhooks.forget(channel.id)
+    scheduler.channels.invalidate_channel(channel.id)
+    count, _ = scheduler.cancel_channel_jobs(channel.id)
+    if count:
+        logger.info(f"{count} messages programmés annulés suite à la suppression du canal {channel.name} (ID: {channel.id})")
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    """Recalcule les permissions du bot dans un canal modifié (permissions du canal)."""
+    scheduler.channels.invalidate_channel(after.id)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    """Recalcule les permissions du bot sur un serveur dont un rôle a changé."""
+    scheduler.channels.invalidate_guild(after.guild.id)
+
+@bot.event
+async def on_guild_role_delete(role):
+    """Recalcule les permissions du bot sur un serveur dont un rôle a été supprimé."""
+    scheduler.channels.invalidate_guild(role.guild.id)
+
+@bot.event
+async def on_member_update(before, after):
+    """Recalcule les permissions du bot lorsque ses propres rôles changent."""
+    if after.id == bot.user.id:
+        scheduler.channels.invalidate_guild(after.guild.id)
+
+@bot.event
+async def on_guild_remove(guild):
+    """Oublie les permissions du bot sur un serveur qu'il a quitté."""
+    scheduler.channels.invalidate_guild(guild.id)
+
+@bot.command(name='failed', help='Liste vos messages programmés qui n\'ont pas pu être envoyés. Usage: !failed')
+async def list_failed(ctx):
+    """Liste les messages programmés de l'utilisateur abandonnés après plusieurs échecs d'envoi."""
+    letters = scheduler.get_dead_letters(ctx.author.id)
+    
+    if not letters:
+        await ctx.send("Vous n'avez aucun message programmé en échec.")
+        return
+    
+    embed = discord.Embed(
+        title="Vos messages programmés en échec",
+        description="Pour renvoyer un message: `!replay <ID>` ou `!replay all`",
+        color=discord.Color.red()
+    )
+    
+    # Un embed est limité à 25 champs
+    for letter in letters[:25]:
+        message = letter['message']
+        if len(message) > 100:
+            message = message[:97] + "..."
+        fire_time = scheduler.timezone_for_channel(letter['channel_id']).to_local(letter['fire_at'])
+        attachments_text = f"\n**Pièces jointes:** {len(letter['attachments'])}" if letter['attachments'] else ""
+        embed.add_field(
+            name=f"ID: {letter['letter_id']} | {fire_time.strftime('%Y-%m-%d %H:%M')}",
+            value=f"**Canal:** <#{letter['channel_id']}>\n**Erreur:** {letter['error'][:200]} "
+                  f"({letter['attempts']} tentative(s))\n**Message:** {message}{attachments_text}",
+            inline=False
+        )
+    
+    await ctx.send(embed=embed)
+
+@bot.command(name='replay', help='Renvoie un message programmé en échec. Usage: !replay <ID> ou !replay all')
+async def replay_failed(ctx, letter_id: str):
+    """
+    Reprogramme immédiatement un message en échec.
+    
+    Args:
+        ctx: Le contexte de la commande
+        letter_id: L'ID du message en échec ou "all" pour tous les renvoyer
+    """
+    try:
+        if letter_id.lower() == 'all':
+            letter_ids = [letter['letter_id'] for letter in scheduler.get_dead_letters(ctx.author.id)]
+        else:
+            letter_ids = [letter_id]
+        
+        job_ids = [job_id for job_id in (scheduler.replay_dead_letter(lid, ctx.author.id) for lid in letter_ids) if job_id]
+        
+        if job_ids:
+            await ctx.send(f"✅ {len(job_ids)} message(s) reprogrammé(s) pour un envoi immédiat.")
+        else:
+            await ctx.send(f"❌ Aucun message en échec avec l'ID `{letter_id}` ne vous appartient.")
+    
+    except QuotaExceeded as e:
+        await ctx.send(f"❌ {e}")
+    except Exception as e:
+        logger.error(f"Erreur lors du renvoi d'un message en échec: {e}")
+        await ctx.send("❌ Une erreur s'est produite lors du renvoi du message.")
+
 @bot.event
 async def on_command_error(ctx, error):
     """Gérer les erreurs de commande."""
@@ -474,6 +1196,9 @@ async def on_command_error(ctx, error):
         await ctx.send(f"❌ Une erreur s'est produite: {str(error)}")
 
 # Commandes pour le système de tickets de feedback anonyme
+# Durée d'affichage de la confirmation de feedback envoyée en message privé (secondes)
+FEEDBACK_CONFIRMATION_TTL = 3600
+
 @bot.command(name='feedback', help='Envoie un feedback anonyme aux administrateurs. Usage: !feedback <message>')
 async def send_feedback(ctx, *, message: str):
     """
@@ -507,14 +1232,15 @@ async def send_feedback(ctx, *, message: str):
         sent = await ticket_manager.send_ticket_to_channel(ticket_id)
         
         if sent:
-            # Envoyer une confirmation en message privé à l'utilisateur
-            await ctx.author.send(
+            # Envoyer une confirmation en message privé à l'utilisateur, supprimée au bout d'une heure
+            confirmation = await ctx.author.send(
                 embed=discord.Embed(
                     title="✅ Feedback envoyé",
-                    description=f"Votre feedback anonyme a été envoyé avec succès.\n\nID de référence: `{ticket_id}`\n\nConservez cet ID pour référence future.",
+                    description=f"Votre feedback anonyme a été envoyé avec succès.\n\nID de référence: `{ticket_id}`\n\nNotez cet ID pour référence future: ce message sera supprimé dans une heure.",
                     color=discord.Color.green()
                 )
             )
+            scheduler.expire_messages(confirmation.channel.id, [confirmation.id], FEEDBACK_CONFIRMATION_TTL)
             logger.info(f"Ticket {ticket_id} envoyé avec succès")
         else:
             await ctx.author.send("❌ Une erreur s'est produite lors de l'envoi de votre feedback. Veuillez réessayer plus tard.")
@@ -0,0 +1,170 @@
+"""
+Cache of the channels used by scheduled messages and of the bot's permissions in them.
+"""
+import asyncio
+import logging
+
+import discord
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Nombre maximal de fetch_channel simultanés pendant le préchargement au démarrage
+WARM_CONCURRENCY = 5
+
+
+class ChannelCache:
+    """
+    Resolves channel IDs and the bot's permissions in them. Channels missing
+    from the gateway cache are fetched from the API once, however many sends
+    ask for them at the same time, and kept until invalidated. Permissions
+    are computed once per channel and invalidated by the gateway events that
+    can change them (channel update, role update, update of the bot member).
+    """
+
+    def __init__(self, bot):
+        """
+        Initialize an empty cache.
+
+        Args:
+            bot: The Discord bot instance
+        """
+        self.bot = bot
+        self._fetched = {}  # {channel_id: canal obtenu par fetch_channel}
+        self._permissions = {}  # {channel_id: (guild_id, discord.Permissions du bot)}
+        self._pending = {}  # {channel_id: asyncio.Task} pour les fetch_channel en cours
+
+    def get(self, channel_id):
+        """
+        Get a channel without any request.
+
+        Args:
+            channel_id: The Discord channel ID
+
+        Returns:
+            The channel, or None if it is neither in the gateway cache nor fetched yet
+        """
+        return self.bot.get_channel(channel_id) or self._fetched.get(channel_id)
+
+    async def resolve(self, channel_id):
+        """
+        Get a channel, fetching it from the API if the gateway cache does not have it.
+
+        Args:
+            channel_id: The Discord channel ID
+
+        Returns:
+            The channel, or None if it does not exist or the bot cannot see it
+
+        Raises:
+            discord.HTTPException: If the fetch failed for another reason
+        """
+        channel = self.get(channel_id)
+        if channel is not None:
+            return channel
+        task = self._pending.get(channel_id)
+        if task is None:
+            # Les envois simultanés vers ce canal attendent le même fetch_channel
+            task = asyncio.ensure_future(self.bot.fetch_channel(channel_id))
+            self._pending[channel_id] = task
+            task.add_done_callback(lambda _: self._pending.pop(channel_id, None))
+        try:
+            channel = await asyncio.shield(task)
+        except (discord.NotFound, discord.Forbidden):
+            return None
+        self._fetched[channel_id] = channel
+        logger.info(f"Canal {channel_id} absent du cache du gateway, récupéré par l'API")
+        return channel
+
+    def permissions(self, channel):
+        """
+        Get the bot's permissions in a channel.
+
+        Args:
+            channel: The channel
+
+        Returns:
+            discord.Permissions: The permissions, or None if they cannot be computed
+                (guild not in the gateway cache)
+        """
+        cached = self._permissions.get(channel.id)
+        if cached is not None:
+            return cached[1]
+        guild = getattr(channel, 'guild', None)
+        if guild is None:
+            # Message privé
+            return channel.permissions_for(self.bot.user)
+        if getattr(guild, 'me', None) is None:
+            return None
+        permissions = channel.permissions_for(guild.me)
+        self._permissions[channel.id] = (guild.id, permissions)
+        return permissions
+
+    def can_send(self, channel):
+        """
+        Tell whether the bot may send messages in a channel.
+        When the permissions are unknown, Discord decides at send time.
+
+        Args:
+            channel: The channel
+
+        Returns:
+            bool: False only if the bot is known not to have the permission
+        """
+        permissions = self.permissions(channel)
+        return permissions is None or permissions.send_messages
+
+    async def warm(self, channel_ids):
+        """
+        Resolve channels ahead of their sends (e.g. every channel of the pending jobs at startup).
+
+        Args:
+            channel_ids: The Discord channel IDs
+
+        Returns:
+            list: The IDs of the channels that could not be resolved
+        """
+        semaphore = asyncio.Semaphore(WARM_CONCURRENCY)
+
+        async def warm_one(channel_id):
+            channel = self.get(channel_id)
+            if channel is None:
+                async with semaphore:
+                    channel = await self.resolve(channel_id)
+            if channel is not None:
+                self.permissions(channel)
+            return channel
+
+        channel_ids = list(channel_ids)
+        results = await asyncio.gather(*(warm_one(channel_id) for channel_id in channel_ids), return_exceptions=True)
+        missing = [channel_id for channel_id, result in zip(channel_ids, results)
+                   if result is None or isinstance(result, Exception)]
+        logger.info(f"Cache des canaux préchargé: {len(channel_ids) - len(missing)} canal(aux), "
+                    f"{len(missing)} introuvable(s)")
+        return missing
+
+    def invalidate_channel(self, channel_id):
+        """
+        Forget a channel and the bot's permissions in it (channel updated or deleted).
+
+        Args:
+            channel_id: The Discord channel ID
+        """
+        self._fetched.pop(channel_id, None)
+        self._permissions.pop(channel_id, None)
+
+    def invalidate_guild(self, guild_id):
+        """
+        Forget the bot's permissions in every channel of a guild (roles changed).
+
+        Args:
+            guild_id: The Discord guild ID
+        """
+        for channel_id, (channel_guild_id, _) in list(self._permissions.items()):
+            if channel_guild_id == guild_id:
+                del self._permissions[channel_id]
+
+    def clear(self):
+        """Forget everything (the gateway state was rebuilt after a reconnection)."""
+        self._fetched.clear()
+        self._permissions.clear()
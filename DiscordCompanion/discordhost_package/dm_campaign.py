@@ -0,0 +1,320 @@
+"""
+Scheduled DM campaigns: one private message to every member of a role.
+"""
+import asyncio
+import logging
+import time
+import uuid
+
+import discord
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Rythme des MP: Discord ne publie pas de limite, on démarre prudemment et on s'adapte
+DM_START_INTERVAL = 1.0  # secondes entre deux MP
+DM_MIN_INTERVAL = 0.5
+DM_MAX_INTERVAL = 30.0
+# Un envoi plus long que ceci signifie que discord.py a attendu la fin d'un rate-limit
+DM_THROTTLED_SEND = 2.0
+# Reprise après une erreur (page de membres en 5xx, base verrouillée...): attente doublée à chaque échec
+CAMPAIGN_RETRY_DELAY = 30.0
+CAMPAIGN_MAX_RETRIES = 5
+# Bail d'une campagne: renouvelé à chaque MP, il doit couvrir la plus longue attente avant reprise
+CAMPAIGN_LEASE_SECONDS = 600
+# Intervalle de recherche des campagnes abandonnées par une instance arrêtée
+CAMPAIGN_POLL_INTERVAL = 60
+
+
+class CampaignLeaseLost(Exception):
+    """Raised when a campaign was cancelled or taken over by another instance while running."""
+
+
+class AdaptivePacer:
+    """
+    Spaces out sends at an adaptive rate: the interval shrinks slowly while
+    sends go through and doubles as soon as Discord rate-limits us
+    (additive increase, multiplicative decrease).
+    """
+
+    def __init__(self, interval=DM_START_INTERVAL):
+        """
+        Initialize the pacer.
+
+        Args:
+            interval: Initial number of seconds between two sends
+        """
+        self.interval = interval
+        self._next_send = 0.0
+
+    async def wait(self):
+        """Sleep until the next send is allowed."""
+        delay = self._next_send - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._next_send = time.monotonic() + self.interval
+
+    def succeeded(self, duration):
+        """
+        Record a successful send.
+
+        Args:
+            duration: Seconds the send took
+        """
+        if duration > DM_THROTTLED_SEND:
+            self.throttled()
+        else:
+            self.interval = max(DM_MIN_INTERVAL, self.interval - 0.05)
+
+    def throttled(self):
+        """Slow down after a rate limit."""
+        self.interval = min(DM_MAX_INTERVAL, self.interval * 2)
+        self._next_send = time.monotonic() + self.interval
+
+
+class DMCampaignRunner:
+    """
+    Runs DM campaigns. Members are fetched page by page in increasing ID
+    order, so the whole member list is never held in memory, and the last
+    processed ID is checkpointed after each DM so a restart resumes where
+    the campaign stopped. Each campaign is leased to one instance, so
+    instances sharing the store never DM the same members twice.
+    """
+
+    def __init__(self, bot, store, metrics, clock=time.time, owner=None):
+        """
+        Initialize the runner.
+
+        Args:
+            bot: The Discord bot instance
+            store: The JobStore holding the campaigns
+            metrics: The SchedulerMetrics receiving the DM counters
+            clock: Function returning the current POSIX timestamp
+            owner: Unique name of this bot instance, used for campaign leases
+        """
+        self.bot = bot
+        self.store = store
+        self.metrics = metrics
+        self.clock = clock
+        self.owner = owner or uuid.uuid4().hex
+        self._tasks = {}  # {campaign_id: asyncio.Task}
+        self._poll_task = None
+
+    def start(self):
+        """Resume the unfinished campaigns this instance can lease. Must be called from the bot's event loop."""
+        self._poll_task = asyncio.get_running_loop().create_task(self._poll())
+
+    def stop(self):
+        """Cancel the running campaigns (their progress is already saved) and hand them over."""
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        try:
+            self.store.release_campaigns(self.owner)
+        except Exception as e:
+            # Les baux expireront d'eux-mêmes
+            logger.warning(f"Baux des campagnes de MP non rendus: {e}")
+
+    async def _poll(self):
+        """Lease and run the campaigns nobody runs, now and then every CAMPAIGN_POLL_INTERVAL seconds."""
+        # Les serveurs servis par cette instance ne sont connus qu'une fois le bot prêt
+        await self.bot.wait_until_ready()
+        resume_own = True
+        while True:
+            try:
+                guild_ids = {guild.id for guild in self.bot.guilds}
+                for campaign in self.store.claim_campaigns(self.owner, self.clock(), CAMPAIGN_LEASE_SECONDS,
+                                                           guild_ids, resume_own):
+                    if campaign['campaign_id'] not in self._tasks:
+                        self._launch(campaign)
+                resume_own = False
+            except Exception as e:
+                logger.error(f"Recherche des campagnes de MP à reprendre impossible: {e}")
+            await asyncio.sleep(CAMPAIGN_POLL_INTERVAL)
+
+    def create(self, guild_id, role_id, message, fire_at, author_id, report_channel_id=None):
+        """
+        Schedule a DM campaign.
+
+        Args:
+            guild_id: The Discord guild ID
+            role_id: The role whose members receive the DM
+            message: The DM content
+            fire_at: POSIX timestamp at which the campaign starts
+            author_id: The Discord user ID of the author
+            report_channel_id: The channel where the final report is posted
+
+        Returns:
+            str: The campaign ID
+        """
+        campaign_id = str(uuid.uuid4())[:8]
+        self.store.add_campaign(campaign_id, guild_id, role_id, author_id, report_channel_id, message, fire_at,
+                                self.owner, max(self.clock(), fire_at) + CAMPAIGN_LEASE_SECONDS)
+        self._launch({
+            'campaign_id': campaign_id, 'guild_id': guild_id, 'role_id': role_id, 'author_id': author_id,
+            'report_channel_id': report_channel_id, 'message': message, 'fire_at': fire_at,
+            'cursor': None, 'sent': 0, 'failed': 0, 'elapsed': 0.0, 'finished_at': None,
+        })
+        logger.info(f"Campagne de MP {campaign_id} programmée pour le rôle {role_id} du serveur {guild_id}")
+        return campaign_id
+
+    def cancel(self, campaign_id, guild_id):
+        """
+        Cancel a campaign of a guild, running or not.
+
+        Args:
+            campaign_id: The campaign ID
+            guild_id: The guild the campaign must belong to
+
+        Returns:
+            bool: Whether the campaign was found and cancelled
+        """
+        if not any(row['campaign_id'] == campaign_id for row in self.store.get_campaigns(guild_id)):
+            return False
+        task = self._tasks.pop(campaign_id, None)
+        if task is not None:
+            task.cancel()
+        return self.store.remove_campaign(campaign_id)
+
+    def _launch(self, campaign):
+        """Start the task running a campaign."""
+        task = asyncio.get_running_loop().create_task(self._run(campaign))
+        self._tasks[campaign['campaign_id']] = task
+        task.add_done_callback(lambda _: self._tasks.pop(campaign['campaign_id'], None))
+
+    async def _run(self, campaign):
+        """
+        Wait for a campaign's start time, then DM the role members from its cursor.
+
+        Args:
+            campaign: The campaign dict from the store
+        """
+        campaign_id = campaign['campaign_id']
+        await self.bot.wait_until_ready()
+        delay = campaign['fire_at'] - self.clock()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        guild = self.bot.get_guild(campaign['guild_id'])
+        if guild is None:
+            logger.error(f"Campagne de MP {campaign_id}: serveur {campaign['guild_id']} introuvable")
+            self.store.finish_campaign(campaign_id, self.clock())
+            return
+
+        progress = {'cursor': campaign['cursor'], 'sent': campaign['sent'], 'failed': campaign['failed']}
+        if progress['cursor']:
+            logger.info(f"Reprise de la campagne de MP {campaign_id} après le membre {progress['cursor']} "
+                        f"({progress['sent']} déjà envoyés)")
+        pacer = AdaptivePacer()
+        resumed_at = time.monotonic()
+        retries = 0
+        while True:
+            cursor = progress['cursor']
+            try:
+                # Renouveler avant chaque reprise: l'attente précédente a pu consommer une bonne part du bail
+                if not self.store.renew_campaign_lease(campaign_id, self.owner,
+                                                       self.clock() + CAMPAIGN_LEASE_SECONDS):
+                    raise CampaignLeaseLost()
+                await self._send_from(campaign, progress, pacer, resumed_at)
+                self.store.finish_campaign(campaign_id, self.clock())
+                break
+            except CampaignLeaseLost:
+                logger.warning(f"Campagne de MP {campaign_id} annulée ou reprise par une autre instance: arrêt ici")
+                return
+            except Exception as e:
+                # Des MP envoyés depuis la dernière erreur remettent le compteur d'échecs à zéro
+                retries = 1 if progress['cursor'] != cursor else retries + 1
+                if retries > CAMPAIGN_MAX_RETRIES:
+                    logger.error(f"Campagne de MP {campaign_id} interrompue après {CAMPAIGN_MAX_RETRIES} reprises: {e}")
+                    await self._report(campaign, progress['sent'], progress['failed'],
+                                       campaign['elapsed'] + time.monotonic() - resumed_at, interrupted=True)
+                    return
+                delay = CAMPAIGN_RETRY_DELAY * 2 ** (retries - 1)
+                logger.warning(f"Campagne de MP {campaign_id}: erreur après le membre {progress['cursor']} ({e}), "
+                               f"reprise dans {delay:.0f}s")
+                await asyncio.sleep(delay)
+
+        elapsed = campaign['elapsed'] + time.monotonic() - resumed_at
+        await self._report(campaign, progress['sent'], progress['failed'], elapsed)
+
+    async def _send_from(self, campaign, progress, pacer, resumed_at):
+        """
+        DM the role members after the cursor, checkpointing after each DM.
+
+        Args:
+            campaign: The campaign dict from the store
+            progress: Dict with the cursor and the sent and failed counters, updated in place
+                so a failure leaves the position of the last member handled
+            pacer: The AdaptivePacer of the campaign
+            resumed_at: time.monotonic() when this run of the campaign started
+
+        Raises:
+            discord.HTTPException: If a page of members cannot be fetched
+            sqlite3.Error: If the progress cannot be saved
+            CampaignLeaseLost: If the campaign was cancelled or taken over by another instance
+        """
+        campaign_id = campaign['campaign_id']
+        guild = self.bot.get_guild(campaign['guild_id'])
+        after = discord.Object(progress['cursor']) if progress['cursor'] else None
+        # fetch_members parcourt les membres par pages de 1000, par ID croissant
+        async for member in guild.fetch_members(limit=None, after=after):
+            if member.bot or member.get_role(campaign['role_id']) is None:
+                continue
+            await pacer.wait()
+            started = time.monotonic()
+            try:
+                await member.send(campaign['message'])
+            except discord.HTTPException as e:
+                progress['failed'] += 1
+                self.metrics.increment('dm_failed')
+                if e.status == 429:
+                    pacer.throttled()
+                # 403: MP fermés par le membre, rien à réessayer
+                logger.warning(f"Campagne {campaign_id}: MP impossible pour {member.id}: {e}")
+            else:
+                progress['sent'] += 1
+                self.metrics.increment('dm_sent')
+                pacer.succeeded(time.monotonic() - started)
+            # Avancer le curseur avant la sauvegarde: un membre déjà servi n'est jamais relancé
+            progress['cursor'] = member.id
+            if not self.store.save_campaign_progress(
+                    campaign_id, progress['cursor'], progress['sent'], progress['failed'],
+                    campaign['elapsed'] + time.monotonic() - resumed_at,
+                    self.owner, self.clock() + CAMPAIGN_LEASE_SECONDS):
+                raise CampaignLeaseLost()
+
+    async def _report(self, campaign, sent, failed, elapsed, interrupted=False):
+        """
+        Log the outcome of a campaign and post it in its report channel.
+
+        Args:
+            campaign: The campaign dict from the store
+            sent: Number of DMs delivered
+            failed: Number of DMs that failed
+            elapsed: Seconds spent sending
+            interrupted: Whether the campaign gave up after repeated errors (it stays
+                unfinished and resumes from its checkpoint once its lease expires)
+        """
+        throughput = sent / elapsed * 60 if elapsed > 0 else 0.0
+        summary = (f"{sent} MP envoyé(s), {failed} échec(s) en {elapsed / 60:.1f} min "
+                   f"({throughput:.1f} MP/min)")
+        if interrupted:
+            summary += ("\nInterrompue après plusieurs erreurs: elle reprendra automatiquement là où elle s'est "
+                        f"arrêtée d'ici {CAMPAIGN_LEASE_SECONDS // 60} min.")
+        logger.info(f"Campagne de MP {campaign['campaign_id']} {'interrompue' if interrupted else 'terminée'}: {summary}")
+
+        channel = self.bot.get_channel(campaign['report_channel_id']) if campaign['report_channel_id'] else None
+        if channel is None:
+            return
+        embed = discord.Embed(
+            title=f"📨 Campagne de MP `{campaign['campaign_id']}` {'interrompue' if interrupted else 'terminée'}",
+            description=f"Rôle: <@&{campaign['role_id']}>\n{summary}",
+            color=discord.Color.red() if interrupted else discord.Color.green() if not failed else discord.Color.orange()
+        )
+        try:
+            await channel.send(embed=embed)
+        except discord.HTTPException as e:
+            logger.error(f"Impossible de publier le rapport de la campagne {campaign['campaign_id']}: {e}")
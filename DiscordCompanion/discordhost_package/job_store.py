@@ -0,0 +1,905 @@
+"""
+Persistent SQLite storage for scheduled messages.
+"""
+import json
+import logging
+import sqlite3
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Fichier de base de données par défaut (à côté de tickets.json)
+DEFAULT_DB_PATH = "scheduled_jobs.db"
+
+# Secondes d'attente d'un verrou d'écriture pris par une autre instance (5 par défaut dans sqlite3)
+BUSY_TIMEOUT = 1.0
+
+# Colonnes lues pour recharger un job en mémoire
+JOB_COLUMNS = ("job_id, channel_id, author_id, author_name, message, fire_at, recurrence, targets, timezone, "
+               "guild_id, attachments, ttl, target_guilds")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    channel_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    author_name TEXT,
+    message TEXT NOT NULL,
+    fire_at REAL NOT NULL,
+    recurrence TEXT,
+    targets TEXT,
+    timezone TEXT,
+    guild_id INTEGER,
+    attachments TEXT,
+    ttl INTEGER,
+    sent_chunks TEXT,
+    lease_owner TEXT,
+    lease_until REAL,
+    target_guilds TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_fire_at ON jobs (fire_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_author ON jobs (author_id, fire_at);
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    refs INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS expiring_messages (
+    channel_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    delete_at REAL NOT NULL,
+    webhook INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (channel_id, message_id)
+);
+CREATE TABLE IF NOT EXISTS guild_settings (
+    guild_id INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (guild_id, key)
+);
+CREATE TABLE IF NOT EXISTS dead_letters (
+    letter_id TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    channel_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    author_name TEXT,
+    message TEXT NOT NULL,
+    fire_at REAL NOT NULL,
+    error TEXT,
+    attempts INTEGER NOT NULL,
+    failed_at REAL NOT NULL,
+    attachments TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_dead_letters_author ON dead_letters (author_id, failed_at);
+CREATE TABLE IF NOT EXISTS webhooks (
+    channel_id INTEGER PRIMARY KEY,
+    webhook_id INTEGER NOT NULL,
+    token TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dm_campaigns (
+    campaign_id TEXT PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    role_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    report_channel_id INTEGER,
+    message TEXT NOT NULL,
+    fire_at REAL NOT NULL,
+    cursor INTEGER,
+    sent INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    elapsed REAL NOT NULL DEFAULT 0,
+    finished_at REAL,
+    lease_owner TEXT,
+    lease_until REAL
+);
+"""
+
+
+class JobStore:
+    """
+    Stores scheduled jobs in a SQLite database so they survive restarts.
+    Each write is a single short transaction; the database runs in WAL mode
+    so readers never block the writer.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        """
+        Open (and create if needed) the job database.
+
+        Args:
+            path: Path to the SQLite file
+        """
+        self.path = path
+        # Attente courte sur une base verrouillée par une autre instance: les requêtes bloquent la boucle
+        # asyncio du bot, et le dispatcher remet en file les jobs dont il n'a pas pu prendre le bail
+        self.conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL suffit en WAL: une coupure peut perdre la dernière transaction mais jamais corrompre la base
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        logger.info(f"Base de jobs ouverte: {path}")
+
+    def _migrate(self):
+        """Add columns introduced after the first version of the schema."""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        with self.conn:
+            if 'recurrence' not in columns:
+                self.conn.execute("ALTER TABLE jobs ADD COLUMN recurrence TEXT")
+            if 'lease_owner' not in columns:
+                self.conn.execute("ALTER TABLE jobs ADD COLUMN lease_owner TEXT")
+                self.conn.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+            if 'targets' not in columns:
+                self.conn.execute("ALTER TABLE jobs ADD COLUMN targets TEXT")
+            if 'timezone' not in columns:
+                self.conn.execute("ALTER TABLE jobs ADD COLUMN timezone TEXT")
+            if 'guild_id' not in columns:
+                self.conn.execute("ALTER TABLE jobs ADD COLUMN guild_id INTEGER")
+            if 'attachments' not in columns:
+                self.conn.execute("ALTER TABLE jobs ADD COLUMN attachments TEXT")
+            if 'ttl' not in columns:
+                self.conn.execute("ALTER TABLE jobs ADD COLUMN ttl INTEGER")
+            if 'sent_chunks' not in columns:
+                self.conn.execute("ALTER TABLE jobs ADD COLUMN sent_chunks TEXT")
+            if 'target_guilds' not in columns:
+                self.conn.execute("ALTER TABLE jobs ADD COLUMN target_guilds TEXT")
+        letter_columns = {row[1] for row in self.conn.execute("PRAGMA table_info(dead_letters)")}
+        with self.conn:
+            if 'attachments' not in letter_columns:
+                self.conn.execute("ALTER TABLE dead_letters ADD COLUMN attachments TEXT")
+        expiration_columns = {row[1] for row in self.conn.execute("PRAGMA table_info(expiring_messages)")}
+        with self.conn:
+            if 'webhook' not in expiration_columns:
+                self.conn.execute("ALTER TABLE expiring_messages ADD COLUMN webhook INTEGER NOT NULL DEFAULT 0")
+        campaign_columns = {row[1] for row in self.conn.execute("PRAGMA table_info(dm_campaigns)")}
+        with self.conn:
+            if 'lease_owner' not in campaign_columns:
+                self.conn.execute("ALTER TABLE dm_campaigns ADD COLUMN lease_owner TEXT")
+                self.conn.execute("ALTER TABLE dm_campaigns ADD COLUMN lease_until REAL")
+
+    @staticmethod
+    def _encode_targets(targets):
+        """Serialize the channel (or guild) IDs of a fan-out job (None for a single-channel job)."""
+        return ",".join(str(channel_id) for channel_id in targets) if targets else None
+
+    @staticmethod
+    def decode_targets(text):
+        """Parse the channel (or guild) IDs of a fan-out job stored by _encode_targets."""
+        return tuple(int(channel_id) for channel_id in text.split(",")) if text else None
+
+    @staticmethod
+    def _encode_attachments(attachments):
+        """Serialize the (digest, filename, size) triples of a job's attachments (None without attachments)."""
+        # JSON plutôt qu'une liste séparée par des virgules: un nom de fichier peut tout contenir
+        return json.dumps([list(attachment) for attachment in attachments]) if attachments else None
+
+    @staticmethod
+    def decode_attachments(text):
+        """Parse the attachments of a job stored by _encode_attachments."""
+        return tuple((digest, filename, size) for digest, filename, size in json.loads(text)) if text else None
+
+    def add_job(self, job_id, channel_id, author_id, author_name, message, fire_at, recurrence=None, targets=None,
+                timezone=None, guild_id=None, attachments=None, ttl=None, target_guilds=None):
+        """
+        Persist a new job. The job takes over the blob references of its attachments.
+
+        Args:
+            job_id: The job ID
+            channel_id: The Discord channel ID
+            author_id: The Discord user ID of the author
+            author_name: The display name of the author
+            message: The message content
+            fire_at: POSIX timestamp at which the message is due
+            recurrence: The recurrence rule text, or None for a one-shot job
+            targets: The channel IDs of a fan-out job (the message is stored once for all of them)
+            timezone: The timezone in which the recurrence rule is evaluated
+            guild_id: The guild the job counts for in the quotas
+            attachments: The (digest, filename, size) triples of the files sent with the message
+            ttl: Seconds after which the sent messages delete themselves, or None to keep them
+            target_guilds: The guilds of a fan-out job's channels when there are several, each counting the job
+                in its quotas
+        """
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO jobs (job_id, channel_id, author_id, author_name, message, fire_at, recurrence, "
+                "targets, timezone, guild_id, attachments, ttl, target_guilds) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, channel_id, author_id, author_name, message, fire_at, recurrence,
+                 self._encode_targets(targets), timezone, guild_id, self._encode_attachments(attachments), ttl,
+                 self._encode_targets(target_guilds))
+            )
+
+    def add_jobs(self, rows):
+        """
+        Persist many jobs in a single transaction.
+
+        Args:
+            rows: Iterable of (job_id, channel_id, author_id, author_name, message, fire_at, recurrence, guild_id)
+        """
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO jobs (job_id, channel_id, author_id, author_name, message, fire_at, recurrence, "
+                "guild_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def has_job(self, job_id):
+        """
+        Tell whether a job ID is taken (possibly by another instance sharing the store).
+
+        Args:
+            job_id: The job ID
+
+        Returns:
+            bool: Whether a job with this ID is stored
+        """
+        return self.conn.execute("SELECT 1 FROM jobs WHERE job_id = ?", (job_id,)).fetchone() is not None
+
+    def update_fire_at(self, job_id, fire_at):
+        """
+        Move a job to a new fire time (next occurrence of a recurring job, or rescheduled by its author).
+        The new delivery starts from the first chunk.
+
+        Args:
+            job_id: The job ID
+            fire_at: The new POSIX timestamp
+        """
+        with self.conn:
+            # Le bail est rendu: l'occurrence suivante peut être prise par n'importe quelle instance
+            self.conn.execute(
+                "UPDATE jobs SET fire_at = ?, sent_chunks = NULL, lease_owner = NULL, lease_until = NULL "
+                "WHERE job_id = ?",
+                (fire_at, job_id)
+            )
+
+    def update_message(self, job_id, message):
+        """
+        Replace the text of a job (the new text is sent from its first chunk).
+
+        Args:
+            job_id: The job ID
+            message: The new message content
+        """
+        with self.conn:
+            self.conn.execute("UPDATE jobs SET message = ?, sent_chunks = NULL WHERE job_id = ?", (message, job_id))
+
+    def get_sent_chunks(self, job_id, channel_id):
+        """
+        Get how many chunks of a split message were already posted in a channel
+        by an earlier attempt (webhook messages cannot be deduplicated by nonce).
+
+        Args:
+            job_id: The job ID
+            channel_id: The Discord channel ID
+
+        Returns:
+            int: The number of chunks posted (0 if none)
+        """
+        row = self.conn.execute("SELECT sent_chunks FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]).get(str(channel_id), 0) if row and row[0] else 0
+
+    def save_sent_chunks(self, job_id, channel_id, count):
+        """
+        Record how many chunks of a split message were posted in a channel.
+
+        Args:
+            job_id: The job ID
+            channel_id: The Discord channel ID
+            count: The number of chunks posted
+        """
+        with self.conn:
+            row = self.conn.execute("SELECT sent_chunks FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            # {canal: parties publiées}: un job multi-canaux avance séparément dans chaque canal
+            progress = json.loads(row[0]) if row and row[0] else {}
+            progress[str(channel_id)] = count
+            self.conn.execute("UPDATE jobs SET sent_chunks = ? WHERE job_id = ?", (json.dumps(progress), job_id))
+
+    def update_targets(self, job_id, targets):
+        """
+        Change the remaining channels of a fan-out job (after a partial failure
+        or the deletion of one of its channels).
+
+        Args:
+            job_id: The job ID
+            targets: The channel IDs still to deliver (the first one becomes the job's channel)
+        """
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET channel_id = ?, targets = ? WHERE job_id = ?",
+                (targets[0], self._encode_targets(targets), job_id)
+            )
+
+    def claim_jobs(self, job_ids, owner, now, lease_seconds):
+        """
+        Lease a batch of due jobs for one bot instance, in a single transaction.
+        A job is granted if it is due and either unleased, already leased by
+        this owner, or its previous lease expired.
+
+        Args:
+            job_ids: The IDs of the jobs to claim
+            owner: The ID of the claiming instance
+            now: The current POSIX timestamp
+            lease_seconds: Duration of the lease
+
+        Returns:
+            dict: {job_id: (fire_at, lease_owner, lease_until)} for every job still in the store,
+                fire_at in whole seconds
+        """
+        rows = {}
+        job_ids = list(job_ids)
+        with self.conn:
+            # Morceaux de 500 pour rester sous la limite de paramètres de SQLite
+            for start in range(0, len(job_ids), 500):
+                chunk = job_ids[start:start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                self.conn.execute(
+                    f"UPDATE jobs SET lease_owner = ?, lease_until = ? WHERE job_id IN ({placeholders}) "
+                    "AND fire_at <= ? AND (lease_owner IS NULL OR lease_owner = ? OR lease_until < ?)",
+                    (owner, now + lease_seconds, *chunk, now, owner, now)
+                )
+                for job_id, fire_at, lease_owner, lease_until in self.conn.execute(
+                        f"SELECT job_id, fire_at, lease_owner, lease_until FROM jobs WHERE job_id IN ({placeholders})",
+                        chunk):
+                    # fire_at est stocké en REAL: le rendre entier comme en mémoire (il entre dans les nonces)
+                    rows[job_id] = (int(fire_at), lease_owner, lease_until)
+        return rows
+
+    def claim_due_jobs(self, owner, now, lease_seconds, limit=500):
+        """
+        Lease due jobs that no live instance holds (jobs scheduled by another
+        instance, or abandoned by a crashed one).
+
+        Args:
+            owner: The ID of the claiming instance
+            now: The current POSIX timestamp
+            lease_seconds: Duration of the lease
+            limit: Maximum number of jobs to claim
+
+        Returns:
+            list: Rows of JOB_COLUMNS, fire_at in whole seconds
+        """
+        # BEGIN IMMEDIATE prend le verrou d'écriture avant la lecture: deux instances ne peuvent pas
+        # sélectionner les mêmes lignes
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.conn.execute(
+                f"SELECT {JOB_COLUMNS} FROM jobs "
+                "WHERE fire_at <= ? AND (lease_owner IS NULL OR lease_until < ?) ORDER BY fire_at LIMIT ?",
+                (now, now, limit)
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE jobs SET lease_owner = ?, lease_until = ? WHERE job_id = ?",
+                ((owner, now + lease_seconds, row[0]) for row in rows)
+            )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return [row[:5] + (int(row[5]),) + row[6:] for row in rows]
+
+    def release_job(self, job_id, fire_at):
+        """
+        Give up the lease of a job whose send failed, and move it to its retry time.
+
+        Args:
+            job_id: The job ID
+            fire_at: The POSIX timestamp of the next attempt
+        """
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET fire_at = ?, lease_owner = NULL, lease_until = NULL WHERE job_id = ?",
+                (fire_at, job_id)
+            )
+
+    def remove_job(self, job_id):
+        """
+        Delete a job after it was sent or cancelled, releasing its attachments.
+
+        Args:
+            job_id: The job ID
+
+        Returns:
+            list: The digests of the blobs no job uses any more
+        """
+        return self.remove_jobs([job_id])
+
+    def remove_jobs(self, job_ids):
+        """
+        Delete several jobs in one transaction, releasing their attachments.
+
+        Args:
+            job_ids: Iterable of job IDs
+
+        Returns:
+            list: The digests of the blobs no job uses any more
+        """
+        job_ids = list(job_ids)
+        with self.conn:
+            digests = []
+            for start in range(0, len(job_ids), 500):
+                chunk = job_ids[start:start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                for (attachments,) in self.conn.execute(
+                        f"SELECT attachments FROM jobs WHERE job_id IN ({placeholders}) AND attachments IS NOT NULL",
+                        chunk):
+                    digests.extend(digest for digest, _, _ in self.decode_attachments(attachments))
+            self.conn.executemany("DELETE FROM jobs WHERE job_id = ?", ((job_id,) for job_id in job_ids))
+            return self._release_blobs(digests)
+
+    def acquire_blob(self, digest, size):
+        """
+        Take one reference on a blob, registering it on first use.
+
+        Args:
+            digest: The SHA-256 hex digest of the content
+            size: The size of the content in bytes
+        """
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO blobs (digest, size, refs) VALUES (?, ?, 1) "
+                "ON CONFLICT (digest) DO UPDATE SET refs = refs + 1",
+                (digest, size)
+            )
+
+    def _release_blobs(self, digests):
+        """Drop one reference per digest, inside the caller's transaction."""
+        if not digests:
+            return []
+        self.conn.executemany("UPDATE blobs SET refs = refs - 1 WHERE digest = ?", ((digest,) for digest in digests))
+        placeholders = ", ".join("?" * len(set(digests)))
+        orphans = [digest for (digest,) in self.conn.execute(
+            f"SELECT digest FROM blobs WHERE digest IN ({placeholders}) AND refs <= 0", list(set(digests))
+        )]
+        self.conn.executemany("DELETE FROM blobs WHERE digest = ?", ((digest,) for digest in orphans))
+        return orphans
+
+    def release_blobs(self, digests):
+        """
+        Drop one reference per digest (a digest listed twice loses two references).
+
+        Args:
+            digests: List of digests
+
+        Returns:
+            list: The digests of the blobs no job uses any more (removed from the store)
+        """
+        with self.conn:
+            return self._release_blobs(digests)
+
+    def recount_blobs(self):
+        """
+        Recompute every reference count from the attachments of the stored jobs and
+        dead letters, dropping the references of downloads that never became a job.
+
+        Returns:
+            set: The digests still in use
+        """
+        counts = {}
+        for table in ('jobs', 'dead_letters'):
+            for (attachments,) in self.conn.execute(f"SELECT attachments FROM {table} WHERE attachments IS NOT NULL"):
+                for digest, _, _ in self.decode_attachments(attachments):
+                    counts[digest] = counts.get(digest, 0) + 1
+        with self.conn:
+            known = {digest for (digest,) in self.conn.execute("SELECT digest FROM blobs")}
+            self.conn.executemany("DELETE FROM blobs WHERE digest = ?", ((digest,) for digest in known - counts.keys()))
+            self.conn.executemany("UPDATE blobs SET refs = ? WHERE digest = ?",
+                                  ((refs, digest) for digest, refs in counts.items() if digest in known))
+        return counts.keys() & known
+
+    def _stream(self, query, params):
+        """Run a query and yield its rows in batches without loading them all."""
+        cursor = self.conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            yield from rows
+
+    def iter_pending(self, now):
+        """
+        Stream jobs that are not yet due, ordered by fire time.
+
+        Args:
+            now: The current POSIX timestamp
+
+        Yields:
+            tuple: A row of JOB_COLUMNS
+        """
+        return self._stream(
+            f"SELECT {JOB_COLUMNS} "
+            "FROM jobs WHERE fire_at >= ? ORDER BY fire_at, rowid",
+            (now,)
+        )
+
+    def iter_overdue_recurring(self, now):
+        """
+        Stream recurring jobs whose current occurrence passed while the bot was offline.
+
+        Args:
+            now: The current POSIX timestamp
+
+        Yields:
+            tuple: A row of JOB_COLUMNS
+        """
+        return self._stream(
+            f"SELECT {JOB_COLUMNS} "
+            "FROM jobs WHERE fire_at < ? AND recurrence IS NOT NULL",
+            (now,)
+        )
+
+    def iter_overdue(self, now):
+        """
+        Stream one-shot jobs whose fire time passed while the bot was offline, in fire order.
+
+        Args:
+            now: The current POSIX timestamp
+
+        Yields:
+            tuple: A row of JOB_COLUMNS
+        """
+        return self._stream(
+            f"SELECT {JOB_COLUMNS} "
+            "FROM jobs WHERE fire_at < ? AND recurrence IS NULL ORDER BY fire_at, rowid",
+            (now,)
+        )
+
+    def add_expirations(self, rows):
+        """
+        Record sent messages to delete later, in one transaction.
+
+        Args:
+            rows: Iterable of (channel_id, message_id, delete_at, webhook) tuples, webhook telling
+                whether the message was posted through the channel's webhook
+        """
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO expiring_messages (channel_id, message_id, delete_at, webhook) "
+                "VALUES (?, ?, ?, ?)", rows
+            )
+
+    def remove_expirations(self, keys):
+        """
+        Forget messages that were deleted (or can no longer be), in one transaction.
+
+        Args:
+            keys: Iterable of (channel_id, message_id) tuples
+        """
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM expiring_messages WHERE channel_id = ? AND message_id = ?", keys
+            )
+
+    def iter_expirations(self):
+        """
+        Stream the messages waiting to be deleted, ordered by deletion time.
+
+        Yields:
+            tuple: (channel_id, message_id, delete_at, webhook)
+        """
+        return self._stream(
+            "SELECT channel_id, message_id, delete_at, webhook FROM expiring_messages ORDER BY delete_at", ()
+        )
+
+    def add_dead_letter(self, letter_id, job_id, channel_id, author_id, author_name, message, fire_at, error, attempts,
+                        failed_at, attachments=None):
+        """
+        Record a message that could not be delivered. The dead letter takes one
+        reference of its own on each attachment, so a replay can send the files again.
+
+        Args:
+            letter_id: The dead-letter ID
+            job_id: The ID of the failed job
+            channel_id: The Discord channel ID
+            author_id: The Discord user ID of the author
+            author_name: The display name of the author
+            message: The message content
+            fire_at: The POSIX timestamp the message was due
+            error: Description of the last failure
+            attempts: Number of delivery attempts
+            failed_at: The POSIX timestamp at which the message was given up
+            attachments: The (digest, filename, size) triples of the files of the message
+        """
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO dead_letters (letter_id, job_id, channel_id, author_id, author_name, message, "
+                "fire_at, error, attempts, failed_at, attachments) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (letter_id, job_id, channel_id, author_id, author_name, message, fire_at, error, attempts, failed_at,
+                 self._encode_attachments(attachments))
+            )
+            if attachments:
+                self.conn.executemany("UPDATE blobs SET refs = refs + 1 WHERE digest = ?",
+                                      ((digest,) for digest, _, _ in attachments))
+
+    _DEAD_LETTER_COLUMNS = ('letter_id', 'job_id', 'channel_id', 'author_id', 'author_name', 'message',
+                            'fire_at', 'error', 'attempts', 'failed_at', 'attachments')
+
+    def _dead_letter_dict(self, row):
+        """Turn a dead_letters row into a dict, with its attachments parsed."""
+        letter = dict(zip(self._DEAD_LETTER_COLUMNS, row))
+        letter['attachments'] = self.decode_attachments(letter['attachments'])
+        return letter
+
+    def get_dead_letters(self, author_id):
+        """
+        Get a user's dead letters, most recent first.
+
+        Args:
+            author_id: The Discord user ID
+
+        Returns:
+            list: One dict per dead letter
+        """
+        rows = self.conn.execute(
+            f"SELECT {', '.join(self._DEAD_LETTER_COLUMNS)} FROM dead_letters "
+            "WHERE author_id = ? ORDER BY failed_at DESC",
+            (author_id,)
+        )
+        return [self._dead_letter_dict(row) for row in rows]
+
+    def get_dead_letter(self, letter_id):
+        """
+        Get one dead letter.
+
+        Args:
+            letter_id: The dead-letter ID
+
+        Returns:
+            dict: The dead letter, or None if it does not exist
+        """
+        row = self.conn.execute(
+            f"SELECT {', '.join(self._DEAD_LETTER_COLUMNS)} FROM dead_letters WHERE letter_id = ?",
+            (letter_id,)
+        ).fetchone()
+        return self._dead_letter_dict(row) if row else None
+
+    def remove_dead_letter(self, letter_id):
+        """
+        Delete a dead letter (after it was replayed), releasing its attachments.
+
+        Args:
+            letter_id: The dead-letter ID
+
+        Returns:
+            list: The digests of the blobs nothing uses any more
+        """
+        with self.conn:
+            row = self.conn.execute("SELECT attachments FROM dead_letters WHERE letter_id = ?", (letter_id,)).fetchone()
+            self.conn.execute("DELETE FROM dead_letters WHERE letter_id = ?", (letter_id,))
+            attachments = self.decode_attachments(row[0]) if row else None
+            return self._release_blobs([digest for digest, _, _ in attachments] if attachments else [])
+
+    def load_guild_settings(self):
+        """
+        Load every per-guild setting.
+
+        Returns:
+            dict: {guild_id: {key: value}}
+        """
+        settings = {}
+        for guild_id, key, value in self.conn.execute("SELECT guild_id, key, value FROM guild_settings"):
+            settings.setdefault(guild_id, {})[key] = value
+        return settings
+
+    def set_guild_setting(self, guild_id, key, value):
+        """
+        Persist one per-guild setting.
+
+        Args:
+            guild_id: The Discord guild ID
+            key: The setting name
+            value: The setting value
+        """
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO guild_settings (guild_id, key, value) VALUES (?, ?, ?)",
+                (guild_id, key, value)
+            )
+
+    def load_webhooks(self):
+        """
+        Load the cached webhook credentials.
+
+        Returns:
+            dict: {channel_id: (webhook_id, token)}
+        """
+        return {
+            channel_id: (webhook_id, token)
+            for channel_id, webhook_id, token in self.conn.execute("SELECT channel_id, webhook_id, token FROM webhooks")
+        }
+
+    def save_webhook(self, channel_id, webhook_id, token):
+        """
+        Persist the webhook used for a channel.
+
+        Args:
+            channel_id: The Discord channel ID
+            webhook_id: The webhook ID
+            token: The webhook token
+        """
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO webhooks (channel_id, webhook_id, token) VALUES (?, ?, ?)",
+                (channel_id, webhook_id, token)
+            )
+
+    def delete_webhook(self, channel_id):
+        """
+        Forget the webhook of a channel.
+
+        Args:
+            channel_id: The Discord channel ID
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM webhooks WHERE channel_id = ?", (channel_id,))
+
+    _CAMPAIGN_COLUMNS = ('campaign_id', 'guild_id', 'role_id', 'author_id', 'report_channel_id', 'message',
+                         'fire_at', 'cursor', 'sent', 'failed', 'elapsed', 'finished_at')
+
+    def add_campaign(self, campaign_id, guild_id, role_id, author_id, report_channel_id, message, fire_at,
+                     owner, lease_until):
+        """
+        Persist a new DM campaign, leased to the instance that created it.
+
+        Args:
+            campaign_id: The campaign ID
+            guild_id: The Discord guild ID
+            role_id: The role whose members receive the DM
+            author_id: The Discord user ID of the author
+            report_channel_id: The channel where the final report is posted
+            message: The DM content
+            fire_at: POSIX timestamp at which the campaign starts
+            owner: The ID of the instance running the campaign
+            lease_until: POSIX timestamp at which the lease expires
+        """
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO dm_campaigns (campaign_id, guild_id, role_id, author_id, report_channel_id, message, "
+                "fire_at, lease_owner, lease_until) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (campaign_id, guild_id, role_id, author_id, report_channel_id, message, fire_at, owner, lease_until)
+            )
+
+    def claim_campaigns(self, owner, now, lease_seconds, guild_ids, resume_own=False):
+        """
+        Lease the unfinished campaigns that no live instance runs (after a
+        restart, or abandoned by a crashed instance).
+
+        Args:
+            owner: The ID of the claiming instance
+            now: The current POSIX timestamp
+            lease_seconds: Duration of the lease (counted from the start of a campaign not started yet)
+            guild_ids: The guilds this instance serves (with shards, the others belong to other instances)
+            resume_own: Also take the campaigns still leased to this owner (restart with the same instance ID)
+
+        Returns:
+            list: One dict per campaign claimed
+        """
+        # BEGIN IMMEDIATE, comme claim_due_jobs: deux instances ne peuvent pas prendre la même campagne
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(self._CAMPAIGN_COLUMNS)} FROM dm_campaigns "
+                "WHERE finished_at IS NULL AND (lease_owner IS NULL OR lease_owner = ? OR lease_until < ?)",
+                (owner if resume_own else None, now)
+            ).fetchall()
+            campaigns = [dict(zip(self._CAMPAIGN_COLUMNS, row)) for row in rows]
+            campaigns = [campaign for campaign in campaigns if campaign['guild_id'] in guild_ids]
+            self.conn.executemany(
+                "UPDATE dm_campaigns SET lease_owner = ?, lease_until = ? WHERE campaign_id = ?",
+                ((owner, max(now, campaign['fire_at']) + lease_seconds, campaign['campaign_id'])
+                 for campaign in campaigns)
+            )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return campaigns
+
+    def renew_campaign_lease(self, campaign_id, owner, lease_until):
+        """
+        Extend the lease of a running campaign.
+
+        Args:
+            campaign_id: The campaign ID
+            owner: The ID of the instance running the campaign
+            lease_until: POSIX timestamp at which the lease expires
+
+        Returns:
+            bool: Whether this instance still holds the campaign (False if it was cancelled or taken over)
+        """
+        with self.conn:
+            cursor = self.conn.execute(
+                "UPDATE dm_campaigns SET lease_until = ? WHERE campaign_id = ? AND lease_owner = ?",
+                (lease_until, campaign_id, owner)
+            )
+        return cursor.rowcount > 0
+
+    def release_campaigns(self, owner):
+        """
+        Give up the leases of an instance that stops, so another one resumes its campaigns at once.
+
+        Args:
+            owner: The ID of the instance
+        """
+        with self.conn:
+            self.conn.execute(
+                "UPDATE dm_campaigns SET lease_owner = NULL, lease_until = NULL WHERE lease_owner = ?", (owner,)
+            )
+
+    def save_campaign_progress(self, campaign_id, cursor, sent, failed, elapsed, owner, lease_until):
+        """
+        Checkpoint a running campaign and renew its lease.
+
+        Args:
+            campaign_id: The campaign ID
+            cursor: ID of the last member processed (members are visited by increasing ID)
+            sent: Number of DMs delivered so far
+            failed: Number of DMs that failed so far
+            elapsed: Seconds spent sending so far
+            owner: The ID of the instance running the campaign
+            lease_until: POSIX timestamp at which the renewed lease expires
+
+        Returns:
+            bool: Whether this instance still holds the campaign (False if it was cancelled or taken over)
+        """
+        with self.conn:
+            updated = self.conn.execute(
+                "UPDATE dm_campaigns SET cursor = ?, sent = ?, failed = ?, elapsed = ?, lease_until = ? "
+                "WHERE campaign_id = ? AND lease_owner = ?",
+                (cursor, sent, failed, elapsed, lease_until, campaign_id, owner)
+            )
+        return updated.rowcount > 0
+
+    def finish_campaign(self, campaign_id, finished_at):
+        """
+        Mark a campaign as finished and drop its lease.
+
+        Args:
+            campaign_id: The campaign ID
+            finished_at: POSIX timestamp of the end of the campaign
+        """
+        with self.conn:
+            self.conn.execute(
+                "UPDATE dm_campaigns SET finished_at = ?, lease_owner = NULL, lease_until = NULL WHERE campaign_id = ?",
+                (finished_at, campaign_id)
+            )
+
+    def get_campaigns(self, guild_id=None, unfinished_only=False):
+        """
+        Get DM campaigns, most recent first.
+
+        Args:
+            guild_id: Only return the campaigns of this guild
+            unfinished_only: Only return campaigns that have not finished
+
+        Returns:
+            list: One dict per campaign
+        """
+        conditions, params = [], []
+        if guild_id is not None:
+            conditions.append("guild_id = ?")
+            params.append(guild_id)
+        if unfinished_only:
+            conditions.append("finished_at IS NULL")
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.conn.execute(
+            f"SELECT {', '.join(self._CAMPAIGN_COLUMNS)} FROM dm_campaigns{where} ORDER BY fire_at DESC", params
+        ).fetchall()
+        return [dict(zip(self._CAMPAIGN_COLUMNS, row)) for row in rows]
+
+    def remove_campaign(self, campaign_id):
+        """
+        Delete a DM campaign.
+
+        Args:
+            campaign_id: The campaign ID
+
+        Returns:
+            bool: Whether the campaign existed
+        """
+        with self.conn:
+            cursor = self.conn.execute("DELETE FROM dm_campaigns WHERE campaign_id = ?", (campaign_id,))
+        return cursor.rowcount > 0
+
+    def close(self):
+        """Close the database connection."""
+        self.conn.close()
@@ -0,0 +1,131 @@
+"""
+Splitting of messages longer than Discord's limit into several messages.
+"""
+
+# Longueur maximale d'un message Discord
+MAX_MESSAGE_LENGTH = 2000
+
+CODE_FENCE = "```"
+
+
+def _is_fence(line):
+    """Tell whether a line opens or closes a code block (and does not do both)."""
+    stripped = line.strip()
+    return stripped.startswith(CODE_FENCE) and CODE_FENCE not in stripped[len(CODE_FENCE):]
+
+
+def _split_words(line, limit):
+    """
+    Split a line longer than the limit on spaces, cutting words that are
+    themselves too long.
+    """
+    pieces = []
+    current = ""
+    for word in line.split(" "):
+        while len(word) > limit:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(word[:limit])
+            word = word[limit:]
+        if not current:
+            current = word
+        elif len(current) + 1 + len(word) <= limit:
+            current += " " + word
+        else:
+            pieces.append(current)
+            current = word
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _split_code_block(lines, limit):
+    """
+    Split a code block longer than the limit into several code blocks, each
+    closed and reopened with the same fence so that none of them is cut open.
+
+    Args:
+        lines: The lines of the block, opening and closing fences included
+        limit: Maximum length of each piece
+
+    Returns:
+        list: The pieces, each a complete code block
+    """
+    opening, body = lines[0], lines[1:-1]
+    closing = lines[-1].strip()
+    room = limit - len(opening) - len(closing) - 2
+    pieces = []
+    current = []
+    size = 0
+    for line in body:
+        # Dans le code, les espaces comptent: une ligne trop longue est coupée telle quelle
+        parts = [line[i:i + room] for i in range(0, len(line), room)] or [""]
+        for part in parts:
+            if current and size + 1 + len(part) > room:
+                pieces.append("\n".join([opening, *current, closing]))
+                current, size = [], 0
+            size += len(part) + (1 if current else 0)
+            current.append(part)
+    if current or not pieces:
+        pieces.append("\n".join([opening, *current, closing]))
+    return pieces
+
+
+def _units(text, limit):
+    """
+    Cut a message into the smallest pieces that must stay together: lines of
+    text (split on words when too long) and whole code blocks (re-fenced
+    when too long).
+    """
+    lines = text.split("\n")
+    units = []
+    index = 0
+    while index < len(lines):
+        line = lines[index]
+        if _is_fence(line):
+            end = next((i for i in range(index + 1, len(lines)) if lines[i].strip() == CODE_FENCE), None)
+            if end is not None:
+                block = lines[index:end + 1]
+                joined = "\n".join(block)
+                units.extend([joined] if len(joined) <= limit else _split_code_block(block, limit))
+                index = end + 1
+                continue
+            # Bloc jamais fermé: Discord l'affiche comme du texte
+        units.extend(_split_words(line, limit) if len(line) > limit else [line])
+        index += 1
+    return units
+
+
+def split_message(text, limit=MAX_MESSAGE_LENGTH):
+    """
+    Split a message into chunks of at most `limit` characters.
+    Chunks end on line boundaries when possible, then on word boundaries,
+    and a code block is never cut open: it moves to the next chunk whole, or
+    is split into several complete code blocks if it is longer than a chunk.
+
+    Args:
+        text: The message content
+        limit: Maximum length of each chunk
+
+    Returns:
+        list: The chunks, in order (a single one if the message fits)
+    """
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    if len(text) <= limit:
+        return [text]
+    chunks = []
+    current = None
+    for unit in _units(text, limit):
+        if current is None:
+            current = unit
+        elif len(current) + 1 + len(unit) <= limit:
+            current += "\n" + unit
+        else:
+            chunks.append(current)
+            current = unit
+    if current is not None:
+        chunks.append(current)
+    # Discord refuse les messages vides: les lignes blanches aux coupures disparaissent
+    chunks = [chunk.strip("\n") for chunk in chunks]
+    return [chunk for chunk in chunks if chunk.strip()]
@@ -0,0 +1,131 @@
+"""
+In-memory metrics for the message scheduler (fixed-bucket histograms and counters).
+"""
+import bisect
+import math
+
+# Bornes supérieures des buckets (la dernière est +inf)
+LAG_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 300, math.inf)
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, math.inf)
+DEPTH_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 10000, 100000, math.inf)
+
+
+class Histogram:
+    """
+    A histogram with fixed bucket boundaries: recording is O(log buckets)
+    and memory does not grow with the number of observations.
+    """
+
+    def __init__(self, buckets):
+        """
+        Initialize an empty histogram.
+
+        Args:
+            buckets: Sorted upper bounds of the buckets, ending with math.inf
+        """
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, value):
+        """
+        Add one observation.
+
+        Args:
+            value: The observed value
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.maximum = max(self.maximum, value)
+
+    def percentile(self, percent):
+        """
+        Estimate a percentile as the upper bound of the bucket that contains it.
+
+        Args:
+            percent: The percentile (0-100)
+
+        Returns:
+            float: The estimated value, or None if the histogram is empty
+        """
+        if not self.count:
+            return None
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                # Une borne de bucket ne peut pas dépasser le maximum réellement observé
+                return min(bound, self.maximum)
+        return self.maximum
+
+    def snapshot(self):
+        """
+        Export the histogram as plain data.
+
+        Returns:
+            dict: Buckets, counts and summary statistics
+        """
+        return {
+            'buckets': ["+Inf" if math.isinf(bound) else bound for bound in self.buckets],
+            'counts': list(self.counts),
+            'count': self.count,
+            'sum': self.total,
+            'max': self.maximum,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+        }
+
+
+class SchedulerMetrics:
+    """
+    Dispatch metrics of the message scheduler: lateness of each send compared
+    to its target time, send duration, queue depth and event counters.
+    """
+
+    def __init__(self):
+        """Initialize empty histograms and counters."""
+        self.lag = Histogram(LAG_BUCKETS)
+        self.send_duration = Histogram(DURATION_BUCKETS)
+        self.queue_depth = Histogram(DEPTH_BUCKETS)
+        self.counters = {}
+
+    def increment(self, name, amount=1):
+        """
+        Increase a named counter.
+
+        Args:
+            name: The counter name
+            amount: The increment
+        """
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_dispatch(self, lag, duration):
+        """
+        Record one successful send.
+
+        Args:
+            lag: Seconds between the target time and the end of the send
+            duration: Seconds spent in the send itself
+        """
+        self.lag.record(max(lag, 0.0))
+        self.send_duration.record(duration)
+        self.increment('sent')
+
+    def snapshot(self):
+        """
+        Export every metric as plain data (JSON serialisable).
+
+        Returns:
+            dict: The metrics
+        """
+        return {
+            'lag_seconds': self.lag.snapshot(),
+            'send_duration_seconds': self.send_duration.snapshot(),
+            'queue_depth': self.queue_depth.snapshot(),
+            'counters': dict(self.counters),
+        }
@@ -0,0 +1,198 @@
+"""
+Scheduling quotas per user and per guild.
+"""
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Limites par défaut, modifiables par serveur (réglage "quota_<nom>", commande !quota)
+DEFAULT_QUOTAS = {
+    'user_jobs': 100,  # messages en attente par utilisateur
+    'guild_jobs': 2000,  # messages en attente par serveur
+    'minute_jobs': 30,  # messages d'un serveur prévus dans la même minute
+    'user_bytes': 200_000,  # taille cumulée des messages en attente d'un utilisateur (octets UTF-8)
+    'guild_bytes': 2_000_000,  # taille cumulée des messages en attente d'un serveur
+    'user_file_bytes': 100 * 1024 * 1024,  # taille cumulée des pièces jointes en attente d'un utilisateur
+    'guild_file_bytes': 1024 * 1024 * 1024,  # taille cumulée des pièces jointes en attente d'un serveur
+}
+
+QUOTA_DESCRIPTIONS = {
+    'user_jobs': "messages programmés en attente par utilisateur",
+    'guild_jobs': "messages programmés en attente sur le serveur",
+    'minute_jobs': "messages du serveur prévus dans la même minute",
+    'user_bytes': "octets de messages en attente par utilisateur",
+    'guild_bytes': "octets de messages en attente sur le serveur",
+    'user_file_bytes': "octets de pièces jointes en attente par utilisateur",
+    'guild_file_bytes': "octets de pièces jointes en attente sur le serveur",
+}
+
+
+class QuotaExceeded(ValueError):
+    """Raised when scheduling a message would exceed a quota."""
+
+    def __init__(self, name, limit):
+        """
+        Initialize the error.
+
+        Args:
+            name: The quota that would be exceeded
+            limit: Its limit
+        """
+        super().__init__(f"Quota atteint: {limit} {QUOTA_DESCRIPTIONS[name]} au maximum.")
+        self.name = name
+        self.limit = limit
+
+
+def payload_size(message):
+    """Get the size a message counts for in the payload quotas."""
+    return len(message.encode('utf-8')) if message else 0
+
+
+def attachments_size(attachments):
+    """Get the size the attachments of a job count for in the file quotas."""
+    # Chaque job compte ses pièces jointes, même si un fichier partagé n'est stocké qu'une fois
+    return sum(size for _, _, size in attachments) if attachments else 0
+
+
+class QuotaTracker:
+    """
+    Counts pending jobs and their payload per user, per guild and per guild
+    and minute of fire time. The counters are updated as jobs are added,
+    moved and removed, so checking a quota never scans the jobs.
+    """
+
+    def __init__(self, get_guild_setting, metrics):
+        """
+        Initialize empty counters.
+
+        Args:
+            get_guild_setting: Function (guild_id, key, default) returning a guild setting
+            metrics: The SchedulerMetrics receiving the rejection counters
+        """
+        self.get_guild_setting = get_guild_setting
+        self.metrics = metrics
+        self._user_jobs = {}  # {author_id: nombre}
+        self._guild_jobs = {}  # {guild_id: nombre}
+        self._minute_jobs = {}  # {(guild_id, minute): nombre}
+        self._user_bytes = {}  # {author_id: octets}
+        self._guild_bytes = {}  # {guild_id: octets}
+        self._user_file_bytes = {}  # {author_id: octets}
+        self._guild_file_bytes = {}  # {guild_id: octets}
+
+    def limit(self, guild_id, name):
+        """
+        Get the limit of a quota for a guild.
+
+        Args:
+            guild_id: The Discord guild ID (None for DMs)
+            name: The quota name (a key of DEFAULT_QUOTAS)
+
+        Returns:
+            int: The limit
+        """
+        return int(self.get_guild_setting(guild_id, f'quota_{name}', DEFAULT_QUOTAS[name]))
+
+    @staticmethod
+    def _bump(counters, key, delta):
+        """Add to a counter, dropping it when it falls to zero."""
+        value = counters.get(key, 0) + delta
+        if value > 0:
+            counters[key] = value
+        else:
+            counters.pop(key, None)
+
+    def _update(self, job, sign):
+        """Add (sign=1) or remove (sign=-1) a job from the counters."""
+        size = payload_size(job.message)
+        file_size = attachments_size(job.attachments)
+        self._bump(self._user_jobs, job.author_id, sign)
+        self._bump(self._user_bytes, job.author_id, sign * size)
+        self._bump(self._user_file_bytes, job.author_id, sign * file_size)
+        # Un message multi-serveurs compte une fois dans chacun de ses serveurs
+        for guild_id in job.guild_ids:
+            self._bump(self._guild_jobs, guild_id, sign)
+            self._bump(self._guild_bytes, guild_id, sign * size)
+            self._bump(self._guild_file_bytes, guild_id, sign * file_size)
+            self._bump(self._minute_jobs, (guild_id, job.fire_at // 60), sign)
+
+    def add(self, job):
+        """
+        Count a pending job.
+
+        Args:
+            job: The ScheduledJob
+        """
+        self._update(job, 1)
+
+    def remove(self, job):
+        """
+        Stop counting a job (sent, cancelled, or about to be moved).
+
+        Args:
+            job: The ScheduledJob
+        """
+        self._update(job, -1)
+
+    def check(self, requests):
+        """
+        Check that new jobs fit in the quotas, taking all of them into account together.
+
+        Args:
+            requests: Iterable of (author_id, guild IDs, fire_at, payload size, attachments size) tuples,
+                the guild IDs being every guild the job is sent to (empty for DMs)
+
+        Raises:
+            QuotaExceeded: If one of the jobs would exceed a quota
+        """
+        # Ajouts de ce lot, pour qu'un import ne dépasse pas les quotas à lui seul
+        added = {}
+
+        def exceeds(name, counters, key, guild_id, delta):
+            total = counters.get(key, 0) + added.get((name, key), 0) + delta
+            added[(name, key)] = added.get((name, key), 0) + delta
+            return total > self.limit(guild_id, name)
+
+        for author_id, guild_ids, fire_at, size, file_size in requests:
+            # Les quotas d'un utilisateur sont ceux du premier serveur visé
+            first_guild = guild_ids[0] if guild_ids else None
+            checks = [
+                ('user_jobs', self._user_jobs, author_id, first_guild, 1),
+                ('user_bytes', self._user_bytes, author_id, first_guild, size),
+                ('user_file_bytes', self._user_file_bytes, author_id, first_guild, file_size),
+            ]
+            for guild_id in guild_ids:
+                checks += [
+                    ('guild_jobs', self._guild_jobs, guild_id, guild_id, 1),
+                    ('guild_bytes', self._guild_bytes, guild_id, guild_id, size),
+                    ('guild_file_bytes', self._guild_file_bytes, guild_id, guild_id, file_size),
+                    ('minute_jobs', self._minute_jobs, (guild_id, fire_at // 60), guild_id, 1),
+                ]
+            for name, counters, key, guild_id, delta in checks:
+                if exceeds(name, counters, key, guild_id, delta):
+                    self.metrics.increment('quota_rejected')
+                    self.metrics.increment(f'quota_rejected_{name}')
+                    logger.warning(f"Quota {name} atteint pour l'utilisateur {author_id} (serveur {guild_id})")
+                    raise QuotaExceeded(name, self.limit(guild_id, name))
+
+    def usage(self, guild_id, author_id=None):
+        """
+        Get the current usage of a guild (and optionally of a user).
+
+        Args:
+            guild_id: The Discord guild ID
+            author_id: The Discord user ID, or None
+
+        Returns:
+            dict: {quota name: current value} for the guild-wide and user quotas
+        """
+        usage = {
+            'guild_jobs': self._guild_jobs.get(guild_id, 0),
+            'guild_bytes': self._guild_bytes.get(guild_id, 0),
+            'guild_file_bytes': self._guild_file_bytes.get(guild_id, 0),
+        }
+        if author_id is not None:
+            usage['user_jobs'] = self._user_jobs.get(author_id, 0)
+            usage['user_bytes'] = self._user_bytes.get(author_id, 0)
+            usage['user_file_bytes'] = self._user_file_bytes.get(author_id, 0)
+        return usage
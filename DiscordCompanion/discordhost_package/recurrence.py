@@ -0,0 +1,161 @@
+"""
+Recurrence rules (daily, weekly, cron) for scheduled messages.
+"""
+from datetime import datetime, time, timedelta
+
+# Noms de jours acceptés (français et anglais), numérotés comme cron: 0 = dimanche
+WEEKDAYS = {
+    'dimanche': 0, 'lundi': 1, 'mardi': 2, 'mercredi': 3, 'jeudi': 4, 'vendredi': 5, 'samedi': 6,
+    'sunday': 0, 'monday': 1, 'tuesday': 2, 'wednesday': 3, 'thursday': 4, 'friday': 5, 'saturday': 6,
+    'sun': 0, 'mon': 1, 'tue': 2, 'wed': 3, 'thu': 4, 'fri': 5, 'sat': 6,
+}
+
+# Nombre de jours examinés au maximum pour trouver la prochaine occurrence
+MAX_LOOKAHEAD_DAYS = 366 * 5
+
+
+def _parse_cron_field(field, minimum, maximum):
+    """
+    Parse one cron field ("*", "1,2", "1-5", "*/15", "10-20/5").
+
+    Args:
+        field: The field text
+        minimum: Smallest allowed value
+        maximum: Largest allowed value
+
+    Returns:
+        tuple: (sorted list of values, True if the field was "*")
+    """
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f"Pas invalide dans le champ cron '{field}'")
+        if part == '*':
+            start, end = minimum, maximum
+        elif '-' in part:
+            start, end = (int(value) for value in part.split('-', 1))
+        else:
+            start = end = int(part)
+        if start < minimum or end > maximum or start > end:
+            raise ValueError(f"Valeur hors limites dans le champ cron '{field}' ({minimum}-{maximum})")
+        values.update(range(start, end + 1, step))
+    return sorted(values), field == '*'
+
+
+class RecurrenceRule:
+    """
+    A recurrence expressed as a cron expression evaluated in a local timezone.
+    Only the next occurrence is ever computed, so a rule costs the same
+    whatever the number of times it fires.
+    """
+
+    def __init__(self, spec, tz):
+        """
+        Parse a recurrence specification.
+
+        Args:
+            spec: "daily HH:MM", "weekly <jour> HH:MM" or "cron <m> <h> <dom> <mon> <dow>"
+            tz: The OffsetTable of the timezone in which the rule is evaluated
+
+        Raises:
+            ValueError: If the specification is invalid
+        """
+        self.tz = tz
+        parts = spec.split()
+        if not parts:
+            raise ValueError("Règle de récurrence vide")
+        kind = parts[0].lower()
+
+        try:
+            if kind == 'daily' and len(parts) == 2:
+                hour, minute = self._parse_clock(parts[1])
+                cron = f"{minute} {hour} * * *"
+            elif kind == 'weekly' and len(parts) == 3:
+                weekday = WEEKDAYS.get(parts[1].lower())
+                if weekday is None:
+                    raise ValueError(f"Jour inconnu: {parts[1]}")
+                hour, minute = self._parse_clock(parts[2])
+                cron = f"{minute} {hour} * * {weekday}"
+            elif kind == 'cron' and len(parts) == 6:
+                cron = " ".join(parts[1:])
+            else:
+                raise ValueError(
+                    "Règle invalide. Utilisez 'daily HH:MM', 'weekly <jour> HH:MM' ou 'cron <m> <h> <jour> <mois> <jour_semaine>'"
+                )
+
+            minute_field, hour_field, dom_field, month_field, dow_field = cron.split()
+            self.minutes, _ = _parse_cron_field(minute_field, 0, 59)
+            self.hours, _ = _parse_cron_field(hour_field, 0, 23)
+            self.days, dom_any = _parse_cron_field(dom_field, 1, 31)
+            self.months, _ = _parse_cron_field(month_field, 1, 12)
+            weekdays, dow_any = _parse_cron_field(dow_field, 0, 7)
+        except ValueError as e:
+            if str(e).startswith("invalid literal"):
+                raise ValueError(f"Règle de récurrence invalide: {spec}")
+            raise
+
+        # 7 est un alias de dimanche en cron
+        self.weekdays = {0 if day == 7 else day for day in weekdays}
+        self.days = set(self.days)
+        self.months = set(self.months)
+        # Comme cron: si jour du mois et jour de semaine sont restreints tous les deux, l'un OU l'autre suffit
+        self._dom_any = dom_any
+        self._dow_any = dow_any
+        self.spec = " ".join([kind] + parts[1:])
+
+    @staticmethod
+    def _parse_clock(text):
+        """Parse an HH:MM string into (hour, minute)."""
+        try:
+            hour, minute = (int(value) for value in text.split(':'))
+        except ValueError:
+            raise ValueError(f"Heure invalide: {text}")
+        if not (0 <= hour <= 23 and 0 <= minute <= 59):
+            raise ValueError(f"Heure invalide: {text}")
+        return hour, minute
+
+    def _matches_day(self, day):
+        """Check whether a date matches the day-of-month, month and weekday fields."""
+        if day.month not in self.months:
+            return False
+        dom_match = day.day in self.days
+        dow_match = (day.weekday() + 1) % 7 in self.weekdays
+        if self._dom_any:
+            return dow_match
+        if self._dow_any:
+            return dom_match
+        return dom_match or dow_match
+
+    def next_after(self, after):
+        """
+        Compute the first occurrence strictly after a timestamp.
+
+        Args:
+            after: POSIX timestamp
+
+        Returns:
+            int: The timestamp of the next occurrence, or None if there is none
+        """
+        local_now = self.tz.to_local(after)
+        day = local_now.date()
+        for offset in range(MAX_LOOKAHEAD_DAYS):
+            if self._matches_day(day):
+                for hour in self.hours:
+                    # Le premier jour, inutile d'examiner les heures déjà passées (marge d'une heure pour le DST)
+                    if offset == 0 and hour < local_now.hour - 1:
+                        continue
+                    for minute in self.minutes:
+                        # Une heure sautée par le passage à l'heure d'été tombe juste après le saut;
+                        # une heure qui existe deux fois ne se déclenche qu'à la première
+                        timestamp = self.tz.to_timestamp(datetime.combine(day, time(hour, minute)))
+                        if timestamp > after:
+                            return timestamp
+            day += timedelta(days=1)
+        return None
+
+    def __str__(self):
+        return self.spec
@@ -3,79 +3,669 @@ Scheduler for handling message scheduling.
 """
 import logging
 import uuid
+import hashlib
+import os
+import socket
+import sys
+import heapq
+import itertools
+import random
+import bisect
 import discord
-from datetime import datetime, timedelta
-import pytz
+from datetime import datetime, timezone
 import asyncio
-# Utilisons le BackgroundScheduler au lieu de AsyncIOScheduler
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.date import DateTrigger
-from apscheduler.jobstores.memory import MemoryJobStore
+import time as time_module
+from collections import deque
 
-# Définir le fuseau horaire à utiliser (Europe/Paris pour la France)
-TIMEZONE = pytz.timezone('Europe/Paris')
+from job_store import JobStore
+from recurrence import RecurrenceRule
+from webhook_delivery import WebhookDelivery
+from channel_cache import ChannelCache
+from metrics import SchedulerMetrics
+from templates import compile_template, TemplateContext
+from timezones import offset_table, DEFAULT_TIMEZONE
+from message_split import split_message, MAX_MESSAGE_LENGTH
+from dm_campaign import DMCampaignRunner
+from quotas import QuotaTracker, payload_size, attachments_size, QuotaExceeded
+from blob_store import BlobStore, DEFAULT_BLOB_DIR
+
+# Nombre maximal d'envois simultanés, tous canaux confondus
+# (discord.py respecte lui-même les buckets de rate-limit de chaque route)
+MAX_CONCURRENT_SENDS = 10
+
+# Politique de nouvelle tentative après un échec d'envoi: backoff exponentiel avec jitter,
+# puis mise en file des messages en échec (dead letters) que l'auteur peut consulter et rejouer
+RETRY_BASE_DELAY = 5  # secondes
+RETRY_MAX_DELAY = 15 * 60
+MAX_SEND_ATTEMPTS = 6
+
+# Modes d'attribution: "inline" envoie l'embed "programmé par" avec le message (une requête),
+# "reply" l'envoie en réponse séparée (deux requêtes, comportement historique)
+ATTRIBUTION_MODES = ('inline', 'reply')
+DEFAULT_ATTRIBUTION_MODE = 'inline'
+
+# Modes de livraison: "bot" envoie avec le compte du bot, "webhook" via un webhook par canal
+# au nom de l'auteur (bucket de rate-limit séparé, pas d'embed d'attribution)
+DELIVERY_MODES = ('bot', 'webhook')
+DEFAULT_DELIVERY_MODE = 'bot'
+
+# Rattrapage des messages échus pendant un arrêt du bot: "late" les envoie tous en retard,
+# "skip" abandonne (en dead letters) ceux qui dépassent la fenêtre de retard, "digest" les
+# regroupe en un message récapitulatif par canal. Dans la fenêtre, ils sont toujours envoyés
+CATCHUP_POLICIES = ('late', 'skip', 'digest')
+DEFAULT_CATCHUP_POLICY = 'skip'
+DEFAULT_CATCHUP_WINDOW = 10  # minutes
+# Débit du rattrapage, limité pour ne pas retarder les messages dus maintenant
+CATCHUP_SENDS_PER_SECOND = 2
+
+# Nombre maximal de canaux d'une annonce envoyée dans plusieurs canaux (fan-out)
+MAX_FANOUT_TARGETS = 50
+
+# Messages éphémères: Discord supprime jusqu'à 100 messages de moins de 14 jours en une seule
+# requête (permission "Gérer les messages"); les autres sont supprimés un par un
+BULK_DELETE_MAX = 100
+BULK_DELETE_MAX_AGE = 14 * 24 * 3600 - 60  # marge d'une minute sur la limite de Discord
+EXPIRY_RETRY_DELAY = 60  # secondes avant de retenter une suppression qui a échoué
+
+# Durée du bail pris sur un job au moment de l'envoi: plusieurs instances du bot peuvent partager
+# la même base, et un job n'est envoyé que par l'instance qui détient son bail
+LEASE_SECONDS = 120
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+class ScheduledJob:
+    """
+    In-memory record of a scheduled message. Slots instead of a dict keep the
+    per-job overhead small; fire_at is a UTC timestamp in whole seconds, and
+    the local time is derived from it in the timezone of the job's guild.
+    """
+    
+    __slots__ = ('channel_id', 'author_id', 'author_name', 'message', 'fire_at', 'recurrence', 'template', 'attempts',
+                 'targets', 'chunks', 'queued', 'guild_id', 'attachments', 'ttl', 'target_guilds')
+    
+    def __init__(self, channel_id, author_id, author_name, message, fire_at, recurrence=None, targets=None,
+                 guild_id=None, attachments=None, ttl=None, target_guilds=None):
+        """
+        Initialize a job record.
+        
+        Args:
+            channel_id: The Discord channel ID
+            author_id: The Discord user ID of the author
+            author_name: The display name of the author
+            message: The message content (the only copy kept in memory)
+            fire_at: POSIX timestamp at which the message is due (whole seconds)
+            recurrence: Optional RecurrenceRule
+            targets: For a fan-out job, the tuple of all target channel IDs (channel_id is the first)
+            guild_id: The guild the job counts for in the quotas (None for DMs and old jobs)
+            attachments: The (digest, filename, size) triples of the files sent with the message, kept in the BlobStore
+            ttl: Seconds after which the sent messages delete themselves (None keeps them)
+            target_guilds: For a fan-out job, the distinct guilds of its target channels (guild_id is the first)
+        """
+        self.channel_id = int(channel_id)
+        self.author_id = int(author_id)
+        # Les mêmes auteurs programment beaucoup de messages: une seule copie de chaque nom
+        self.author_name = sys.intern(author_name) if author_name else None
+        self.set_message(message)
+        self.fire_at = int(fire_at)
+        self.recurrence = recurrence
+        self.attempts = 0
+        self.targets = tuple(int(target) for target in targets) if targets else None
+        # Séquence de l'entrée valide du job dans la file d'échéances (None s'il n'y est pas)
+        self.queued = None
+        self.guild_id = int(guild_id) if guild_id is not None else None
+        self.attachments = tuple(attachments) if attachments else None
+        self.ttl = int(ttl) if ttl else None
+        self.target_guilds = tuple(int(guild) for guild in target_guilds) if target_guilds else None
+    
+    def set_message(self, message):
+        """
+        Set the message content and precompute what sending it needs.
+        
+        Args:
+            message: The message content
+        """
+        self.message = message
+        self.template = compile_template(message)
+        # Un message trop long est découpé une fois pour toutes, à la programmation; un modèle
+        # est découpé après son rendu, qui peut changer sa longueur
+        if message and len(message) > MAX_MESSAGE_LENGTH and self.template is None:
+            self.chunks = tuple(split_message(message))
+        else:
+            self.chunks = None
+    
+    @property
+    def channel_ids(self):
+        """Every channel the job is sent to."""
+        return self.targets or (self.channel_id,)
+    
+    @property
+    def guild_ids(self):
+        """Every guild the job counts for in the quotas (none for DMs and old jobs)."""
+        if self.target_guilds:
+            return self.target_guilds
+        return (self.guild_id,) if self.guild_id is not None else ()
+
 class MessageScheduler:
     """
     Handles scheduling and sending of messages.
     """
     
-    def __init__(self, bot):
+    def __init__(self, bot, job_store=None, instance_id=None, sync_interval=None, clock=None, blob_store=None):
         """
         Initialize the scheduler.
         
         Args:
             bot: The Discord bot instance
+            job_store: The persistent JobStore (defaults to scheduled_jobs.db)
+            instance_id: Unique name of this bot instance, used for job leases
+            sync_interval: Seconds between polls of the store for due jobs scheduled by other
+                instances sharing it (None when this instance is the only one)
+            clock: Function returning the current POSIX timestamp (defaults to time.time);
+                it must advance with the event loop's own clock
+            blob_store: The BlobStore of the attachments (defaults to a scheduled_attachments
+                directory next to the job database)
         """
         self.bot = bot
-        # Configurer le scheduler avec le fuseau horaire Europe/Paris
-        # Utiliser BackgroundScheduler au lieu de AsyncIOScheduler
-        jobstores = {
-            'default': MemoryJobStore()
-        }
-        self.scheduler = BackgroundScheduler(
-            jobstores=jobstores,
-            timezone=TIMEZONE
+        self.clock = clock or time_module.time
+        self.instance_id = instance_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.sync_interval = sync_interval
+        # Un seul enregistrement par job, manipulé uniquement depuis la boucle asyncio du bot
+        self.jobs = {}  # {job_id: ScheduledJob}
+        # File d'attente triée par heure d'envoi (min-heap de (timestamp, séquence, job_id))
+        # La séquence conserve l'ordre de programmation entre jobs dus à la même seconde
+        # Les annulations sont paresseuses: l'entrée reste dans le tas et est ignorée au dépilage
+        self._due_queue = []
+        self._sequence = itertools.count()
+        self._stale_entries = 0
+        self._wakeup = None  # asyncio.Event créé dans la boucle du bot
+        # Index secondaires triés par heure d'envoi: {author_id: [(fire_at, job_id)]} et {channel_id: [...]}
+        self._jobs_by_author = {}
+        self._jobs_by_channel = {}
+        self._dispatch_task = None
+        # Files d'envoi par canal: l'ordre n'est garanti qu'à l'intérieur d'un même canal
+        self._lanes = {}  # {channel_id: deque de job_id}
+        self._lane_tasks = {}  # {channel_id: asyncio.Task}
+        self._send_semaphore = None  # asyncio.Semaphore créé dans la boucle du bot
+        self._fanout_tasks = set()  # Envois multi-canaux en cours
+        # Jobs échus pendant l'arrêt, traités au démarrage selon la politique de rattrapage
+        self._catchup_backlog = []
+        self._catchup_task = None
+        self._warm_task = None
+        # Messages éphémères: leurs suppressions passent par la même file d'échéances, avec pour clé
+        # (channel_id, message_id) au lieu d'un job_id
+        self._expirations = {}  # {(channel_id, message_id): séquence de l'entrée valide}
+        self._due_deletions = []  # Clés échues, en attente d'être supprimées par le dispatcher
+        self._webhook_messages = set()  # message_id des messages éphémères envoyés par webhook
+        self._deletion_tasks = set()
+        self.store = job_store if job_store is not None else JobStore()
+        self.guild_settings = self.store.load_guild_settings()  # {guild_id: {clé: valeur}}
+        self.blobs = blob_store if blob_store is not None else BlobStore(
+            self.store, os.path.join(os.path.dirname(self.store.path), DEFAULT_BLOB_DIR)
         )
-        self.jobs = {}  # Dictionary to store job details
-        logger.info("Message scheduler initialized with timezone: Europe/Paris using BackgroundScheduler")
+        self.webhooks = WebhookDelivery(bot, self.store)
+        self.channels = ChannelCache(bot)
+        self.metrics = SchedulerMetrics()
+        self.quotas = QuotaTracker(self.get_guild_setting, self.metrics)
+        self.templates = TemplateContext(bot, self.timezone_for_guild, clock=self.clock)
+        self.campaigns = DMCampaignRunner(bot, self.store, self.metrics, self.clock, self.instance_id)
+        self.restore_jobs()
+        self.blobs.collect()
+        logger.info(f"Message scheduler initialized with default timezone: {DEFAULT_TIMEZONE}")
     
     def start(self):
         """
-        Start the scheduler. This should be called after the bot is ready.
+        Start the dispatcher task on the running event loop.
+        This must be called from a coroutine (e.g. the bot's setup_hook).
         """
-        if not self.scheduler.running:
-            self.scheduler.start()
+        if self._dispatch_task is None or self._dispatch_task.done():
+            self._dispatch_task = asyncio.get_running_loop().create_task(self._run_dispatcher())
+            self.campaigns.start()
             logger.info("Scheduler started")
     
-    def schedule_message(self, channel_id, message, time, author_id, author_name=None):
+    def stop(self):
+        """Cancel the dispatcher task, the DM campaigns and any channel lane still sending."""
+        if self._dispatch_task is not None:
+            self._dispatch_task.cancel()
+            self._dispatch_task = None
+        self.campaigns.stop()
+        for task in (self._catchup_task, self._warm_task):
+            if task is not None:
+                task.cancel()
+        self._catchup_task = self._warm_task = None
+        for task in list(self._lane_tasks.values()) + list(self._fanout_tasks) + list(self._deletion_tasks):
+            task.cancel()
+        self._lane_tasks.clear()
+        self._fanout_tasks.clear()
+        self._deletion_tasks.clear()
+        self._lanes.clear()
+    
+    async def _run_dispatcher(self):
+        """
+        Sleep until the next job is due and send it, forever.
+        """
+        await self.bot.wait_until_ready()
+        logger.info("Démarrage du dispatcher de messages programmés")
+        # Résoudre dès maintenant les canaux des jobs en attente, en tâche de fond:
+        # un envoi qui en a besoin avant la fin attend le même fetch_channel
+        self._warm_task = asyncio.get_running_loop().create_task(self.channels.warm(list(self._jobs_by_channel)))
+        if self._catchup_backlog:
+            self._catchup_task = asyncio.get_running_loop().create_task(self._run_catchup())
+        while not self.bot.is_closed():
+            try:
+                # Dormir jusqu'à la prochaine échéance (réveil anticipé si un job plus proche est ajouté ou annulé)
+                popped = await self.wait_for_due_jobs(timeout=self.sync_interval)
+                try:
+                    due_jobs = self._claim_due_jobs(popped)
+                except Exception:
+                    # Base partagée verrouillée par une autre instance, par exemple: les jobs dépilés
+                    # ne doivent pas rester hors de la file jusqu'au prochain redémarrage
+                    self._requeue_unclaimed(popped)
+                    raise
+                if self._due_deletions:
+                    self._start_deletions()
+                if not due_jobs:
+                    continue
+                self.metrics.queue_depth.record(len(self.jobs))
+                for job_id, details in due_jobs:
+                    self._dispatch(job_id, details)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erreur dans la boucle du dispatcher: {e}")
+                import traceback
+                logger.error(f"Stack trace: {traceback.format_exc()}")
+                await asyncio.sleep(10)  # Attendre plus longtemps en cas d'erreur
+    
+    def _claim_due_jobs(self, due_jobs, lease_seconds=LEASE_SECONDS):
+        """
+        Take the lease of due jobs so that no other instance sends them too.
+        Jobs finished or leased by another instance are dropped or postponed;
+        when several instances share the store, due jobs they scheduled are
+        picked up here as well.
+        
+        Args:
+            due_jobs: (job_id, details) tuples popped from the due-queue
+            lease_seconds: Duration of the leases taken
+            
+        Returns:
+            list: (job_id, details) tuples this instance must send
+        """
+        now = self.clock()
+        rows = self.store.claim_jobs([job_id for job_id, _ in due_jobs], self.instance_id, now, lease_seconds)
+        claimed = []
+        for job_id, details in due_jobs:
+            row = rows.get(job_id)
+            if row is None:
+                # Envoyé ou annulé par une autre instance
+                self._index_remove(job_id)
+                del self.jobs[job_id]
+                continue
+            fire_at, lease_owner, lease_until = row
+            if lease_owner == self.instance_id and fire_at <= now:
+                claimed.append((job_id, details))
+                continue
+            self.metrics.increment('lease_conflicts')
+            if fire_at > now:
+                # Une autre instance l'a déjà envoyé et reprogrammé (occurrence suivante ou nouvelle tentative)
+                self._move_job(job_id, fire_at)
+            else:
+                # En cours d'envoi ailleurs: revenir à l'expiration du bail si l'instance a disparu
+                self._push_due(job_id, lease_until)
+        
+        if self.sync_interval is not None:
+            for job_id, *columns in self.store.claim_due_jobs(self.instance_id, now, LEASE_SECONDS):
+                if job_id in self.jobs:
+                    continue
+                self.jobs[job_id] = self._restored_details(*columns)
+                self._index_add(job_id)
+                claimed.append((job_id, self.jobs[job_id]))
+        return claimed
+    
+    def _requeue_unclaimed(self, due_jobs):
+        """
+        Put back in the due-queue the popped jobs that a failed claim left out of it.
+        
+        Args:
+            due_jobs: (job_id, details) tuples popped from the due-queue
+        """
+        for job_id, details in due_jobs:
+            if self.jobs.get(job_id) is details and details.queued is None:
+                self._push_due(job_id, details.fire_at)
+        logger.warning(f"Prise des baux impossible: {len(due_jobs)} job(s) remis dans la file")
+    
+    async def _run_catchup(self):
+        """
+        Drain the jobs that became overdue while the bot was offline, at a
+        throttled rate, applying each guild's catch-up policy.
+        
+        Returns:
+            dict: Number of jobs sent late, skipped and collapsed into digests
+        """
+        backlog, self._catchup_backlog = self._catchup_backlog, []
+        # Le bail doit couvrir tout le rattrapage, qui est volontairement lent
+        lease_seconds = len(backlog) / CATCHUP_SENDS_PER_SECOND + LEASE_SECONDS
+        counts = {'late': 0, 'skipped': 0, 'collapsed': 0}
+        overdue = [(job_id, self.jobs[job_id]) for job_id in backlog if job_id in self.jobs]
+        try:
+            claimed = self._claim_due_jobs(overdue, lease_seconds)
+        except Exception as e:
+            # Comme dans le dispatcher: sans bail, les jobs repassent par la file d'échéances et sont
+            # envoyés en retard, ou repris à l'expiration du bail si une autre instance les détient
+            logger.error(f"Rattrapage impossible: {e}")
+            self._requeue_unclaimed(overdue)
+            return counts
+        now = self.clock()
+        late = []
+        digests = {}  # {channel_id: [job_id]}
+        
+        for job_id, details in claimed:
+            policy, window = self._catchup_policy(details.channel_id)
+            lateness = now - details.fire_at
+            # Un job multi-canaux n'appartient à aucun récapitulatif de canal: il est envoyé en retard
+            if policy == 'late' or lateness <= window * 60 or (policy == 'digest' and details.targets):
+                late.append(job_id)
+            elif policy == 'skip':
+                self._dead_letter(job_id, f"Expiré pendant l'arrêt du bot ({lateness / 60:.0f} min de retard)")
+                counts['skipped'] += 1
+            else:
+                digests.setdefault(details.channel_id, []).append(job_id)
+        
+        # Les récapitulatifs regroupent les messages les plus anciens: ils passent en premier
+        for channel_id, job_ids in digests.items():
+            collapsed, not_collapsed = await self._send_digest(channel_id, job_ids)
+            counts['collapsed'] += collapsed
+            late.extend(not_collapsed)
+        
+        for job_id in late:
+            if job_id not in self.jobs:
+                # Annulé pendant le rattrapage
+                continue
+            self._dispatch(job_id, self.jobs[job_id])
+            counts['late'] += 1
+            await asyncio.sleep(1 / CATCHUP_SENDS_PER_SECOND)
+        
+        for name, value in counts.items():
+            self.metrics.increment(f'catchup_{name}', value)
+        logger.info(
+            f"Rattrapage terminé: {counts['late']} message(s) envoyé(s) en retard, "
+            f"{counts['skipped']} ignoré(s), {counts['collapsed']} regroupé(s) en récapitulatif"
+        )
+        return counts
+    
+    def _catchup_policy(self, channel_id):
+        """
+        Get the catch-up policy that applies to a channel.
+        
+        Args:
+            channel_id: The Discord channel ID
+            
+        Returns:
+            tuple: (policy, window in minutes)
+        """
+        channel = self.channels.get(channel_id)
+        guild = getattr(channel, 'guild', None)
+        return self.catchup_policy_for_guild(guild.id if guild else None)
+    
+    def catchup_policy_for_guild(self, guild_id):
+        """
+        Get a guild's catch-up policy.
+        
+        Args:
+            guild_id: The Discord guild ID (None for DMs)
+            
+        Returns:
+            tuple: (policy, window in minutes)
+        """
+        policy = self.get_guild_setting(guild_id, 'catchup', DEFAULT_CATCHUP_POLICY)
+        window = int(self.get_guild_setting(guild_id, 'catchup_window', DEFAULT_CATCHUP_WINDOW))
+        return policy, window
+    
+    async def _send_digest(self, channel_id, job_ids):
+        """
+        Send overdue messages of one channel as a single digest, then forget them.
+        Each message is rendered like a normal send first; those that carry
+        attachments, expire or need several messages on their own are not
+        collapsed and are returned to be sent late instead. If the digest
+        cannot be sent, the messages go to the dead-letter store.
+        
+        Args:
+            channel_id: The Discord channel ID
+            job_ids: The overdue jobs of the channel, in fire order
+            
+        Returns:
+            tuple: (number of messages delivered in the digest, IDs of the jobs to send late instead)
+        """
+        job_ids = [job_id for job_id in job_ids if job_id in self.jobs]
+        collapsed = []
+        late = []
+        try:
+            channel = await self.channels.resolve(channel_id)
+            if not channel:
+                raise LookupError("Canal introuvable")
+            lines = ["📬 **Messages programmés pendant l'interruption du bot**"]
+            for job_id in job_ids:
+                details = self.jobs[job_id]
+                if details.attachments or details.ttl:
+                    late.append(job_id)
+                    continue
+                # Même rendu qu'un envoi normal: champs dynamiques remplis, message découpé s'il est trop long
+                content = await self._prepare_content(job_id, channel, details.message)
+                if len(content) > 1:
+                    late.append(job_id)
+                    continue
+                collapsed.append(job_id)
+                lines.append(f"• **{details.author_name or 'Utilisateur inconnu'}** "
+                             f"(prévu le {self.local_time(details):%d/%m à %H:%M}) : {content[0]}")
+            if not collapsed:
+                return 0, late
+            # Coupé aux sauts de ligne ou entre les mots, jamais tronqué
+            chunks = split_message("\n".join(lines))
+            if self._send_semaphore is None:
+                self._send_semaphore = asyncio.Semaphore(MAX_CONCURRENT_SENDS)
+            for position, chunk in enumerate(chunks):
+                async with self._send_semaphore:
+                    await channel.send(chunk, nonce=self._send_nonce(collapsed[0], f'digest{position}'))
+                await asyncio.sleep(1 / CATCHUP_SENDS_PER_SECOND)
+        except Exception as e:
+            logger.error(f"❌ Récapitulatif impossible pour le canal {channel_id}: {e}")
+            for job_id in job_ids:
+                if job_id in self.jobs and job_id not in late:
+                    self._dead_letter(job_id, f"Récapitulatif de rattrapage impossible: {e}")
+            return 0, late
+        
+        for job_id in collapsed:
+            self.complete_job(job_id)
+        return len(collapsed), late
+    
+    def _dispatch(self, job_id, details):
+        """
+        Start sending a due job: through its channel's lane, or to all its
+        channels at once for a fan-out job.
+        
+        Args:
+            job_id: The job ID
+            details: The ScheduledJob record
+        """
+        if details.targets is None:
+            self._enqueue_lane(job_id, details.channel_id)
+            return
+        task = asyncio.get_running_loop().create_task(self._send_fanout(job_id))
+        self._fanout_tasks.add(task)
+        task.add_done_callback(self._fanout_tasks.discard)
+    
+    def _enqueue_lane(self, job_id, channel_id):
+        """
+        Hand a due job to its channel's lane, starting the lane if it is idle.
+        
+        Args:
+            job_id: The job ID
+            channel_id: The Discord channel ID
+        """
+        if self._send_semaphore is None:
+            self._send_semaphore = asyncio.Semaphore(MAX_CONCURRENT_SENDS)
+        self._lanes.setdefault(channel_id, deque()).append(job_id)
+        if channel_id not in self._lane_tasks:
+            self._lane_tasks[channel_id] = asyncio.get_running_loop().create_task(self._drain_lane(channel_id))
+    
+    async def _drain_lane(self, channel_id):
+        """
+        Send the jobs queued for one channel, in order, until the lane is empty.
+        
+        Args:
+            channel_id: The Discord channel ID
+        """
+        lane = self._lanes[channel_id]
+        try:
+            while lane:
+                job_id = lane.popleft()
+                details = self.jobs.get(job_id)
+                if details is None:
+                    # Annulé pendant qu'il attendait son tour
+                    continue
+                try:
+                    async with self._send_semaphore:
+                        await self._send_scheduled_message(
+                            job_id, channel_id, details.message, details.author_id
+                        )
+                except Exception as e:
+                    logger.error(f"Erreur inattendue dans la file du canal {channel_id} pour job {job_id}: {e}")
+        finally:
+            if not lane:
+                self._lanes.pop(channel_id, None)
+            self._lane_tasks.pop(channel_id, None)
+    
+    def _start_deletions(self):
+        """Delete the messages whose deletion is due, one background task per channel."""
+        by_channel = {}
+        for channel_id, message_id in self._due_deletions:
+            by_channel.setdefault(channel_id, []).append(message_id)
+        self._due_deletions = []
+        for channel_id, message_ids in by_channel.items():
+            task = asyncio.get_running_loop().create_task(self._delete_expired(channel_id, message_ids))
+            self._deletion_tasks.add(task)
+            task.add_done_callback(self._deletion_tasks.discard)
+    
+    async def _delete_expired(self, channel_id, message_ids):
+        """
+        Delete expired messages of one channel: in bulk-delete requests of up to
+        BULK_DELETE_MAX messages when Discord allows it (guild channel, "Manage
+        Messages" permission, messages younger than 14 days), one by one otherwise,
+        through the channel's webhook for the messages it posted. Deletions that failed for a transient reason are tried again later.
+        
+        Args:
+            channel_id: The Discord channel ID
+            message_ids: The IDs of the messages to delete
+            
+        Returns:
+            int: Number of messages deleted
+        """
+        if self._send_semaphore is None:
+            self._send_semaphore = asyncio.Semaphore(MAX_CONCURRENT_SENDS)
+        retry = []
+        deleted = 0
+        try:
+            channel = await self.channels.resolve(channel_id)
+        except discord.HTTPException as e:
+            logger.error(f"Canal {channel_id} inaccessible pour supprimer des messages éphémères: {e}")
+            channel, retry = None, list(message_ids)
+        
+        if channel is not None:
+            permissions = self.channels.permissions(channel) if getattr(channel, 'guild', None) else None
+            oldest = self.clock() - BULK_DELETE_MAX_AGE
+            bulk, single = [], []
+            for message_id in message_ids:
+                if (permissions is not None and permissions.manage_messages
+                        and discord.utils.snowflake_time(message_id).timestamp() > oldest):
+                    bulk.append(message_id)
+                else:
+                    single.append(message_id)
+            
+            for start in range(0, len(bulk), BULK_DELETE_MAX):
+                batch = bulk[start:start + BULK_DELETE_MAX]
+                if len(batch) == 1:
+                    single.extend(batch)
+                    continue
+                try:
+                    async with self._send_semaphore:
+                        await channel.delete_messages([discord.Object(message_id) for message_id in batch])
+                    deleted += len(batch)
+                    self.metrics.increment('bulk_deletes')
+                except discord.HTTPException as e:
+                    # Un message déjà supprimé ou trop ancien fait échouer tout le lot: un par un
+                    logger.warning(f"Suppression groupée impossible dans le canal {channel_id}: {e}")
+                    single.extend(batch)
+            
+            for message_id in single:
+                try:
+                    async with self._send_semaphore:
+                        # Sans "Gérer les messages", seul le webhook peut supprimer ses propres messages
+                        if not (message_id in self._webhook_messages
+                                and await self.webhooks.delete(channel, message_id)):
+                            await channel.get_partial_message(message_id).delete()
+                    deleted += 1
+                except discord.NotFound:
+                    # Déjà supprimé (par un modérateur ou son auteur)
+                    pass
+                except discord.HTTPException as e:
+                    if self._is_permanent_error(e):
+                        logger.warning(f"Message éphémère {message_id} impossible à supprimer: {e}")
+                    else:
+                        retry.append(message_id)
+        
+        retrying = set(retry)
+        done = [(channel_id, message_id) for message_id in message_ids if message_id not in retrying]
+        self.store.remove_expirations(done)
+        self._webhook_messages.difference_update(message_id for _, message_id in done)
+        if retry:
+            by_webhook = [message_id for message_id in retry if message_id in self._webhook_messages]
+            others = [message_id for message_id in retry if message_id not in self._webhook_messages]
+            for webhook, message_ids in ((True, by_webhook), (False, others)):
+                if message_ids:
+                    self.expire_messages(channel_id, message_ids, EXPIRY_RETRY_DELAY, webhook=webhook)
+        self.metrics.increment('messages_expired', deleted)
+        logger.info(f"{deleted} message(s) éphémère(s) supprimé(s) dans le canal {channel_id}")
+        return deleted
+    
+    def schedule_message(self, channel_id, message, time, author_id, author_name=None, recurrence=None,
+                         attachments=None, ttl=None):
         """
         Schedule a message to be sent at a specific time.
         
         Args:
             channel_id: The Discord channel ID to send the message to
             message: The message content
-            time: The datetime to send the message
+            time: The datetime to send the message (a naive datetime is in the channel's guild timezone)
             author_id: The Discord user ID of the person scheduling the message
             author_name: The Discord username of the person scheduling the message
+            recurrence: Optional RecurrenceRule; the job is re-queued at its next occurrence after each send
+            attachments: (digest, filename, size) triples returned by BlobStore.fetch; the job takes over
+                their references, which are released if it cannot be scheduled
+            ttl: Seconds after which the sent message deletes itself (None keeps it)
             
         Returns:
             str: The job ID
+            
+        Raises:
+            QuotaExceeded: If the author or the guild has reached a quota
         """
         # Generate a unique job ID
-        job_id = str(uuid.uuid4())[:8]
+        job_id = self._new_job_id()
         
         # Store job details with author name
-        self.jobs[job_id] = {
-            'channel_id': channel_id,
-            'message': message,
-            'time': time,
-            'author_id': author_id,
-            'author_name': author_name  # Stocker le nom d'utilisateur pour l'afficher plus tard
-        }
+        fire_at = self._deadline(time, self.timezone_for_channel(channel_id))
+        guild_id = self.guild_id_for_channel(channel_id)
+        self._check_new_job(author_id, guild_id, fire_at, message, attachments)
+        # Stocker le nom d'utilisateur pour l'afficher plus tard
+        self.jobs[job_id] = ScheduledJob(channel_id, author_id, author_name, message, fire_at, recurrence,
+                                         guild_id=guild_id, attachments=attachments, ttl=ttl)
+        self._index_add(job_id)
+        self.store.add_job(
+            job_id, channel_id, author_id, author_name, message, fire_at,
+            recurrence.spec if recurrence else None, timezone=recurrence.tz.name if recurrence else None,
+            guild_id=guild_id, attachments=attachments, ttl=ttl
+        )
+        self._push_due(job_id, fire_at)
         
         # Log des informations utilisateur
         if author_name:
@@ -83,80 +673,158 @@ class MessageScheduler:
         else:
             logger.info(f"Message programmé par auteur ID: {author_id} (nom non fourni)")
         
-        # Conversion en datetime naïf si nécessaire
-        # APScheduler avec timezone=TIMEZONE convertira automatiquement
-        # les datetimes naïfs vers le bon fuseau horaire
-        if time.tzinfo is not None:
-            # On garde la date/heure mais on supprime l'info de timezone
-            naive_time = time.replace(tzinfo=None)
-            logger.info(f"Convertir datetime avec timezone en datetime naïf pour scheduler: {time} -> {naive_time}")
-            run_date = naive_time
-        else:
-            run_date = time
-            
-        # Schedule the job
-        # Pour les fonctions asynchrones, nous devons utiliser un wrapper qui appellera la fonction async
-        # dans la boucle d'événements asyncio
-        import asyncio
-        from datetime import timedelta
-        
-        # Ajouter 10 secondes au temps d'exécution pour éviter les problèmes de timing précis
-        # APScheduler peut parfois manquer un job s'il tombe exactement à la seconde près
-        # Ce buffer garantit que le job sera exécuté même si le timing n'est pas exact
-        execution_time = run_date - timedelta(seconds=10)
-        logger.info(f"Ajustement du temps d'exécution avec buffer: {run_date} → {execution_time} (-10s)")
-        
-        # Créer une fonction de proxy qui appellera la fonction async et inclut une vérification de temps
-        def async_proxy(func, job_id, channel_id, message, author_id, target_time):
-            """Wrapper pour exécuter une fonction async depuis un contexte non-async avec vérification d'heure"""
-            logger.info(f"⏱️ EXÉCUTION DU PROXY ASYNCHRONE - Job ID: {job_id}")
-            logger.info(f"Heure actuelle: {datetime.now()} | Heure cible: {target_time}")
+        logger.info(f"Scheduled message with ID {job_id} for {time}")
+        return job_id
+    
+    def _new_job_id(self, taken=()):
+        """
+        Generate a short job ID that no pending job uses, here or in the shared store.
+        
+        Args:
+            taken: IDs already handed out for jobs not registered yet (same batch)
             
-            try:
-                # Obtenir la boucle d'événements actuelle ou créer une nouvelle boucle si aucune n'existe
-                try:
-                    loop = asyncio.get_event_loop()
-                except RuntimeError:
-                    # Si "There is no current event loop in thread", on en crée un nouveau
-                    logger.info("Aucune boucle d'événements trouvée, création d'une nouvelle boucle")
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                
-                # Une erreur peut se produire ici car l'exécuteur APScheduler utilise des threads
-                # où la boucle asyncio n'est pas configurée
-                logger.info(f"Boucle asyncio obtenue ou créée, exécution de la tâche pour job {job_id}")
-                
-                # Nous devons stopper l'exécution ici et déléguer à la boucle principale du bot
-                # Le vérificateur périodique dans check_pending_messages s'occupera d'exécuter le message
-                # C'est une solution plus sûre que d'essayer d'exécuter le message depuis un thread secondaire
-                logger.info(f"Job {job_id} sera exécuté par le vérificateur périodique")
-                return True
-                
-            except Exception as e:
-                logger.error(f"Erreur dans async_proxy pour job {job_id}: {e}")
-                import traceback
-                logger.error(f"Traceback: {traceback.format_exc()}")
-                return False
-        
-        # Schedule le job avec le proxy et le temps buffer
-        # Nous ne passons pas l'exécution directe au scheduler car
-        # cela pose problème avec la boucle d'événements asyncio
-        # Le vérificateur périodique s'en occupera
-        self.scheduler.add_job(
-            async_proxy,
-            DateTrigger(run_date=execution_time),
-            args=[self._send_scheduled_message, job_id, channel_id, message, author_id, run_date],
-            id=job_id,
-            misfire_grace_time=120  # Permettre jusqu'à 2 minutes de retard dans l'exécution
-        )
-        logger.info(f"Job {job_id} programmé avec proxy asynchrone pour {execution_time} (heure cible: {run_date})")
+        Returns:
+            str: The job ID (8 hex characters, short enough to type in !cancel)
+        """
+        while True:
+            # 32 bits: les collisions sont rares mais possibles à partir de quelques dizaines de milliers de jobs
+            job_id = uuid.uuid4().hex[:8]
+            if job_id not in self.jobs and job_id not in taken and not self.store.has_job(job_id):
+                return job_id
+    
+    def _check_new_job(self, author_id, guild_id, fire_at, message, attachments):
+        """
+        Check the quotas for a new job, releasing its attachments if it is refused.
         
-        logger.info(f"Scheduled message with ID {job_id} for {time}")
+        Args:
+            author_id: The Discord user ID of the author
+            guild_id: The guild the job counts for
+            fire_at: The POSIX timestamp at which the job is due
+            message: The message content
+            attachments: The (digest, filename, size) triples of the job, or None
+            
+        Raises:
+            QuotaExceeded: If the author or the guild has reached a quota
+        """
+        try:
+            guild_ids = (guild_id,) if guild_id is not None else ()
+            self.quotas.check([(author_id, guild_ids, fire_at, payload_size(message), attachments_size(attachments))])
+        except QuotaExceeded:
+            if attachments:
+                self.blobs.release(digest for digest, _, _ in attachments)
+            raise
+    
+    def schedule_messages(self, entries):
+        """
+        Schedule many one-shot messages at once, persisted in a single transaction.
+        
+        Args:
+            entries: Iterable of dicts with channel_id, message, time, author_id and author_name
+            
+        Returns:
+            list: The job IDs, in the same order as the entries
+            
+        Raises:
+            QuotaExceeded: If the messages together exceed a quota (none of them is scheduled)
+        """
+        job_ids = []
+        rows = []
+        taken = set()
+        for entry in entries:
+            fire_at = self._deadline(entry['time'], self.timezone_for_channel(entry['channel_id']))
+            job_id = self._new_job_id(taken)
+            taken.add(job_id)
+            rows.append((job_id, entry['channel_id'], entry['author_id'], entry.get('author_name'),
+                         entry['message'], fire_at, None, self.guild_id_for_channel(entry['channel_id'])))
+        self.quotas.check((row[2], (row[7],) if row[7] is not None else (), row[5], payload_size(row[4]), 0)
+                          for row in rows)
+        
+        for job_id, channel_id, author_id, author_name, message, fire_at, _, guild_id in rows:
+            self.jobs[job_id] = ScheduledJob(channel_id, author_id, author_name, message, fire_at, guild_id=guild_id)
+            self._index_add(job_id)
+            job_ids.append(job_id)
+        
+        self.store.add_jobs(rows)
+        for job_id, row in zip(job_ids, rows):
+            self._push_due(job_id, row[5])
+        logger.info(f"{len(job_ids)} messages programmés en une seule opération")
+        return job_ids
+    
+    def schedule_recurring(self, channel_id, message, spec, author_id, author_name=None):
+        """
+        Schedule a message that repeats according to a recurrence rule, evaluated
+        in the timezone of the channel's guild.
+        Only the next occurrence is queued; the following one is computed after each send.
+        
+        Args:
+            channel_id: The Discord channel ID to send the message to
+            message: The message content
+            spec: The recurrence rule ("daily HH:MM", "weekly <jour> HH:MM" or "cron ...")
+            author_id: The Discord user ID of the person scheduling the message
+            author_name: The Discord username of the person scheduling the message
+            
+        Returns:
+            tuple: (job_id, first datetime, naive in the rule's timezone)
+            
+        Raises:
+            ValueError: If the rule is invalid or never fires
+        """
+        zone = self.timezone_for_channel(channel_id)
+        rule = RecurrenceRule(spec, zone)
+        first = rule.next_after(self.clock())
+        if first is None:
+            raise ValueError(f"La règle '{spec}' ne se déclenche jamais")
+        first_time = zone.to_local(first)
+        job_id = self.schedule_message(channel_id, message, first_time, author_id, author_name, recurrence=rule)
+        return job_id, first_time
+    
+    def schedule_fanout(self, channel_ids, message, time, author_id, author_name=None):
+        """
+        Schedule one message to be sent to several channels at the same time.
+        The message is stored once, whatever the number of channels.
+        
+        Args:
+            channel_ids: The Discord channel IDs to send the message to
+            message: The message content
+            time: The datetime to send the message
+            author_id: The Discord user ID of the person scheduling the message
+            author_name: The Discord username of the person scheduling the message
+            
+        Returns:
+            str: The job ID
+            
+        Raises:
+            ValueError: If there are no channels or more than MAX_FANOUT_TARGETS
+            QuotaExceeded: If the author or the guild has reached a quota
+        """
+        targets = tuple(dict.fromkeys(channel_ids))
+        if not targets:
+            raise ValueError("Aucun canal cible")
+        if len(targets) > MAX_FANOUT_TARGETS:
+            raise ValueError(f"Trop de canaux cibles (maximum {MAX_FANOUT_TARGETS})")
+        
+        job_id = self._new_job_id()
+        fire_at = self._deadline(time, self.timezone_for_channel(targets[0]))
+        # Chaque serveur visé compte le message une fois dans ses quotas
+        guild_ids = tuple(dict.fromkeys(
+            guild_id for guild_id in map(self.guild_id_for_channel, targets) if guild_id is not None
+        ))
+        guild_id = self.guild_id_for_channel(targets[0])
+        self.quotas.check([(author_id, guild_ids, fire_at, payload_size(message), 0)])
+        target_guilds = guild_ids if len(guild_ids) > 1 else None
+        self.jobs[job_id] = ScheduledJob(targets[0], author_id, author_name, message, fire_at, targets=targets,
+                                         guild_id=guild_id, target_guilds=target_guilds)
+        self._index_add(job_id)
+        self.store.add_job(job_id, targets[0], author_id, author_name, message, fire_at, targets=targets,
+                           guild_id=guild_id, target_guilds=target_guilds)
+        self._push_due(job_id, fire_at)
+        logger.info(f"Scheduled message with ID {job_id} for {time} in {len(targets)} channels")
         return job_id
     
     async def _send_scheduled_message(self, job_id, channel_id, message, author_id):
         """
         Send a scheduled message and clean up the job.
+        A failed send puts the job back in the due-queue for another attempt.
         
         Args:
             job_id: The ID of the job
@@ -164,81 +832,808 @@ class MessageScheduler:
             message: The message content
             author_id: The Discord user ID of the person who scheduled the message
         """
-        logger.info(f"✅ EXÉCUTION DU MESSAGE PROGRAMMÉ - Début - Job ID: {job_id}")
+        logger.info(f"⚡ Envoi du message programmé {job_id}")
         try:
             # Get the channel
-            logger.info(f"Récupération du canal Discord {channel_id}")
-            channel = self.bot.get_channel(channel_id)
+            channel = await self.channels.resolve(channel_id)
             if not channel:
                 logger.error(f"❌ Canal {channel_id} introuvable pour job {job_id}")
+                self.metrics.increment('channel_missing')
+                self.retry_job(job_id, "Canal introuvable")
                 return
             
-            logger.info(f"Canal trouvé: {channel.name} (ID: {channel.id})")
-            
-            # Process the message to ensure proper handling of newlines
-            # Make sure all types of newlines are properly converted to Discord's format
-            # The \n in text strings from Discord should be sent as literal \n
-            if message:
-                processed_message = message.replace('\r\n', '\n').replace('\r', '\n')
-                logger.info(f"Message traité pour les sauts de ligne. Longueur: {len(processed_message)}")
-                # Compter les sauts de ligne en échappant correctement dans la f-string
-                newline_count = processed_message.count('\n')
-                logger.info(f"Message contient {newline_count} sauts de ligne")
-            else:
-                processed_message = ""
-                logger.info("Message vide reçu")
-            
-            # Send the message
-            logger.info(f"Envoi du message: {processed_message[:50]}...")
-            sent_message = await channel.send(processed_message)
-            logger.info(f"Message envoyé avec succès, ID: {sent_message.id}")
-            
-            # Add scheduled info as a reply
-            # Récupérer les informations de l'auteur à partir de la liste des jobs
-            job_info = self.jobs.get(job_id, {})
-            
-            # Récupération du nom d'utilisateur depuis les informations enregistrées
-            if 'author_name' in job_info and job_info['author_name']:
-                username = job_info['author_name']
-                logger.info(f"Nom d'auteur trouvé dans les informations de job: {username}")
-            else:
-                # Fallback: essayer de récupérer le nom directement via l'API Discord
-                user = self.bot.get_user(author_id)
-                username = user.name if user else "Utilisateur inconnu"
-                logger.info(f"Nom d'auteur récupéré via l'API Discord: {username}")
+            chunks = await self._prepare_content(job_id, channel, message)
+            await self._deliver(job_id, channel, chunks, author_id)
+        
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de l'envoi du message programmé pour job {job_id}: {e}")
+            import traceback
+            logger.error(f"Détails de l'erreur: {traceback.format_exc()}")
+            self.metrics.increment('send_errors')
+            self.retry_job(job_id, str(e), permanent=self._is_permanent_error(e))
+            return
+        
+        # Remove the job from our records (ou passer à l'occurrence suivante)
+        self._finish_job(job_id)
+        logger.info(f"✅ Message programmé envoyé avec succès pour job {job_id}")
+    
+    async def _send_fanout(self, job_id):
+        """
+        Send a fan-out job to all its channels concurrently and aggregate the results.
+        Channels that failed are kept on the job and retried together; the
+        others are not sent twice.
+        
+        Args:
+            job_id: The ID of the job
+            
+        Returns:
+            tuple: (number of channels delivered, number of channels that failed)
+        """
+        details = self.jobs.get(job_id)
+        if details is None:
+            # Annulé entre l'échéance et le début de l'envoi
+            return 0, 0
+        targets = details.targets
+        logger.info(f"⚡ Envoi du message programmé {job_id} vers {len(targets)} canaux")
+        if self._send_semaphore is None:
+            self._send_semaphore = asyncio.Semaphore(MAX_CONCURRENT_SENDS)
+        
+        async def deliver(channel_id):
+            channel = await self.channels.resolve(channel_id)
+            if not channel:
+                self.metrics.increment('channel_missing')
+                raise LookupError(f"Canal {channel_id} introuvable")
+            chunks = await self._prepare_content(job_id, channel, details.message)
+            # Le sémaphore global borne la concurrence, discord.py respecte les buckets de chaque canal
+            async with self._send_semaphore:
+                await self._deliver(job_id, channel, chunks, details.author_id)
+        
+        results = await asyncio.gather(*(deliver(channel_id) for channel_id in targets), return_exceptions=True)
+        failed = [(channel_id, result) for channel_id, result in zip(targets, results) if isinstance(result, Exception)]
+        delivered = len(targets) - len(failed)
+        self.metrics.increment('fanout_delivered', delivered)
+        logger.info(f"Job {job_id}: {delivered}/{len(targets)} canaux servis")
+        
+        if failed:
+            self.metrics.increment('fanout_failed', len(failed))
+            for channel_id, error in failed:
+                logger.error(f"❌ Échec de l'envoi du job {job_id} dans le canal {channel_id}: {error}")
+            self._narrow_targets(job_id, tuple(channel_id for channel_id, _ in failed))
+            errors = "; ".join(f"{channel_id}: {error}" for channel_id, error in failed)
+            self.retry_job(job_id, errors[:1000], permanent=all(self._is_permanent_error(error) for _, error in failed))
+        else:
+            self._finish_job(job_id)
+        return delivered, len(failed)
+    
+    async def _prepare_content(self, job_id, channel, message):
+        """
+        Build the text actually sent for a job in a channel.
+        
+        Args:
+            job_id: The ID of the job
+            channel: The target channel
+            message: The stored message content
             
-            logger.info(f"Ajout des informations de programmation (par {username})")
+        Returns:
+            list: The messages to send in order, with normalized newlines and rendered
+                placeholders (several when the message is longer than Discord allows)
+        """
+        job = self.jobs.get(job_id)
+        if job is not None and job.chunks is not None and message == job.message:
+            # Découpage calculé à la programmation
+            return list(job.chunks)
+        # Les champs dynamiques ({date}, {members}, ...) sont remplis au moment de l'envoi
+        if job is not None and job.template is not None:
+            message = await self.templates.render(job.template, channel)
+        
+        # Process the message to ensure proper handling of newlines
+        # Make sure all types of newlines are properly converted to Discord's format
+        # The \n in text strings from Discord should be sent as literal \n
+        if not message:
+            logger.info("Message vide reçu")
+            return [""]
+        return split_message(message)
+    
+    async def _deliver(self, job_id, channel, chunks, author_id):
+        """
+        Post a job's message in one channel, using the guild's delivery and attribution modes.
+        The chunks of a split message are sent back-to-back, in order; the
+        attribution goes with the last one. Through a webhook, the number of
+        chunks posted is saved as they go, so a retry does not post them again.
+        For a job with a TTL, every message sent is queued for deletion.
+        
+        Args:
+            job_id: The ID of the job
+            channel: The target channel
+            chunks: The processed message content, as returned by _prepare_content
+            author_id: The Discord user ID of the person who scheduled the message
+            
+        Returns:
+            discord.Message: The last message sent
             
+        Raises:
+            Exception: Any error raised by the send itself
+        """
+        guild = getattr(channel, 'guild', None)
+        guild_id = guild.id if guild else None
+        mode = self.get_guild_setting(guild_id, 'attribution', DEFAULT_ATTRIBUTION_MODE)
+        
+        job = self.jobs.get(job_id)
+        attachments = job.attachments if job is not None else None
+        last = len(chunks) - 1
+        
+        ttl = job.ttl if job is not None else None
+        
+        if self.get_guild_setting(guild_id, 'delivery', DEFAULT_DELIVERY_MODE) == 'webhook':
+            started = self.clock()
+            # Un webhook n'accepte pas de nonce: une nouvelle tentative reprend après les parties déjà
+            # publiées (un modèle est re-rendu à chaque tentative, ses parties peuvent légèrement changer)
+            first = min(self.store.get_sent_chunks(job_id, channel.id), last) if last else 0
+            for position in range(first, last + 1):
+                sent_message = await self._send_via_webhook(job_id, channel, chunks[position], author_id,
+                                                            attachments if position == last else None)
+                if sent_message is None:
+                    if position == 0:
+                        # Webhooks interdits dans ce canal: envoi classique ci-dessous
+                        break
+                    raise RuntimeError("Permission \"Gérer les webhooks\" retirée pendant l'envoi")
+                if ttl:
+                    # Partie par partie: une partie publiée avant un échec est supprimée elle aussi
+                    self.expire_messages(channel.id, [sent_message.id], ttl, webhook=True)
+                if position < last:
+                    self.store.save_sent_chunks(job_id, channel.id, position + 1)
+            else:
+                self._record_dispatch(job_id, started)
+                # Le nom de l'auteur est affiché par le webhook: pas d'embed d'attribution
+                logger.info(f"✅ Message programmé envoyé par webhook pour job {job_id}")
+                return sent_message
+        
+        attribution = self._attribution_embed(job_id, author_id)
+        started = self.clock()
+        for position, chunk in enumerate(chunks):
+            # Nonce imposé: si une tentative précédente a abouti sans que la réponse arrive, ou si
+            # deux instances envoient le même job, Discord renvoie le message existant au lieu d'un doublon
+            nonce = self._send_nonce(job_id, f"message:{channel.id}" + (f":{position}" if position else ""))
+            extra = {}
+            if position == last:
+                if mode == 'inline':
+                    # Message et attribution dans une seule requête
+                    extra['embed'] = attribution
+                if attachments:
+                    # Lues depuis le disque pendant l'envoi, jamais chargées entièrement en mémoire
+                    extra['files'] = self.blobs.files(attachments)
+            sent_message = await channel.send(chunk, nonce=nonce, **extra)
+            if ttl:
+                # Partie par partie: une partie publiée avant un échec est supprimée elle aussi
+                self.expire_messages(channel.id, [sent_message.id], ttl)
+        self._record_dispatch(job_id, started)
+        if last:
+            logger.info(f"📨 Message découpé en {last + 1} parties pour job {job_id}")
+        logger.info(f"📨 Message envoyé dans le canal {channel.name} ({channel.id}), ID: {sent_message.id}")
+        
+        if mode != 'inline':
             try:
-                # Créer un embed plus détaillé avec le nom de l'auteur
-                embed = await channel.send(
-                    embed=discord.Embed(
-                        description=f"📅 Ce message a été programmé par **{username}**",
-                        color=discord.Color.green()
-                    ),
-                    reference=sent_message
+                # Add scheduled info as a reply
+                reply = await channel.send(
+                    embed=attribution, reference=sent_message, nonce=self._send_nonce(job_id, f"attribution:{channel.id}")
                 )
-                logger.info("Informations de programmation ajoutées avec succès")
+                if ttl:
+                    self.expire_messages(channel.id, [reply.id], ttl)
             except Exception as embed_error:
                 logger.error(f"Erreur lors de l'ajout de l'embed: {embed_error}")
                 # Continuer même en cas d'erreur avec l'embed
+        return sent_message
+    
+    @staticmethod
+    def _is_permanent_error(error):
+        """Tell whether a send error cannot be fixed by retrying (4xx other than 429)."""
+        return isinstance(error, discord.HTTPException) and 400 <= error.status < 500 and error.status != 429
+    
+    def _send_nonce(self, job_id, part):
+        """
+        Build the idempotency nonce of one occurrence of a job.
+        It is the same for every attempt and every instance, so Discord
+        deduplicates a resend of an occurrence that was already delivered.
+        
+        Args:
+            job_id: The ID of the job
+            part: Which message of the occurrence is sent
             
-            logger.info(f"✅ Message programmé envoyé avec succès pour job {job_id}")
+        Returns:
+            str: The nonce (Discord accepts at most 25 characters)
+        """
+        job = self.jobs.get(job_id)
+        # Toujours un entier: "1800000060.0" et "1800000060" donneraient deux nonces différents
+        fire_at = int(job.fire_at) if job else None
+        return hashlib.sha256(f"{job_id}:{fire_at}:{part}".encode()).hexdigest()[:25]
+    
+    def _record_dispatch(self, job_id, started):
+        """
+        Record the lateness and duration of a completed send.
         
-        except Exception as e:
-            logger.error(f"❌ Erreur lors de l'envoi du message programmé pour job {job_id}: {e}")
-            import traceback
-            logger.error(f"Détails de l'erreur: {traceback.format_exc()}")
+        Args:
+            job_id: The ID of the job
+            started: Timestamp taken just before the send
+        """
+        finished = self.clock()
+        details = self.jobs.get(job_id)
+        if details is not None:
+            self.metrics.record_dispatch(finished - details.fire_at, finished - started)
+    
+    async def _send_via_webhook(self, job_id, channel, content, author_id, attachments=None):
+        """
+        Send a scheduled message through the channel's webhook under the author's name.
         
-        finally:
-            logger.info(f"Nettoyage du job {job_id}")
-            # Remove the job from our records
-            if job_id in self.jobs:
-                del self.jobs[job_id]
-                logger.info(f"Job {job_id} supprimé de nos enregistrements")
-            else:
-                logger.warning(f"Job {job_id} non trouvé dans nos enregistrements pour le nettoyage")
-            logger.info(f"✅ EXÉCUTION DU MESSAGE PROGRAMMÉ - Fin - Job ID: {job_id}")
+        Args:
+            job_id: The ID of the job
+            channel: The target channel
+            content: The processed message content
+            author_id: The Discord user ID of the person who scheduled the message
+            attachments: The (digest, filename, size) triples to attach, or None
+            
+        Returns:
+            discord.WebhookMessage: The sent message, or None if webhooks are not allowed in this channel
+        """
+        user = self.bot.get_user(author_id)
+        job = self.jobs.get(job_id)
+        username = (job.author_name if job else None) or (user.name if user else "Utilisateur inconnu")
+        avatar_url = user.display_avatar.url if user else None
+        try:
+            files = (lambda: self.blobs.files(attachments)) if attachments else None
+            return await self.webhooks.send(channel, content, username, avatar_url, files)
+        except discord.Forbidden:
+            # Permission "Gérer les webhooks" manquante: repli sur l'envoi classique
+            logger.warning(f"Webhook impossible dans le canal {channel.id}, envoi par le bot pour job {job_id}")
+            return None
+    
+    def _attribution_embed(self, job_id, author_id):
+        """
+        Build the "scheduled by" embed for a job.
+        
+        Args:
+            job_id: The ID of the job
+            author_id: The Discord user ID of the person who scheduled the message
+            
+        Returns:
+            discord.Embed: The attribution embed
+        """
+        # Récupérer les informations de l'auteur à partir de la liste des jobs
+        job_info = self.jobs.get(job_id)
+        
+        # Récupération du nom d'utilisateur depuis les informations enregistrées
+        if job_info is not None and job_info.author_name:
+            username = job_info.author_name
+        else:
+            # Fallback: essayer de récupérer le nom directement via l'API Discord
+            user = self.bot.get_user(author_id)
+            username = user.name if user else "Utilisateur inconnu"
+            logger.info(f"Nom d'auteur récupéré via l'API Discord: {username}")
+        
+        # Créer un embed plus détaillé avec le nom de l'auteur
+        return discord.Embed(
+            description=f"📅 Ce message a été programmé par **{username}**",
+            color=discord.Color.green()
+        )
+    
+    def get_guild_setting(self, guild_id, key, default=None):
+        """
+        Get a per-guild scheduler setting.
+        
+        Args:
+            guild_id: The Discord guild ID (None for DMs)
+            key: The setting name
+            default: Value returned when the guild has not set it
+            
+        Returns:
+            str: The setting value
+        """
+        return self.guild_settings.get(guild_id, {}).get(key, default)
+    
+    def set_guild_setting(self, guild_id, key, value):
+        """
+        Change and persist a per-guild scheduler setting.
+        
+        Args:
+            guild_id: The Discord guild ID
+            key: The setting name
+            value: The new value
+        """
+        self.guild_settings.setdefault(guild_id, {})[key] = value
+        self.store.set_guild_setting(guild_id, key, value)
+    
+    def timezone_for_guild(self, guild_id):
+        """
+        Get the timezone of a guild.
+        
+        Args:
+            guild_id: The Discord guild ID (None for DMs)
+            
+        Returns:
+            OffsetTable: The guild's timezone, Europe/Paris by default
+        """
+        return offset_table(self.get_guild_setting(guild_id, 'timezone', DEFAULT_TIMEZONE))
+    
+    def guild_id_for_channel(self, channel_id):
+        """
+        Get the ID of the guild a channel belongs to.
+        
+        Args:
+            channel_id: The Discord channel ID
+            
+        Returns:
+            int: The guild ID, or None for DMs and unknown channels
+        """
+        guild = getattr(self.channels.get(channel_id), 'guild', None)
+        return guild.id if guild else None
+    
+    def timezone_for_channel(self, channel_id):
+        """
+        Get the timezone of the guild a channel belongs to.
+        
+        Args:
+            channel_id: The Discord channel ID
+            
+        Returns:
+            OffsetTable: The guild's timezone (the default one if the channel is unknown)
+        """
+        return self.timezone_for_guild(self.guild_id_for_channel(channel_id))
+    
+    def local_time(self, details):
+        """
+        Get the fire time of a job in its guild's timezone.
+        
+        Args:
+            details: The ScheduledJob record
+            
+        Returns:
+            datetime: The naive local fire time
+        """
+        return self.timezone_for_channel(details.channel_id).to_local(details.fire_at)
+    
+    def deadline_for_guild(self, time, guild_id):
+        """
+        Convert a datetime given in a command to a POSIX timestamp.
+        
+        Args:
+            time: The datetime (a naive one is read in the guild's timezone)
+            guild_id: The Discord guild ID (None for DMs)
+            
+        Returns:
+            int: The timestamp, in whole seconds
+        """
+        return self._deadline(time, self.timezone_for_guild(guild_id))
+    
+    @staticmethod
+    def _deadline(time, zone=None):
+        """
+        Convert a scheduled datetime to a POSIX timestamp.
+        
+        Args:
+            time: The datetime to convert
+            zone: The OffsetTable in which a naive datetime is read (default timezone if None)
+            
+        Returns:
+            int: The timestamp, in whole seconds
+        """
+        if time.tzinfo is None:
+            return (zone or offset_table(DEFAULT_TIMEZONE)).to_timestamp(time)
+        return int(time.timestamp())
+    
+    def _push_due(self, job_id, deadline):
+        """
+        Add a job to the due-queue and wake the dispatcher if it is now the earliest.
+        
+        Args:
+            job_id: The job ID
+            deadline: The timestamp at which the job is due
+        """
+        sequence = next(self._sequence)
+        heapq.heappush(self._due_queue, (deadline, sequence, job_id))
+        self.jobs[job_id].queued = sequence
+        if self._wakeup is not None and self._due_queue[0][2] == job_id:
+            self._wakeup.set()
+    
+    def _is_live(self, entry):
+        """Tell whether a due-queue entry is the current one of a pending job or message deletion."""
+        if isinstance(entry[2], tuple):
+            return self._expirations.get(entry[2]) == entry[1]
+        job = self.jobs.get(entry[2])
+        return job is not None and job.queued == entry[1]
+    
+    def _discard_due(self, job_id, head_changed=None):
+        """
+        Mark a job's due-queue entry as stale after it left self.jobs or was superseded.
+        
+        Args:
+            job_id: The job ID
+            head_changed: Whether the stale entry was the head of the queue (checked if None)
+        """
+        self._stale_entries += 1
+        if head_changed is None:
+            head_changed = bool(self._due_queue) and self._due_queue[0][2] == job_id
+        if head_changed:
+            # La tête du tas a changé: réveiller le dispatcher pour recalculer son délai
+            if self._wakeup is not None:
+                self._wakeup.set()
+        elif self._stale_entries > len(self._due_queue) // 2:
+            # Compacter le tas lorsque la moitié des entrées sont périmées
+            self._due_queue = [entry for entry in self._due_queue if self._is_live(entry)]
+            heapq.heapify(self._due_queue)
+            self._stale_entries = 0
+    
+    def _requeue(self, job_id, deadline):
+        """
+        Move a job that is waiting in the due-queue to a new deadline, in O(log n):
+        a new entry is pushed and the old one becomes stale, to be dropped when
+        it reaches the top (lazy decrease/increase-key).
+        
+        Args:
+            job_id: The job ID
+            deadline: The new timestamp at which the job is due
+        """
+        was_head = bool(self._due_queue) and self._due_queue[0][1] == self.jobs[job_id].queued
+        self._push_due(job_id, deadline)
+        self._discard_due(job_id, head_changed=was_head)
+    
+    def _pop_stale_head(self):
+        """Drop cancelled or superseded entries from the top of the due-queue."""
+        while self._due_queue and not self._is_live(self._due_queue[0]):
+            heapq.heappop(self._due_queue)
+            self._stale_entries = max(0, self._stale_entries - 1)
+    
+    def _push_expiry(self, key, deadline, webhook=False):
+        """
+        Add a message deletion to the due-queue, superseding any earlier one for the same message.
+        
+        Args:
+            key: The (channel_id, message_id) of the message
+            deadline: The timestamp at which the message is deleted
+            webhook: Whether the message was posted through the channel's webhook
+        """
+        if key in self._expirations:
+            self._stale_entries += 1
+        if webhook:
+            self._webhook_messages.add(key[1])
+        sequence = next(self._sequence)
+        heapq.heappush(self._due_queue, (deadline, sequence, key))
+        self._expirations[key] = sequence
+        if self._wakeup is not None and self._due_queue[0][1] == sequence:
+            self._wakeup.set()
+    
+    def expire_messages(self, channel_id, message_ids, ttl, webhook=False):
+        """
+        Delete sent messages of a channel after a delay. The deletions are kept
+        in the store and in the due-queue, so they survive a restart, and the
+        due deletions of a channel are grouped into bulk deletes.
+        
+        Args:
+            channel_id: The Discord channel ID (a DM channel works too)
+            message_ids: The IDs of the messages to delete
+            ttl: Seconds before the deletion
+            webhook: Whether the messages were posted through the channel's webhook
+        """
+        delete_at = int(self.clock() + ttl)
+        rows = [(channel_id, message_id, delete_at, webhook) for message_id in message_ids]
+        self.store.add_expirations(rows)
+        for _, message_id, _, _ in rows:
+            self._push_expiry((channel_id, message_id), delete_at, webhook)
+    
+    def next_deadline(self):
+        """
+        Get the timestamp of the earliest pending job.
+        
+        Returns:
+            float: The timestamp, or None if no job is pending
+        """
+        self._pop_stale_head()
+        return self._due_queue[0][0] if self._due_queue else None
+    
+    def pop_due_jobs(self, now=None):
+        """
+        Remove and return every job whose deadline has passed.
+        
+        Args:
+            now: The current timestamp (defaults to the current time)
+            
+        Returns:
+            list: (job_id, details) tuples in deadline order (due message deletions are
+                collected apart, for _start_deletions)
+        """
+        if now is None:
+            now = self.clock()
+        due = []
+        while True:
+            self._pop_stale_head()
+            if not self._due_queue or self._due_queue[0][0] > now:
+                break
+            _, _, job_id = heapq.heappop(self._due_queue)
+            if isinstance(job_id, tuple):
+                # Message éphémère: supprimé par le dispatcher, avec les autres suppressions échues de son canal
+                del self._expirations[job_id]
+                self._due_deletions.append(job_id)
+                continue
+            details = self.jobs[job_id]
+            # En cours d'envoi: plus dans la file jusqu'à sa prochaine échéance ou nouvelle tentative
+            details.queued = None
+            due.append((job_id, details))
+        return due
+    
+    async def wait_for_due_jobs(self, timeout=None):
+        """
+        Sleep until the earliest job is due, waking early when the queue head changes.
+        
+        Args:
+            timeout: Maximum number of seconds to wait (None waits for a due job)
+        
+        Returns:
+            list: (job_id, details) tuples that are due now (empty if the timeout expired)
+        """
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        give_up = self.clock() + timeout if timeout is not None else None
+        while True:
+            self._wakeup.clear()
+            deadline = self.next_deadline()
+            if give_up is not None:
+                deadline = give_up if deadline is None else min(deadline, give_up)
+            if deadline is None:
+                await self._wakeup.wait()
+                continue
+            delay = deadline - self.clock()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    # Réveillé par un ajout ou une annulation: recalculer l'échéance
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+            due = self.pop_due_jobs()
+            if due or self._due_deletions or (give_up is not None and self.clock() >= give_up):
+                return due
+    
+    def complete_job(self, job_id):
+        """
+        Forget a job that has been dispatched.
+        
+        Args:
+            job_id: The job ID
+        """
+        if job_id in self.jobs:
+            self._index_remove(job_id)
+            del self.jobs[job_id]
+        self.blobs.discard(self.store.remove_job(job_id))
+    
+    def _finish_job(self, job_id):
+        """
+        Complete a dispatched job, or queue the next occurrence of a recurring one.
+        
+        Args:
+            job_id: The job ID
+        """
+        details = self.jobs.get(job_id)
+        if details is None or details.recurrence is None:
+            self.complete_job(job_id)
+            return
+        
+        # Toujours repartir de maintenant pour ne pas rejouer les occurrences manquées
+        next_fire = details.recurrence.next_after(max(self.clock(), details.fire_at))
+        if next_fire is None:
+            logger.info(f"Règle de récurrence épuisée pour job {job_id}")
+            self.complete_job(job_id)
+            return
+        details.attempts = 0
+        self._move_job(job_id, next_fire)
+        self.store.update_fire_at(job_id, next_fire)
+        logger.info(f"Job récurrent {job_id} reprogrammé pour {self.local_time(details)}")
+    
+    def _move_job(self, job_id, fire_at):
+        """
+        Change the fire time of a job that is not currently in the due-queue.
+        
+        Args:
+            job_id: The job ID
+            fire_at: The new POSIX timestamp
+        """
+        details = self.jobs[job_id]
+        self._index_remove(job_id)
+        details.fire_at = fire_at
+        self._index_add(job_id)
+        self._push_due(job_id, fire_at)
+    
+    @staticmethod
+    def _index_insert(index, key, entry):
+        """Insert a (fire_at, job_id) entry into a sorted secondary index."""
+        bisect.insort(index.setdefault(key, []), entry)
+    
+    @staticmethod
+    def _index_delete(index, key, entry):
+        """Remove a (fire_at, job_id) entry from a sorted secondary index."""
+        entries = index.get(key)
+        if not entries:
+            return
+        position = bisect.bisect_left(entries, entry)
+        if position < len(entries) and entries[position] == entry:
+            del entries[position]
+        if not entries:
+            del index[key]
+    
+    def _index_add(self, job_id):
+        """
+        Register a job in the author and channel indexes and in the quota counters.
+        
+        Args:
+            job_id: The job ID (must already be in self.jobs)
+        """
+        details = self.jobs[job_id]
+        self.quotas.add(details)
+        entry = (details.fire_at, job_id)
+        self._index_insert(self._jobs_by_author, details.author_id, entry)
+        for channel_id in details.channel_ids:
+            self._index_insert(self._jobs_by_channel, channel_id, entry)
+    
+    def _index_remove(self, job_id):
+        """
+        Remove a job from the author and channel indexes and from the quota counters.
+        
+        Args:
+            job_id: The job ID (must still be in self.jobs)
+        """
+        details = self.jobs[job_id]
+        self.quotas.remove(details)
+        entry = (details.fire_at, job_id)
+        self._index_delete(self._jobs_by_author, details.author_id, entry)
+        for channel_id in details.channel_ids:
+            self._index_delete(self._jobs_by_channel, channel_id, entry)
+    
+    def restore_jobs(self):
+        """
+        Load pending jobs from the persistent store into memory. One-shot jobs
+        that became overdue while the bot was offline are kept aside for the
+        catch-up pass, which runs once the bot is connected.
+        
+        Returns:
+            int: Number of restored jobs
+        """
+        started = time_module.perf_counter()
+        now = self.clock()
+        for job_id, *columns in self.store.iter_overdue(now):
+            self.jobs[job_id] = self._restored_details(*columns)
+            self._index_add(job_id)
+            self._catchup_backlog.append(job_id)
+        if self._catchup_backlog:
+            logger.warning(f"{len(self._catchup_backlog)} messages programmés sont arrivés à échéance pendant l'arrêt du bot")
+        
+        for job_id, *columns in self.store.iter_pending(now):
+            job = self.jobs[job_id] = self._restored_details(*columns)
+            # Les lignes arrivent triées par fire_at: le tas reste valide par simple ajout
+            job.queued = next(self._sequence)
+            self._due_queue.append((job.fire_at, job.queued, job_id))
+            self.quotas.add(job)
+            entry = (job.fire_at, job_id)
+            self._jobs_by_author.setdefault(job.author_id, []).append(entry)
+            for channel_id in job.channel_ids:
+                self._jobs_by_channel.setdefault(channel_id, []).append(entry)
+        
+        # Départager les jobs de même seconde par job_id comme le fait bisect (tri quasi linéaire)
+        for index in (self._jobs_by_author, self._jobs_by_channel):
+            for entries in index.values():
+                entries.sort()
+        
+        # Les jobs récurrents manqués pendant l'arrêt reprennent à leur prochaine occurrence
+        for job_id, *columns in list(self.store.iter_overdue_recurring(now)):
+            self.jobs[job_id] = self._restored_details(*columns)
+            self._index_add(job_id)
+            self._finish_job(job_id)
+        
+        for channel_id, message_id, delete_at, webhook in self.store.iter_expirations():
+            self._push_expiry((channel_id, message_id), int(delete_at), bool(webhook))
+        
+        elapsed = time_module.perf_counter() - started
+        logger.info(f"{len(self.jobs)} messages programmés restaurés depuis {self.store.path} en {elapsed:.3f}s")
+        return len(self.jobs)
+    
+    @staticmethod
+    def _restored_details(channel_id, author_id, author_name, message, fire_at, recurrence, targets, tz_name,
+                          guild_id, attachments, ttl, target_guilds):
+        """Build the in-memory job record for a row loaded from the store."""
+        return ScheduledJob(
+            channel_id, author_id, author_name, message, fire_at,
+            RecurrenceRule(recurrence, offset_table(tz_name or DEFAULT_TIMEZONE)) if recurrence else None,
+            JobStore.decode_targets(targets), guild_id, JobStore.decode_attachments(attachments), ttl,
+            JobStore.decode_targets(target_guilds)
+        )
+    
+    def retry_job(self, job_id, error, permanent=False):
+        """
+        Put a dispatched job back in the due-queue after a failed send, with
+        jittered exponential backoff. After MAX_SEND_ATTEMPTS failures (or a
+        permanent error) the job is moved to the dead-letter store.
+        
+        Args:
+            job_id: The job ID
+            error: Description of the failure
+            permanent: Whether retrying cannot succeed
+        """
+        details = self.jobs.get(job_id)
+        if details is None:
+            return
+        
+        details.attempts += 1
+        if permanent or details.attempts >= MAX_SEND_ATTEMPTS:
+            self._dead_letter(job_id, error)
+            return
+        
+        delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (details.attempts - 1))
+        # Jitter "equal": entre la moitié et la totalité du délai, pour étaler les reprises
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        self.metrics.increment('retries')
+        logger.warning(f"Nouvelle tentative {details.attempts + 1}/{MAX_SEND_ATTEMPTS} pour job {job_id} dans {delay:.0f}s")
+        retry_at = int(self.clock() + delay)
+        # Rendre le bail: la nouvelle tentative peut être faite par n'importe quelle instance
+        self.store.release_job(job_id, retry_at)
+        self._push_due(job_id, retry_at)
+    
+    def _dead_letter(self, job_id, error):
+        """
+        Move a job that cannot be delivered to the dead-letter store.
+        A recurring job keeps running: only the failed occurrence is recorded.
+        
+        Args:
+            job_id: The job ID
+            error: Description of the last failure
+        """
+        details = self.jobs[job_id]
+        # Un job multi-canaux laisse un message en échec par canal non servi, rejouable séparément
+        for channel_id in details.channel_ids:
+            letter_id = str(uuid.uuid4())[:8]
+            self.store.add_dead_letter(
+                letter_id, job_id, channel_id, details.author_id, details.author_name,
+                details.message, details.fire_at, error, details.attempts, self.clock(),
+                attachments=details.attachments
+            )
+            self.metrics.increment('dead_lettered')
+            logger.error(f"Job {job_id} abandonné après {details.attempts} tentative(s), enregistré comme {letter_id}: {error}")
+        self._finish_job(job_id)
+    
+    def get_dead_letters(self, author_id):
+        """
+        Get the messages of a user that could not be delivered.
+        
+        Args:
+            author_id: The Discord user ID
+            
+        Returns:
+            list: Dicts with letter_id, channel_id, message, fire_at, error, attempts and attachments
+        """
+        return self.store.get_dead_letters(author_id)
+    
+    def replay_dead_letter(self, letter_id, author_id):
+        """
+        Schedule a failed message again for immediate delivery.
+        
+        Args:
+            letter_id: The dead-letter ID
+            author_id: The Discord user ID requesting the replay (must be the author)
+            
+        Returns:
+            str: The new job ID, or None if the dead letter was not found
+        """
+        letter = self.store.get_dead_letter(letter_id)
+        if letter is None or letter['author_id'] != author_id:
+            return None
+        # Le nouveau job prend ses propres références: celles de la lettre sont rendues après coup
+        if letter['attachments']:
+            self.blobs.retain(letter['attachments'])
+        job_id = self.schedule_message(
+            channel_id=letter['channel_id'],
+            message=letter['message'],
+            time=datetime.fromtimestamp(self.clock(), timezone.utc),
+            author_id=author_id,
+            author_name=letter['author_name'],
+            attachments=letter['attachments']
+        )
+        self.blobs.discard(self.store.remove_dead_letter(letter_id))
+        return job_id
     
     def get_jobs_for_user(self, author_id):
         """
@@ -248,10 +1643,118 @@ class MessageScheduler:
             author_id: The Discord user ID
             
         Returns:
-            dict: A dictionary of job IDs and details belonging to the user
+            dict: A dictionary of job IDs and ScheduledJob records belonging to the user, ordered by fire time
+        """
+        return {job_id: self.jobs[job_id] for _, job_id in self._jobs_by_author.get(author_id, [])}
+    
+    def get_jobs_for_channel(self, channel_id):
+        """
+        Get all scheduled jobs targeting a specific channel.
+        
+        Args:
+            channel_id: The Discord channel ID
+            
+        Returns:
+            dict: A dictionary of job IDs and ScheduledJob records, ordered by fire time
         """
-        return {job_id: details for job_id, details in self.jobs.items() 
-                if details['author_id'] == author_id}
+        return {job_id: self.jobs[job_id] for _, job_id in self._jobs_by_channel.get(channel_id, [])}
+    
+    def _editable_job(self, job_id, author_id):
+        """
+        Get a pending job of an author that can still be changed.
+        
+        Args:
+            job_id: The job ID
+            author_id: The Discord user ID requesting the change (must be the author)
+            
+        Returns:
+            ScheduledJob: The job, or None if it does not exist or belongs to someone else
+            
+        Raises:
+            ValueError: If the job is being sent right now
+        """
+        details = self.jobs.get(job_id)
+        if details is None or details.author_id != author_id:
+            return None
+        if details.queued is None:
+            raise ValueError("Ce message est en cours d'envoi et ne peut plus être modifié.")
+        return details
+    
+    def _check_quotas_without(self, details, fire_at, message):
+        """
+        Check the quotas for a change to a pending job, not counting the job's current state.
+        
+        Args:
+            details: The ScheduledJob about to change
+            fire_at: Its new fire time
+            message: Its new message content
+            
+        Raises:
+            QuotaExceeded: If the changed job would exceed a quota
+        """
+        self.quotas.remove(details)
+        try:
+            self.quotas.check([(details.author_id, details.guild_ids, fire_at, payload_size(message),
+                                attachments_size(details.attachments))])
+        finally:
+            self.quotas.add(details)
+    
+    def reschedule_job(self, job_id, author_id, time):
+        """
+        Move a pending job to a new time, keeping its ID.
+        
+        Args:
+            job_id: The job ID
+            author_id: The Discord user ID requesting the change (must be the author)
+            time: The new datetime (a naive datetime is in the channel's guild timezone)
+            
+        Returns:
+            bool: Whether the job was found and moved
+            
+        Raises:
+            ValueError: If the job is being sent right now
+            QuotaExceeded: If the change would exceed a quota
+        """
+        details = self._editable_job(job_id, author_id)
+        if details is None:
+            return False
+        fire_at = self._deadline(time, self.timezone_for_channel(details.channel_id))
+        self._check_quotas_without(details, fire_at, details.message)
+        self._index_remove(job_id)
+        details.fire_at = fire_at
+        details.attempts = 0
+        self._index_add(job_id)
+        self._requeue(job_id, fire_at)
+        self.store.update_fire_at(job_id, fire_at)
+        logger.info(f"Job {job_id} reprogrammé pour {time}")
+        return True
+    
+    def edit_job(self, job_id, author_id, message):
+        """
+        Replace the text of a pending job, keeping its ID and time.
+        
+        Args:
+            job_id: The job ID
+            author_id: The Discord user ID requesting the change (must be the author)
+            message: The new message content
+            
+        Returns:
+            bool: Whether the job was found and edited
+            
+        Raises:
+            ValueError: If the job is being sent right now
+            QuotaExceeded: If the change would exceed a quota
+        """
+        details = self._editable_job(job_id, author_id)
+        if details is None:
+            return False
+        self._check_quotas_without(details, details.fire_at, message)
+        self.quotas.remove(details)
+        details.set_message(message)
+        self.quotas.add(details)
+        self.store.update_message(job_id, message)
+        logger.info(f"Texte du job {job_id} modifié")
+        return True
     
     def cancel_job(self, job_id, author_id):
         """
@@ -265,11 +1768,14 @@ class MessageScheduler:
             bool: Whether the job was successfully cancelled
         """
         # Check if job exists and belongs to the user
-        if job_id in self.jobs and self.jobs[job_id]['author_id'] == author_id:
-            # Remove from scheduler
-            self.scheduler.remove_job(job_id)
+        if job_id in self.jobs and self.jobs[job_id].author_id == author_id:
             # Remove from our records
-            del self.jobs[job_id]
+            self._index_remove(job_id)
+            details = self.jobs.pop(job_id)
+            self.blobs.discard(self.store.remove_job(job_id))
+            # Un job en cours d'envoi a déjà quitté la file: pas d'entrée périmée à compter
+            if details.queued is not None:
+                self._discard_due(job_id)
             logger.info(f"Cancelled job {job_id}")
             return True
         
@@ -292,19 +1798,68 @@ class MessageScheduler:
             logger.info(f"No jobs found to cancel for user {author_id}")
             return 0, []
         
-        cancelled_ids = []
+        cancelled_ids = self._drop_jobs(user_jobs)
+        logger.info(f"Cancelled {len(cancelled_ids)} jobs for user {author_id}")
+        return len(cancelled_ids), cancelled_ids
+    
+    def cancel_channel_jobs(self, channel_id):
+        """
+        Cancel all scheduled jobs targeting a channel (e.g. after it was deleted).
         
-        # Cancel each job
-        for job_id in user_jobs.keys():
-            # Remove from scheduler
-            try:
-                self.scheduler.remove_job(job_id)
-                # Remove from our records
-                del self.jobs[job_id]
-                cancelled_ids.append(job_id)
-                logger.info(f"Cancelled job {job_id} during cancel_all operation")
-            except Exception as e:
-                logger.error(f"Error cancelling job {job_id}: {e}")
+        Args:
+            channel_id: The Discord channel ID
+            
+        Returns:
+            tuple: (count, job_ids) - Number of jobs cancelled and list of their IDs
+        """
+        channel_jobs = self.get_jobs_for_channel(channel_id)
+        if not channel_jobs:
+            return 0, []
         
-        logger.info(f"Cancelled {len(cancelled_ids)} jobs for user {author_id}")
+        # Une annonce multi-canaux perd seulement ce canal, tant qu'il lui en reste d'autres
+        for job_id, details in list(channel_jobs.items()):
+            if details.targets and len(details.targets) > 1:
+                self._narrow_targets(job_id, tuple(target for target in details.targets if target != channel_id))
+                del channel_jobs[job_id]
+        
+        cancelled_ids = self._drop_jobs(channel_jobs)
+        logger.info(f"Cancelled {len(cancelled_ids)} jobs for channel {channel_id}")
         return len(cancelled_ids), cancelled_ids
+    
+    def _narrow_targets(self, job_id, targets):
+        """
+        Change the channels of a fan-out job, keeping the channel index in step.
+        
+        Args:
+            job_id: The job ID
+            targets: The channel IDs the job is still sent to (at least one)
+        """
+        details = self.jobs[job_id]
+        self._index_remove(job_id)
+        details.targets = targets
+        details.channel_id = targets[0]
+        self._index_add(job_id)
+        self.store.update_targets(job_id, targets)
+    
+    def _drop_jobs(self, jobs):
+        """
+        Remove several jobs from memory, indexes, due-queue and store.
+        
+        Args:
+            jobs: Iterable of job IDs
+            
+        Returns:
+            list: The removed job IDs
+        """
+        cancelled_ids = []
+        for job_id in jobs:
+            if job_id not in self.jobs:
+                continue
+            self._index_remove(job_id)
+            if self.jobs.pop(job_id).queued is not None:
+                self._discard_due(job_id)
+            cancelled_ids.append(job_id)
+        
+        # Une seule transaction pour toute la série
+        self.blobs.discard(self.store.remove_jobs(cancelled_ids))
+        return cancelled_ids
@@ -0,0 +1,246 @@
+"""
+Message templates: placeholders in scheduled messages, rendered at send time.
+"""
+import asyncio
+import logging
+import os
+import re
+import time
+from datetime import datetime
+
+import aiohttp  # installé avec discord.py
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Jours de la semaine affichés par {weekday} (datetime.weekday(): 0 = lundi)
+WEEKDAY_NAMES = ('lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi', 'dimanche')
+
+# Durée de validité des valeurs coûteuses (nombre de membres, statut du serveur de jeu)
+CONTEXT_TTL = 60  # secondes
+
+# Serveur de jeu interrogé par {server_status}, {server_name} et {players}
+BATTLEMETRICS_SERVER_ID = os.environ.get("BATTLEMETRICS_SERVER_ID", "32646652")
+BATTLEMETRICS_URL = "https://api.battlemetrics.com/servers/{server_id}"
+
+# Valeur affichée lorsqu'une donnée ne peut pas être obtenue
+UNAVAILABLE = "indisponible"
+
+# Champs reconnus dans les messages
+PLACEHOLDER_NAMES = frozenset({
+    'date', 'time', 'weekday', 'guild', 'members', 'countdown', 'server_status', 'server_name', 'players',
+})
+
+# {nom} ou {nom:argument}; les accolades qui ne correspondent à aucun champ connu restent du texte
+PLACEHOLDER_PATTERN = re.compile(r"\{(\w+)(?::([^{}]*))?\}")
+
+
+class Placeholder:
+    """A placeholder of a compiled template."""
+
+    __slots__ = ('name', 'arg')
+
+    def __init__(self, name, arg=None):
+        self.name = name
+        self.arg = arg
+
+
+class MessageTemplate:
+    """
+    A message split once into literal text and placeholders, so rendering
+    is a simple concatenation.
+    """
+
+    def __init__(self, parts):
+        """
+        Initialize a compiled template.
+
+        Args:
+            parts: Literal strings and Placeholder objects, in order
+        """
+        self.parts = parts
+        self.names = {part.name for part in parts if isinstance(part, Placeholder)}
+
+
+def _parse_countdown_target(arg):
+    """Parse the "YYYY-MM-DD HH:MM" (or "YYYY-MM-DD") argument of {countdown} as a local wall-clock time."""
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(arg.strip(), fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def compile_template(text):
+    """
+    Compile the placeholders of a message.
+
+    Supported placeholders: {date}, {time}, {weekday}, {guild}, {members},
+    {countdown:YYYY-MM-DD HH:MM}, {server_status}, {server_name} and {players}.
+
+    Args:
+        text: The message content
+
+    Returns:
+        MessageTemplate: The compiled template, or None if the message has no placeholder
+    """
+    if not text or '{' not in text:
+        return None
+    parts = []
+    position = 0
+    for match in PLACEHOLDER_PATTERN.finditer(text):
+        name, arg = match.group(1).lower(), match.group(2)
+        if name not in PLACEHOLDER_NAMES:
+            continue
+        if name == 'countdown':
+            # La date cible est analysée une seule fois, à la programmation; elle est lue
+            # dans le fuseau horaire du serveur au moment de l'envoi
+            arg = _parse_countdown_target(arg or "")
+            if arg is None:
+                continue
+        if match.start() > position:
+            parts.append(text[position:match.start()])
+        parts.append(Placeholder(name, arg))
+        position = match.end()
+    if not parts:
+        return None
+    if position < len(text):
+        parts.append(text[position:])
+    return MessageTemplate(parts)
+
+
+def _format_countdown(target, now):
+    """Format the time left until a timestamp ("3 j 4 h 12 min")."""
+    remaining = int(target - now)
+    if remaining <= 0:
+        return "maintenant"
+    days, remaining = divmod(remaining, 86400)
+    hours, remaining = divmod(remaining, 3600)
+    minutes = remaining // 60
+    pieces = []
+    if days:
+        pieces.append(f"{days} j")
+    if hours:
+        pieces.append(f"{hours} h")
+    if minutes or not pieces:
+        pieces.append(f"{minutes} min")
+    return " ".join(pieces)
+
+
+class TemplateContext:
+    """
+    Renders compiled templates. Values that need a lookup (member count,
+    game server status) are cached for CONTEXT_TTL seconds and fetched only
+    once when many templated messages are sent together.
+    """
+
+    def __init__(self, bot, timezone_for_guild, ttl=CONTEXT_TTL, clock=time.time):
+        """
+        Initialize an empty context cache.
+
+        Args:
+            bot: The Discord bot instance
+            timezone_for_guild: Function returning the OffsetTable of a guild ID (None for DMs)
+            ttl: Seconds during which a cached value is reused
+            clock: Function returning the current POSIX timestamp ({date}, {time}, {countdown}...)
+        """
+        self.bot = bot
+        self.timezone_for_guild = timezone_for_guild
+        self.ttl = ttl
+        self.clock = clock
+        self._cache = {}  # {clé: (expiration, valeur)}
+        self._pending = {}  # {clé: asyncio.Task} pour les recherches en cours
+
+    async def _cached(self, key, fetch):
+        """
+        Get a value from the cache, fetching it at most once at a time.
+
+        Args:
+            key: The cache key
+            fetch: Coroutine function computing the value
+
+        Returns:
+            The cached or freshly fetched value
+        """
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        task = self._pending.get(key)
+        if task is None:
+            # Les rendus simultanés attendent la même recherche au lieu d'en lancer une chacun
+            task = asyncio.ensure_future(fetch())
+            self._pending[key] = task
+            try:
+                value = await task
+            except Exception as e:
+                logger.warning(f"Valeur de modèle '{key[0]}' indisponible: {e}")
+                value = None
+            finally:
+                self._pending.pop(key, None)
+            self._cache[key] = (time.monotonic() + self.ttl, value)
+            return value
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            return None
+
+    async def _member_count(self, guild):
+        """Get a guild's member count, from the gateway cache when possible."""
+        if guild.member_count is not None:
+            return guild.member_count
+        fetched = await self.bot.fetch_guild(guild.id, with_counts=True)
+        return fetched.approximate_member_count
+
+    async def _server_status(self):
+        """Fetch the game server status from BattleMetrics."""
+        url = BATTLEMETRICS_URL.format(server_id=BATTLEMETRICS_SERVER_ID)
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
+            async with session.get(url) as response:
+                response.raise_for_status()
+                attributes = (await response.json())["data"]["attributes"]
+        return {
+            'server_status': "🟢 En ligne" if attributes["status"] == "online" else "🔴 Hors ligne",
+            'server_name': attributes["name"],
+            'players': f"{attributes['players']}/{attributes['maxPlayers']}",
+        }
+
+    async def render(self, template, channel):
+        """
+        Render a compiled template for a channel.
+
+        Args:
+            template: The MessageTemplate
+            channel: The channel the message is sent to
+
+        Returns:
+            str: The rendered message
+        """
+        now = self.clock()
+        guild = getattr(channel, 'guild', None)
+        zone = self.timezone_for_guild(guild.id if guild else None)
+        local_now = zone.to_local(now)
+        values = {
+            'date': local_now.strftime("%d/%m/%Y"),
+            'time': local_now.strftime("%H:%M"),
+            'weekday': WEEKDAY_NAMES[local_now.weekday()],
+            'guild': guild.name if guild else UNAVAILABLE,
+        }
+        if 'members' in template.names and guild is not None:
+            count = await self._cached(('members', guild.id), lambda: self._member_count(guild))
+            if count is not None:
+                values['members'] = str(count)
+        if template.names & {'server_status', 'server_name', 'players'}:
+            status = await self._cached(('server_status',), self._server_status)
+            if status:
+                values.update(status)
+
+        rendered = []
+        for part in template.parts:
+            if isinstance(part, str):
+                rendered.append(part)
+            elif part.name == 'countdown':
+                rendered.append(_format_countdown(zone.to_timestamp(part.arg), now))
+            else:
+                rendered.append(values.get(part.name, UNAVAILABLE))
+        return "".join(rendered)
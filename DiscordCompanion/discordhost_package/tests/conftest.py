@@ -0,0 +1,10 @@
+"""
+Test setup: the modules of the bot are imported from the package directory,
+and bot.py opens its job database in a temporary directory.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SCHEDULER_DB_PATH", os.path.join(tempfile.mkdtemp(), "scheduled_jobs.db"))
@@ -0,0 +1,73 @@
+"""
+Tests of the permission check of !announce, with the default intents
+(no "Server Members" intent, so no member is cached).
+"""
+import asyncio
+from types import SimpleNamespace
+
+import discord
+
+import bot
+
+
+class FakeResponse:
+    status = 404
+    reason = "Not Found"
+
+
+class FakeGuild:
+    def __init__(self, guild_id, members=None):
+        self.id = guild_id
+        self.members = members or {}
+
+    def get_member(self, user_id):
+        # Sans l'intent "Server Members", le cache des membres reste vide
+        return None
+
+    async def fetch_member(self, user_id):
+        if user_id not in self.members:
+            raise discord.NotFound(FakeResponse(), "Unknown Member")
+        return self.members[user_id]
+
+
+class FakeChannel:
+    def __init__(self, guild, allowed):
+        self.guild = guild
+        self.allowed = allowed
+
+    def permissions_for(self, member):
+        return SimpleNamespace(send_messages=member.id in self.allowed)
+
+
+def make_ctx(guild, author_id=1):
+    return SimpleNamespace(guild=guild, author=SimpleNamespace(id=author_id))
+
+
+def test_members_intent_is_off_by_default():
+    assert not bot.bot.intents.members
+
+
+def test_author_checked_in_command_guild_without_member_cache():
+    guild = FakeGuild(10)
+    ctx = make_ctx(guild)
+    assert asyncio.run(bot.author_can_send(ctx, FakeChannel(guild, allowed={1})))
+    assert not asyncio.run(bot.author_can_send(ctx, FakeChannel(guild, allowed=set())))
+
+
+def test_author_fetched_in_other_guild():
+    author = SimpleNamespace(id=1)
+    other = FakeGuild(20, members={1: author})
+    ctx = make_ctx(FakeGuild(10))
+    assert asyncio.run(bot.author_can_send(ctx, FakeChannel(other, allowed={1})))
+    assert not asyncio.run(bot.author_can_send(ctx, FakeChannel(other, allowed=set())))
+
+
+def test_author_not_member_of_other_guild_is_refused():
+    ctx = make_ctx(FakeGuild(10))
+    assert not asyncio.run(bot.author_can_send(ctx, FakeChannel(FakeGuild(20), allowed={1})))
+
+
+def test_command_from_dm_fetches_member():
+    author = SimpleNamespace(id=1)
+    guild = FakeGuild(20, members={1: author})
+    assert asyncio.run(bot.author_can_send(make_ctx(None), FakeChannel(guild, allowed={1})))
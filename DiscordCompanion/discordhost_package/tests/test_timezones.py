@@ -0,0 +1,31 @@
+"""
+Tests of the conversion of local wall-clock times around DST changes.
+"""
+from datetime import datetime, timezone
+
+from timezones import offset_table
+
+
+def utc(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+def test_time_in_dst_gap_is_shifted_forward_by_the_gap():
+    # 29/03/2026: à Paris, les horloges passent de 02:00 à 03:00
+    table = offset_table('Europe/Paris')
+    timestamp = table.to_timestamp(datetime(2026, 3, 29, 2, 30))
+    assert utc(timestamp) == datetime(2026, 3, 29, 1, 30, tzinfo=timezone.utc)
+    assert table.to_local(timestamp) == datetime(2026, 3, 29, 3, 30)
+
+
+def test_time_before_dst_gap_is_unchanged():
+    table = offset_table('Europe/Paris')
+    timestamp = table.to_timestamp(datetime(2026, 3, 29, 1, 59))
+    assert utc(timestamp) == datetime(2026, 3, 29, 0, 59, tzinfo=timezone.utc)
+
+
+def test_repeated_time_resolves_to_first_occurrence():
+    # 25/10/2026: à Paris, 02:30 a lieu deux fois (UTC+2 puis UTC+1)
+    table = offset_table('Europe/Paris')
+    timestamp = table.to_timestamp(datetime(2026, 10, 25, 2, 30))
+    assert utc(timestamp) == datetime(2026, 10, 25, 0, 30, tzinfo=timezone.utc)
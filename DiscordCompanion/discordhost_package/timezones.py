@@ -0,0 +1,152 @@
+"""
+Timezones of the guilds, with cached UTC-offset tables.
+"""
+import bisect
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Fuseau horaire utilisé par défaut (France)
+DEFAULT_TIMEZONE = 'Europe/Paris'
+
+_EPOCH = datetime(1970, 1, 1)
+_DAY = 86400
+
+
+def get_zone(name):
+    """
+    Get a timezone by its IANA name.
+
+    Args:
+        name: The timezone name (e.g. "Europe/Paris", "America/Montreal")
+
+    Returns:
+        ZoneInfo: The timezone
+
+    Raises:
+        ValueError: If the timezone does not exist
+    """
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Fuseau horaire inconnu: {name} (exemple: Europe/Paris)")
+
+
+class OffsetTable:
+    """
+    UTC offsets of a timezone as a sorted table of transitions, computed one
+    year at a time on first use. Converting between POSIX timestamps and
+    local wall-clock times is then a bisection on integers, without going
+    through the timezone machinery.
+    """
+
+    def __init__(self, name):
+        """
+        Initialize the table of a timezone.
+
+        Args:
+            name: The IANA timezone name
+
+        Raises:
+            ValueError: If the timezone does not exist
+        """
+        self.name = name
+        self.zone = get_zone(name)
+        self._years = {}  # {année: (débuts des périodes, décalages en secondes)}
+
+    def _offset_from_zone(self, timestamp):
+        """Ask the timezone for the UTC offset at a timestamp, in seconds."""
+        moment = datetime.fromtimestamp(timestamp, timezone.utc).astimezone(self.zone)
+        return int(moment.utcoffset().total_seconds())
+
+    def _year_table(self, year):
+        """Compute the offset transitions of one year (UTC)."""
+        start = int((datetime(year, 1, 1) - _EPOCH).total_seconds())
+        end = int((datetime(year + 1, 1, 1) - _EPOCH).total_seconds())
+        starts = [start]
+        offsets = [self._offset_from_zone(start)]
+        # Les changements d'heure sont repérés jour par jour, puis situés à la seconde près
+        for day in range(start + _DAY, end, _DAY):
+            offset = self._offset_from_zone(day)
+            if offset == offsets[-1]:
+                continue
+            low, high = day - _DAY, day
+            while high - low > 1:
+                middle = (low + high) // 2
+                if self._offset_from_zone(middle) == offsets[-1]:
+                    low = middle
+                else:
+                    high = middle
+            starts.append(high)
+            offsets.append(offset)
+        table = (starts, offsets)
+        self._years[year] = table
+        return table
+
+    def utc_offset(self, timestamp):
+        """
+        Get the UTC offset at a timestamp.
+
+        Args:
+            timestamp: POSIX timestamp
+
+        Returns:
+            int: The offset in seconds (local time minus UTC)
+        """
+        year = (_EPOCH + timedelta(seconds=timestamp)).year
+        starts, offsets = self._years.get(year) or self._year_table(year)
+        return offsets[bisect.bisect_right(starts, timestamp) - 1]
+
+    def to_local(self, timestamp):
+        """
+        Convert a timestamp to a local wall-clock time.
+
+        Args:
+            timestamp: POSIX timestamp
+
+        Returns:
+            datetime: The naive local datetime
+        """
+        return _EPOCH + timedelta(seconds=timestamp + self.utc_offset(timestamp))
+
+    def to_timestamp(self, local):
+        """
+        Convert a local wall-clock time to a timestamp.
+        A time skipped by a DST jump is shifted forward by the length of the
+        gap (02:30 becomes 03:30 when clocks go from 02:00 to 03:00); a time
+        that occurs twice resolves to its first occurrence.
+
+        Args:
+            local: The naive local datetime
+
+        Returns:
+            int: The POSIX timestamp (whole seconds)
+        """
+        wall = int((local - _EPOCH).total_seconds())
+        # Un seul changement d'heure au plus autour de l'heure locale: deux décalages possibles
+        before, after = self.utc_offset(wall - _DAY), self.utc_offset(wall + _DAY)
+        for offset in sorted({before, after}, reverse=True):
+            if self.utc_offset(wall - offset) == offset:
+                return wall - offset
+        return wall - before
+
+
+_tables = {}
+
+
+def offset_table(name):
+    """
+    Get the shared offset table of a timezone.
+
+    Args:
+        name: The IANA timezone name
+
+    Returns:
+        OffsetTable: The table, created on first use
+
+    Raises:
+        ValueError: If the timezone does not exist
+    """
+    table = _tables.get(name)
+    if table is None:
+        table = _tables[name] = OffsetTable(name)
+    return table
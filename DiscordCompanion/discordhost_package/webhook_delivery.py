@@ -0,0 +1,128 @@
+"""
+Webhook delivery backend for scheduled messages.
+"""
+import asyncio
+import logging
+
+import discord
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Nom du webhook créé dans chaque canal cible
+WEBHOOK_NAME = "Messages programmés"
+
+
+class WebhookDelivery:
+    """
+    Sends scheduled messages through one webhook per channel, under the
+    scheduling author's display name. Webhooks use their own rate-limit
+    bucket and need a single request per message. Their IDs and tokens are
+    kept in the job store so they are reused across restarts.
+    """
+
+    def __init__(self, bot, store):
+        """
+        Initialize the webhook cache.
+
+        Args:
+            bot: The Discord bot instance
+            store: The JobStore used to persist webhook tokens
+        """
+        self.bot = bot
+        self.store = store
+        self._webhooks = {}  # {channel_id: discord.Webhook}
+        self._credentials = store.load_webhooks()  # {channel_id: (webhook_id, token)}
+        self._create_lock = asyncio.Lock()
+
+    async def _get_webhook(self, channel):
+        """
+        Get the cached webhook for a channel, creating it on first use.
+
+        Args:
+            channel: The text channel owning the webhook
+
+        Returns:
+            discord.Webhook: The webhook
+        """
+        webhook = self._webhooks.get(channel.id)
+        if webhook is not None:
+            return webhook
+
+        # Verrou: deux fils d'un même canal ne doivent pas créer chacun leur webhook
+        async with self._create_lock:
+            credentials = self._credentials.get(channel.id)
+            if credentials is None:
+                created = await channel.create_webhook(name=WEBHOOK_NAME, reason="Envoi des messages programmés")
+                credentials = (created.id, created.token)
+                self._credentials[channel.id] = credentials
+                self.store.save_webhook(channel.id, *credentials)
+                logger.info(f"Webhook créé pour le canal {channel.name} (ID: {channel.id})")
+
+        webhook = discord.Webhook.partial(*credentials, client=self.bot)
+        self._webhooks[channel.id] = webhook
+        return webhook
+
+    def forget(self, channel_id):
+        """
+        Drop a channel's webhook (deleted by a moderator or channel removed).
+
+        Args:
+            channel_id: The Discord channel ID
+        """
+        self._webhooks.pop(channel_id, None)
+        if self._credentials.pop(channel_id, None) is not None:
+            self.store.delete_webhook(channel_id)
+
+    async def send(self, channel, content, username, avatar_url=None, files=None):
+        """
+        Post a message through the channel's webhook.
+
+        Args:
+            channel: The target channel (a thread is posted through its parent's webhook)
+            content: The message content
+            username: The name displayed for the message
+            avatar_url: Optional avatar displayed for the message
+            files: Optional function returning the discord.File objects to attach
+                (called again if the send has to be retried)
+
+        Returns:
+            discord.WebhookMessage: The sent message
+        """
+        thread = channel if isinstance(channel, discord.Thread) else None
+        owner = channel.parent if thread else channel
+        kwargs = {'username': username[:80], 'wait': True}
+        if avatar_url:
+            kwargs['avatar_url'] = avatar_url
+        if thread:
+            kwargs['thread'] = thread
+
+        webhook = await self._get_webhook(owner)
+        try:
+            return await webhook.send(content, **kwargs, **({'files': files()} if files else {}))
+        except discord.NotFound:
+            # Le webhook a été supprimé côté Discord: en recréer un et réessayer une fois
+            logger.warning(f"Webhook du canal {owner.id} introuvable, recréation")
+            self.forget(owner.id)
+            webhook = await self._get_webhook(owner)
+            return await webhook.send(content, **kwargs, **({'files': files()} if files else {}))
+
+    async def delete(self, channel, message_id):
+        """
+        Delete a message posted through the channel's webhook. A webhook can delete
+        its own messages without the "Manage Messages" permission.
+
+        Args:
+            channel: The channel the message was posted in (a thread uses its parent's webhook)
+            message_id: The ID of the message
+
+        Returns:
+            bool: Whether the channel still has its webhook (False: the message must be deleted another way)
+        """
+        thread = channel if isinstance(channel, discord.Thread) else None
+        owner = channel.parent if thread else channel
+        if owner.id not in self._credentials:
+            return False
+        webhook = await self._get_webhook(owner)
+        await webhook.delete_message(message_id, thread=thread or discord.utils.MISSING)
+        return True